@@ -0,0 +1,12 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Benchmark scripts for `python_toolbox`.
+
+These are not part of the test suite. Run them from the root of the repository
+with `source_py3` on the path, for example:
+
+    PYTHONPATH=source_py3 python misc/benchmarks/cache_hit_path.py
+
+'''
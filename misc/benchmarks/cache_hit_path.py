@@ -0,0 +1,69 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Benchmark the hit path of `caching.cache` against `functools.lru_cache`.
+
+Every function is called once to fill the cache, and then we time repeated
+calls with the same arguments, so only cache hits are measured.
+'''
+
+import functools
+import timeit
+
+from python_toolbox import caching
+
+
+class Thing:
+    pass
+
+
+def no_arguments():
+    return 7
+
+def one_argument(a):
+    return a
+
+def two_arguments(a, b=2):
+    return a
+
+def star_arguments(a, *args, **kwargs):
+    return a
+
+
+thing = Thing()
+
+cases = (
+    ('no arguments', no_arguments, ()),
+    ('one int', one_argument, (1,)),
+    ('one str', one_argument, ('meow',)),
+    ('two ints', two_arguments, (1, 2)),
+    ('weakreffable object', one_argument, (thing,)),
+    ('*args and **kwargs', star_arguments, (1, 2, 3)),
+)
+
+
+def time_calls(function, args, number):
+    '''Get the time in microseconds of a single call to `function(*args)`.'''
+    timer = timeit.Timer(lambda: function(*args))
+    return min(timer.repeat(repeat=5, number=number)) / number * 10 ** 6
+
+
+def main(number=20000):
+    print('%-22s %14s %14s %14s' % ('case', 'uncached (us)', 'lru_cache (us)',
+                                    'cache (us)'))
+    for name, function, args in cases:
+        lru_cached_function = functools.lru_cache(maxsize=None)(function)
+        cached_function = caching.cache()(function)
+        for f in (lru_cached_function, cached_function):
+            f(*args)
+        print('%-22s %14.3f %14.3f %14.3f' % (
+            name,
+            time_calls(function, args, number),
+            time_calls(lru_cached_function, args, number),
+            time_calls(cached_function, args, number),
+        ))
+
+
+if __name__ == '__main__':
+    main()
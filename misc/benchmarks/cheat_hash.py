@@ -0,0 +1,37 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Benchmark the time of `cheat_hash` on flat and nested containers and on
+buffers.
+'''
+
+import timeit
+
+from python_toolbox.cheat_hashing import cheat_hash
+
+
+cases = (
+    ('small mixed tuple', (1, [2], 3)),
+    ('1000 ints', list(range(1000))),
+    ('1000 lists', [[i] for i in range(1000)]),
+    ('dict of lists', {i: [i] for i in range(100)}),
+    ('bytearray', bytearray(1000)),
+)
+
+
+def time_us(function, number):
+    '''Get the time in microseconds of one call to `function`.'''
+    timer = timeit.Timer(function)
+    return min(timer.repeat(repeat=5, number=number)) / number * 10 ** 6
+
+
+def main(number=1000):
+    print('%-20s %14s' % ('case', 'time (us)'))
+    for name, thing in cases:
+        print('%-20s %14.3f' % (name, time_us(lambda: cheat_hash(thing),
+                                              number)))
+
+
+if __name__ == '__main__':
+    main()
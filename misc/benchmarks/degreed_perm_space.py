@@ -0,0 +1,44 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Benchmark indexing degreed `PermSpace`s with 12 to 20 items.
+'''
+
+import random
+import time
+
+from python_toolbox import combi
+
+
+def get_cases():
+    for sequence_length in range(12, 21, 2):
+        yield (sequence_length, 'one degree',
+               combi.PermSpace(sequence_length,
+                               degrees=sequence_length // 2))
+        yield (sequence_length, 'two, fixed',
+               combi.PermSpace(sequence_length,
+                               degrees=(3, sequence_length - 3),
+                               fixed_map={0: 3, 5: 1}))
+
+
+def time_us_per_perm(perm_space, indices):
+    '''Get the time in microseconds per index of indexing `perm_space`.'''
+    start_time = time.perf_counter()
+    for i in indices:
+        perm_space[i]
+    return (time.perf_counter() - start_time) / len(indices) * 10 ** 6
+
+
+def main(n_indices=200):
+    print('%-8s %-12s %14s' % ('length', 'degrees', 'indexing (us)'))
+    for sequence_length, name, perm_space in get_cases():
+        perm_space[0] # Calculating the cached tables.
+        indices = [random.randrange(perm_space.length) for _ in
+                   range(n_indices)]
+        print('%-8s %-12s %14.3f' % (sequence_length, name,
+                                     time_us_per_perm(perm_space, indices)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Benchmark `PermSpace.get_many` against indexing each perm.
+'''
+
+import random
+import time
+
+from python_toolbox import combi
+
+
+cases = (
+    ('plain', combi.PermSpace(20)),
+    ('partial', combi.PermSpace(100, n_elements=5)),
+    ('combination', combi.CombSpace(60, 8)),
+    ('rapplied', combi.PermSpace('abcdefghijkl')),
+)
+
+
+def time_us_per_perm(function, indices):
+    '''Get the time in microseconds per index of `function(indices)`.'''
+    start_time = time.perf_counter()
+    function(indices)
+    return (time.perf_counter() - start_time) / len(indices) * 10 ** 6
+
+
+def main(n_indices=5000):
+    print('%-14s %14s %14s %14s' % ('case', 'indexing (us)', 'get_many (us)',
+                                    'compact (us)'))
+    for name, perm_space in cases:
+        indices = [random.randrange(perm_space.length) for _ in
+                   range(n_indices)]
+        print('%-14s %14.3f %14.3f %14.3f' % (
+            name,
+            time_us_per_perm(lambda indices: [perm_space[i] for i in indices],
+                             indices),
+            time_us_per_perm(perm_space.get_many, indices),
+            time_us_per_perm(
+                lambda indices: perm_space.get_many(indices, compact=True),
+                indices
+            ),
+        ))
+
+
+if __name__ == '__main__':
+    main()
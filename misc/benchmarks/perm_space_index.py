@@ -0,0 +1,49 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Benchmark ranking perms with `PermSpace.index` and `PermSpace.index_many`.
+'''
+
+import random
+import time
+
+from python_toolbox import combi
+
+
+def get_cases():
+    yield 'plain, 20', combi.PermSpace(20)
+    yield 'plain, 200', combi.PermSpace(200)
+    yield 'partial, 1000 -> 10', combi.PermSpace(1000, n_elements=10)
+    yield 'rapplied, 26', combi.PermSpace('abcdefghijklmnopqrstuvwxyz')
+    yield 'comb, 30 -> 8', combi.CombSpace(30, 8)
+    yield 'fixed, 16', combi.PermSpace(16, fixed_map={0: 3, 5: 9})
+    yield 'degreed, 12', combi.PermSpace(12, degrees=(4, 5))
+    yield 'recurrent, 12', combi.PermSpace('aabbccddeeff')
+    yield 'recurrent comb', combi.CombSpace('aaabbbcccdddeeefff', 7)
+
+
+def time_us_per_perm(function, perms):
+    '''Get the time in microseconds per perm of calling `function`.'''
+    start_time = time.perf_counter()
+    function(perms)
+    return (time.perf_counter() - start_time) / len(perms) * 10 ** 6
+
+
+def main(n_perms=200):
+    print('%-20s %12s %16s' % ('space', 'index (us)', 'index_many (us)'))
+    for name, perm_space in get_cases():
+        perms = [perm_space[random.randrange(perm_space.length)] for _ in
+                 range(n_perms)]
+        index_time = time_us_per_perm(
+            lambda perms: [perm_space.index(perm) for perm in perms], perms
+        )
+        if hasattr(perm_space, 'index_many'):
+            index_many_time = time_us_per_perm(perm_space.index_many, perms)
+        else:
+            index_many_time = float('nan')
+        print('%-20s %12.3f %16.3f' % (name, index_time, index_many_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Benchmark iterating on `PermSpace` variations against indexing each perm.
+'''
+
+import time
+
+from python_toolbox import combi
+
+
+cases = (
+    ('plain', combi.PermSpace(8)),
+    ('partial', combi.PermSpace(10, n_elements=4)),
+    ('combination', combi.CombSpace(16, 5)),
+    ('recurrent', combi.PermSpace('aabbccdd')),
+    ('fixed', combi.PermSpace(8, fixed_map={0: 3, 4: 1})),
+    ('degreed', combi.PermSpace(7, degrees=(2,))),
+    ('dapplied', combi.PermSpace(7, domain='abcdefg')),
+    ('sliced', combi.PermSpace(8)[100:20000]),
+)
+
+
+def time_us_per_perm(function, perm_space, n_perms):
+    '''Get the time in microseconds per perm of `function(perm_space)`.'''
+    start_time = time.perf_counter()
+    function(perm_space, n_perms)
+    return (time.perf_counter() - start_time) / n_perms * 10 ** 6
+
+
+def iterate(perm_space, n_perms):
+    for _ in perm_space:
+        pass
+    
+    
+def index(perm_space, n_perms):
+    for i in range(n_perms):
+        perm_space[i]
+        
+
+def main(max_n_indexed_perms=2000):
+    print('%-14s %10s %16s %16s' % ('case', 'length', 'iterating (us)',
+                                    'indexing (us)'))
+    for name, perm_space in cases:
+        print('%-14s %10s %16.3f %16.3f' % (
+            name, perm_space.length,
+            time_us_per_perm(iterate, perm_space, perm_space.length),
+            time_us_per_perm(index, perm_space,
+                             min(perm_space.length, max_n_indexed_perms))
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Replay key traces through each eviction policy and report the hit ratios.
+
+Run with the paths of trace files, each having one key per line, to replay
+recorded traces. Without arguments, a few synthetic traces are replayed:
+popular keys, popular keys interrupted by scans, and a loop over a working set
+slightly bigger than the cache.
+'''
+
+import sys
+import time
+import bisect
+import random
+import itertools
+
+from python_toolbox.caching import eviction_policies
+from python_toolbox.caching.cache_dict import CacheDict
+
+
+def get_zipf_trace(length=100000, n_keys=10000, exponent=0.9, seed=0):
+    '''Get a trace of keys whose popularity follows Zipf's law.'''
+    random_generator = random.Random(seed)
+    cumulative_weights = list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, n_keys + 1)
+    ))
+    total_weight = cumulative_weights[-1]
+    return [bisect.bisect(cumulative_weights,
+                          random_generator.random() * total_weight)
+            for _ in range(length)]
+
+
+def get_trace_with_scans(length=100000, n_keys=10000, scan_length=2000,
+                         scan_interval=10000, seed=0):
+    '''Get a Zipf-like trace interrupted by scans of keys used once.'''
+    zipf_trace = get_zipf_trace(length, n_keys, seed=seed)
+    scan_keys = itertools.count(n_keys)
+    trace = []
+    for i in range(0, length, scan_interval):
+        trace.extend(zipf_trace[i:i + scan_interval])
+        trace.extend(itertools.islice(scan_keys, scan_length))
+    return trace
+
+
+def get_loop_trace(length=100000, n_keys=1100):
+    '''Get a trace looping over `n_keys` keys in order.'''
+    return [i % n_keys for i in range(length)]
+
+
+def read_trace(path):
+    '''Read a trace file with one key per line.'''
+    with open(path) as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def replay(trace, policy, max_size):
+    '''
+    Replay `trace` through a `CacheDict` with `policy`.
+
+    Returns the hit ratio and the time in microseconds per access.
+    '''
+    cache_dict = CacheDict(max_size=max_size, policy=policy)
+    n_hits = 0
+    start_time = time.perf_counter()
+    for key in trace:
+        try:
+            cache_dict[key]
+        except KeyError:
+            cache_dict[key] = None
+        else:
+            n_hits += 1
+    duration = time.perf_counter() - start_time
+    return n_hits / len(trace), duration / len(trace) * 10 ** 6
+
+
+def main(paths=(), max_size=1000):
+    if paths:
+        traces = [(path, read_trace(path)) for path in paths]
+    else:
+        traces = [('zipf', get_zipf_trace()),
+                  ('zipf with scans', get_trace_with_scans()),
+                  ('loop', get_loop_trace())]
+    policies = sorted(eviction_policies.policies)
+    print('max_size=%s' % max_size)
+    print('%-18s' % 'trace' +
+          ''.join('%16s' % policy for policy in policies))
+    for name, trace in traces:
+        results = [replay(trace, policy, max_size) for policy in policies]
+        print('%-18s' % name + ''.join(
+            '%9.2f%% %4.1fus' % (hit_ratio * 100, microseconds)
+            for hit_ratio, microseconds in results
+        ))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
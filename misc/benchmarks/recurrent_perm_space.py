@@ -0,0 +1,41 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Benchmark indexing recurrent `PermSpace`s and `CombSpace`s.
+'''
+
+import random
+import time
+
+from python_toolbox import combi
+
+
+def get_cases():
+    yield 'perms', combi.PermSpace('aabbccddeeff')
+    yield 'partial perms', combi.PermSpace('aaabbbcccdddeee', n_elements=8)
+    yield 'fixed perms', combi.PermSpace('aabbccddee',
+                                         fixed_map={2: 'c', 7: 'a'})
+    yield 'combs', combi.CombSpace('aaabbbcccdddeeefff', 7)
+    yield 'combs, few repeats', combi.CombSpace('abcdefabcdefxyz', 6)
+
+
+def time_us_per_perm(perm_space, indices):
+    '''Get the time in microseconds per index of indexing `perm_space`.'''
+    start_time = time.perf_counter()
+    for i in indices:
+        perm_space[i]
+    return (time.perf_counter() - start_time) / len(indices) * 10 ** 6
+
+
+def main(n_indices=200):
+    print('%-20s %14s' % ('space', 'indexing (us)'))
+    for name, perm_space in get_cases():
+        perm_space[0] # Calculating the cached lengths.
+        indices = [random.randrange(perm_space.length) for _ in
+                   range(n_indices)]
+        print('%-20s %14.3f' % (name, time_us_per_perm(perm_space, indices)))
+
+
+if __name__ == '__main__':
+    main()
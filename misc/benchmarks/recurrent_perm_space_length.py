@@ -0,0 +1,45 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Benchmark calculating the lengths of recurrent `PermSpace`s and `CombSpace`s.
+
+The cache is cleared before each calculation.
+'''
+
+import time
+
+from python_toolbox import nifty_collections
+from python_toolbox.combi.perming import calculating_length
+from python_toolbox.combi.perming.calculating_length import (
+    calculate_length_of_recurrent_perm_space,
+    calculate_length_of_recurrent_comb_space
+)
+
+
+def get_cases():
+    yield ('counts 1 to 8', nifty_collections.FrozenBagBag(range(1, 9)), 12)
+    yield ('10 of count 3', nifty_collections.FrozenBagBag({3: 10}), 25)
+
+
+def time_ms(function, k, fbb):
+    '''Get the time in milliseconds of calculating a length from scratch.'''
+    calculating_length._length_of_recurrent_perm_space_cache.clear()
+    calculating_length._length_of_recurrent_comb_space_cache.clear()
+    start_time = time.perf_counter()
+    function(k, fbb)
+    return (time.perf_counter() - start_time) * 1000
+
+
+def main():
+    print('%-16s %4s %12s %12s' % ('items', 'k', 'perms (ms)', 'combs (ms)'))
+    for name, fbb, k in get_cases():
+        print('%-16s %4s %12.3f %12.3f' % (
+            name, k,
+            time_ms(calculate_length_of_recurrent_perm_space, k, fbb),
+            time_ms(calculate_length_of_recurrent_comb_space, k, fbb),
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Benchmark the memory, construction time and comparison time of
+`SleekCallArgs`.
+
+Memory is measured with `tracemalloc` over many instances kept in a dict,
+like in a cache, and divided by their number.
+'''
+
+import gc
+import timeit
+import tracemalloc
+
+from python_toolbox.sleek_reffing import SleekCallArgs
+
+
+class Thing:
+    pass
+
+
+def two_arguments(a, b=2):
+    pass
+
+def star_arguments(a, *args, **kwargs):
+    pass
+
+
+things = [Thing() for _ in range(3)]
+
+cases = (
+    ('two ints', two_arguments, (1, 2), {}),
+    ('object and list', two_arguments, (things[0], [1, 2]), {}),
+    ('*args and **kwargs', star_arguments, (1, things[1], 3),
+     {'x': things[2], 'y': 'meow'}),
+)
+
+
+def get_bytes_per_entry(function, args, kwargs, n_entries):
+    '''Get the memory taken by each `SleekCallArgs` kept in a dict.'''
+    # A different first argument for each entry, so they're all distinct:
+    all_args = [(i,) + args[1:] for i in range(n_entries)]
+    gc.collect()
+    tracemalloc.start()
+    start_size, _ = tracemalloc.get_traced_memory()
+    sca_dict = {}
+    for entry_args in all_args:
+        sca = SleekCallArgs(sca_dict, function, *entry_args, **kwargs)
+        sca_dict[sca] = None
+    end_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (end_size - start_size) / n_entries
+
+
+def time_us(function, number):
+    '''Get the time in microseconds of one call to `function`.'''
+    timer = timeit.Timer(function)
+    return min(timer.repeat(repeat=5, number=number)) / number * 10 ** 6
+
+
+def main(n_entries=10000, number=20000):
+    print('%-20s %14s %14s %14s' % ('case', 'bytes/entry', 'build (us)',
+                                    'compare (us)'))
+    for name, function, args, kwargs in cases:
+        sca_dict = {}
+        sca = SleekCallArgs(sca_dict, function, *args, **kwargs)
+        other_sca = SleekCallArgs(sca_dict, function, *args, **kwargs)
+        assert sca == other_sca
+        print('%-20s %14.0f %14.3f %14.3f' % (
+            name,
+            get_bytes_per_entry(function, args, kwargs, n_entries),
+            time_us(lambda: SleekCallArgs(sca_dict, function, *args,
+                                          **kwargs), number // 10),
+            time_us(lambda: sca == other_sca, number),
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,8 +3,14 @@
 
 '''Defines various caching tools.'''
 
-# todo: examine thread-safety
+# For using caches from several threads, see `thread_safe` in the
+# documentation of `cache`.
 
-from .decorators import cache
+from .decorators import cache, batch_cache
 from .cached_type import CachedType
-from .cached_property import CachedProperty
\ No newline at end of file
+from .cached_property import CachedProperty
+from .cached_method import CachedMethod
+from .statistics import CacheInfo
+from .storage import CacheStorage, SqliteStorage
+from .shared_memory_storage import SharedMemoryStorage
+from .eviction_policies import EvictionPolicy
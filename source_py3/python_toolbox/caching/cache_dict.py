@@ -0,0 +1,375 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Defines the `CacheDict` and `SynchronizedCacheDict` classes.
+
+See its documentation for more details.
+'''
+
+import collections
+import collections.abc
+import datetime as datetime_module
+import threading
+
+from . import size_estimation
+from . import eviction_policies
+
+infinity = float('inf')
+
+
+def process_time_to_keep(time_to_keep):
+    '''
+    Get a `timedelta` from a `time_to_keep` argument.
+
+    `time_to_keep` may be either a `timedelta` object, a dict of keyword
+    arguments for constructing one, or `None`, which is returned as-is.
+    '''
+    if time_to_keep is None or \
+                     isinstance(time_to_keep, datetime_module.timedelta):
+        return time_to_keep
+    try:
+        return datetime_module.timedelta(**time_to_keep)
+    except Exception:
+        raise TypeError(
+            '`time_to_keep` must be either a `timedelta` object or a '
+            'dict of keyword arguments for constructing a '
+            '`timedelta` object.'
+        )
+
+
+class CacheDict(collections.abc.MutableMapping):
+    '''
+    A dict of cached results, bounded by size and/or by time.
+
+    This is the storage used by `cache` when given `max_size`, `max_bytes`
+    and/or `time_to_keep`. All bounds may be used together.
+
+    When there are more than `max_size` entries, or the values take more than
+    `max_bytes` bytes, entries are thrown away until there aren't. Values are
+    measured with `get_size`, and a single value bigger than `max_bytes` isn't
+    stored at all. Which entries are thrown away is decided by `policy`, which
+    is least-recently-used by default. (See `eviction_policies` for the other
+    policies.)
+
+    Entries live for `time_to_keep` after they were set; expired entries are
+    never returned and are removed on the next access to the dict. Since all
+    entries have the same `time_to_keep`, they expire in the order they were
+    set. We keep an expiry queue in that order and only ever look at its
+    front, so the cost of expiring entries is amortized O(1) per access.
+
+    If given a `time_to_refresh`, entries become due for a refresh that long
+    after they were set. They're still returned as usual; it's up to the user
+    to call `claim_refresh` and set a fresh value.
+    '''
+
+    def __init__(self, max_size=infinity, time_to_keep=None,
+                 get_now=datetime_module.datetime.now, max_bytes=infinity,
+                 get_size=size_estimation.get_deep_size, policy='lru',
+                 time_to_refresh=None):
+        '''
+        Construct the `CacheDict`.
+
+        `max_size` is the maximum number of entries. `time_to_keep` is a
+        `timedelta` after which an entry expires, or `None` for entries that
+        never expire. `get_now` is a function returning the current time.
+        `max_bytes` is the maximum total size of the values, as measured by
+        the `get_size` function. `policy` is the name of an eviction policy,
+        or an `EvictionPolicy` subclass. `time_to_refresh` is a `timedelta`
+        after which an entry is due for a refresh, or `None`.
+        '''
+        self.max_size = max_size
+        self.time_to_keep = time_to_keep
+        self.get_now = get_now
+        self.max_bytes = max_bytes
+        self.get_size = get_size
+
+        self._entries = {}
+        '''The cached values.'''
+
+        if max_size != infinity or max_bytes != infinity:
+            self.policy = eviction_policies.get_policy_type(policy)(max_size)
+            '''The `EvictionPolicy` choosing which entries to throw away.'''
+        else:
+            self.policy = None
+
+        self.n_evictions = 0
+        '''Number of entries thrown away to respect `max_size`/`max_bytes`.'''
+        self.n_expirations = 0
+        '''Number of entries thrown away because `time_to_keep` passed.'''
+
+        if time_to_keep is not None:
+            self._expiry_times = {}
+            '''Mapping from key to the time at which its entry expires.'''
+            self._expiry_queue = collections.deque()
+            '''Records of `(expiry_time, key)`, ordered by expiry time.'''
+        else:
+            self._expiry_times = self._expiry_queue = None
+
+        self.n_bytes = 0
+        '''Total size of the values, if `max_bytes` is given.'''
+        self._sizes = {} if max_bytes != infinity else None
+        '''Mapping from key to the size of its value.'''
+
+        self.time_to_refresh = time_to_refresh
+        self._refresh_times = {} if time_to_refresh is not None else None
+        '''
+        Mapping from key to the time at which its entry is due for a refresh.
+
+        Entries whose refresh was claimed aren't in it.
+        '''
+
+
+    def _forget_entry(self, key):
+        '''Remove the entry for `key` from our bookkeeping, except `policy`.'''
+        del self._entries[key]
+        if self._expiry_times is not None:
+            del self._expiry_times[key]
+        if self._sizes is not None:
+            self.n_bytes -= self._sizes.pop(key)
+        if self._refresh_times is not None:
+            self._refresh_times.pop(key, None)
+
+
+    def _remove_entry(self, key):
+        '''Remove the entry for `key` from all our bookkeeping.'''
+        self._forget_entry(key)
+        if self.policy is not None:
+            self.policy.remove(key)
+
+
+    def _remove_expired_entries(self, now):
+        '''
+        Remove all entries that expired by `now`.
+
+        A record in the expiry queue may be stale, if its entry was already
+        deleted or set again since; those are just discarded.
+        '''
+        expiry_queue = self._expiry_queue
+        expiry_times = self._expiry_times
+        while expiry_queue and expiry_queue[0][0] <= now:
+            expiry_time, key = expiry_queue.popleft()
+            if expiry_times.get(key) == expiry_time:
+                self._remove_entry(key)
+                self.n_expirations += 1
+
+
+    def _compact_expiry_queue(self):
+        '''Throw away all stale records from the expiry queue.'''
+        expiry_times = self._expiry_times
+        self._expiry_queue = collections.deque(
+            (expiry_time, key) for expiry_time, key in self._expiry_queue
+            if expiry_times.get(key) == expiry_time
+        )
+
+
+    def __getitem__(self, key):
+        if self._expiry_queue is not None:
+            self._remove_expired_entries(self.get_now())
+        value = self._entries[key]
+        if self.policy is not None:
+            self.policy.touch(key)
+        return value
+
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+
+    def set(self, key, value, cost=1):
+        '''
+        Set `value` for `key`.
+
+        `cost` is how costly it is to get `value` again, for example, the
+        number of seconds it took to compute. It's only used by policies that
+        care about it.
+        '''
+        self._set(key, value, cost, self._get_value_size(value))
+
+
+    def _get_value_size(self, value):
+        '''Get the size of `value`, if we're counting sizes, or else 1.'''
+        return self.get_size(value) if self._sizes is not None else 1
+
+
+    def _set(self, key, value, cost, size):
+        '''Set `value`, whose size is `size`, for `key`.'''
+        entries = self._entries
+        if key in entries:
+            self._remove_entry(key)
+        if size > self.max_bytes or self.max_size < 1:
+            # Storing it would mean throwing away everything else.
+            return
+        if self._expiry_queue is not None or self._refresh_times is not None:
+            now = self.get_now()
+        if self._expiry_queue is not None:
+            self._remove_expired_entries(now)
+        policy = self.policy
+        if policy is not None:
+            # Making room before adding the new entry, so it won't be the
+            # one thrown away:
+            while len(entries) >= self.max_size or \
+                                        self.n_bytes + size > self.max_bytes:
+                self._forget_entry(policy.pop_victim())
+                self.n_evictions += 1
+        if self._expiry_queue is not None:
+            expiry_time = now + self.time_to_keep
+            self._expiry_times[key] = expiry_time
+            self._expiry_queue.append((expiry_time, key))
+            # Records of evicted or re-set entries linger in the queue until
+            # they reach its front; make sure they don't pile up:
+            if len(self._expiry_queue) > 2 * len(self._expiry_times) + 16:
+                self._compact_expiry_queue()
+        entries[key] = value
+        if self._sizes is not None:
+            self._sizes[key] = size
+            self.n_bytes += size
+        if policy is not None:
+            policy.add(key, size, cost)
+        if self._refresh_times is not None:
+            self._refresh_times[key] = now + self.time_to_refresh
+
+
+    def claim_refresh(self, key):
+        '''
+        Claim the refresh of the entry for `key`, if it's due for one.
+
+        Returns `True` if the entry is due for a refresh, in which case the
+        caller should set a fresh value for it. The entry won't be due again
+        until then, so only one caller gets to refresh it. If the refresh
+        fails, call `release_refresh` to make the entry due again.
+        '''
+        refresh_times = self._refresh_times
+        if refresh_times is None:
+            return False
+        refresh_time = refresh_times.get(key)
+        if refresh_time is not None and refresh_time <= self.get_now():
+            del refresh_times[key]
+            return True
+        return False
+
+
+    def release_refresh(self, key):
+        '''Make the entry for `key` due for a refresh again.'''
+        if key in self._entries:
+            self._refresh_times[key] = self.get_now()
+
+
+    def __delitem__(self, key):
+        self._remove_entry(key)
+
+
+    def __contains__(self, key):
+        if self._expiry_queue is not None:
+            self._remove_expired_entries(self.get_now())
+        return key in self._entries
+
+
+    def __iter__(self):
+        if self._expiry_queue is not None:
+            self._remove_expired_entries(self.get_now())
+        return iter(self._entries)
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def clear(self):
+        '''Remove all entries.'''
+        self._entries.clear()
+        if self._expiry_queue is not None:
+            self._expiry_times.clear()
+            self._expiry_queue.clear()
+        if self._sizes is not None:
+            self._sizes.clear()
+            self.n_bytes = 0
+        if self.policy is not None:
+            self.policy.clear()
+        if self._refresh_times is not None:
+            self._refresh_times.clear()
+
+
+    def __repr__(self):
+        return '<%s: %s entries>' % (type(self).__name__, len(self))
+
+
+class SynchronizedCacheDict(CacheDict):
+    '''
+    A `CacheDict` whose operations are guarded by a lock.
+
+    Used by `cache` when given `thread_safe=True`, because reordering and
+    evicting entries in a `CacheDict` isn't atomic. The sizes of values are
+    estimated before taking the lock.
+    '''
+
+    def __init__(self, max_size=infinity, time_to_keep=None,
+                 get_now=datetime_module.datetime.now, max_bytes=infinity,
+                 get_size=size_estimation.get_deep_size, policy='lru',
+                 time_to_refresh=None, lock=None):
+        '''
+        Construct the `SynchronizedCacheDict`.
+
+        `lock` is the lock to use, by default a new `threading.RLock`. See
+        `CacheDict.__init__` for the other arguments.
+        '''
+        CacheDict.__init__(self, max_size=max_size, time_to_keep=time_to_keep,
+                           get_now=get_now, max_bytes=max_bytes,
+                           get_size=get_size, policy=policy,
+                           time_to_refresh=time_to_refresh)
+        self.lock = lock if lock is not None else threading.RLock()
+
+
+    def __getitem__(self, key):
+        with self.lock:
+            return CacheDict.__getitem__(self, key)
+
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+
+    def set(self, key, value, cost=1):
+        '''Set `value` for `key`. See `CacheDict.set` for more details.'''
+        # Estimating the size may take a while for big values, so we do it
+        # before taking the lock:
+        size = self._get_value_size(value)
+        with self.lock:
+            self._set(key, value, cost, size)
+
+
+    def claim_refresh(self, key):
+        '''
+        Claim the refresh of the entry for `key`, if it's due for one.
+
+        See `CacheDict.claim_refresh` for more details.
+        '''
+        with self.lock:
+            return CacheDict.claim_refresh(self, key)
+
+
+    def release_refresh(self, key):
+        '''Make the entry for `key` due for a refresh again.'''
+        with self.lock:
+            CacheDict.release_refresh(self, key)
+
+
+    def __delitem__(self, key):
+        with self.lock:
+            CacheDict.__delitem__(self, key)
+
+
+    def __contains__(self, key):
+        with self.lock:
+            return CacheDict.__contains__(self, key)
+
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(CacheDict.__iter__(self)))
+
+
+    def clear(self):
+        '''Remove all entries.'''
+        with self.lock:
+            CacheDict.clear(self)
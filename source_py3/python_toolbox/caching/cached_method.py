@@ -0,0 +1,197 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Defines the `CachedMethod` class.
+
+See its documentation for more details.
+'''
+
+import types
+import weakref
+
+from python_toolbox import misc_tools
+from python_toolbox import decorator_tools
+
+from .key_building import get_method_key_builder
+from .side_table import SideTable
+from .cache_dict import (CacheDict, SynchronizedCacheDict,
+                         process_time_to_keep)
+from . import decorators
+
+infinity = float('inf')
+
+
+class _ObjectCache:
+    '''
+    The cache of one object, kept in its `__dict__` by `CachedMethod`.
+
+    A shallow copy of the object gets the same values in its `__dict__`, so we
+    remember which object the cache belongs to, and the copy makes its own
+    cache. Pickling or deep-copying the object gives an empty `_ObjectCache`
+    that belongs to no object, so the results aren't carried along.
+    '''
+    __slots__ = ('_owner_reference', '_owner_id', 'cache_dict')
+
+    def __init__(self, owner=None, cache_dict=None):
+        try:
+            self._owner_reference = weakref.ref(owner)
+        except TypeError:
+            # `owner` is `None` or isn't weakreffable. (The id is good enough
+            # then, since a shallow copy is made while the original is alive,
+            # and so gets a different id.)
+            self._owner_reference = None
+        self._owner_id = None if owner is None else id(owner)
+        self.cache_dict = cache_dict
+
+
+    def belongs_to(self, thing):
+        '''Whether this is the cache of `thing`.'''
+        if self._owner_reference is not None:
+            return self._owner_reference() is thing
+        return self._owner_id == id(thing)
+
+
+    def __reduce__(self):
+        return (type(self), ())
+
+
+class CachedMethod(misc_tools.OwnNameDiscoveringDescriptor):
+    '''
+    A method whose results are cached separately for each object.
+
+    Usage:
+
+        class MyObject:
+
+            @CachedMethod
+            def get_distance(self, other_point):
+                return math.hypot(self.x - other_point.x,
+                                  self.y - other_point.y)
+
+            def _get_route(self, destination):
+                # ... Long computation here
+
+            get_route = CachedMethod(_get_route, max_size=100,
+                                     time_to_keep={'minutes': 10})
+
+    Decorating a method with `cache` would keep the results of all objects in
+    one big cache, keyed on `self` along with the other arguments. Instead,
+    `CachedMethod` keeps a small cache on each object, in its `__dict__`, so
+    `self` doesn't have to be sleekreffed and hashed on every call, and the
+    cache is thrown away along with the object. For classes with `__slots__`
+    and no `__dict__`, the caches are kept in a side table keyed on the
+    objects' ids, so the objects must be weakreffable. Caches aren't shared
+    by copies of an object, and aren't pickled with it.
+
+    `max_size` and `time_to_keep` bound each object's cache, like they do for
+    `cache`. Pass `thread_safe=True` if you're using these together with
+    several threads calling the method on the same object.
+
+    Clear an object's cache with `MyObject.get_route.cache_clear(my_object)`.
+    '''
+    def __init__(self, method_function, max_size=infinity, time_to_keep=None,
+                 thread_safe=False, name=None):
+        '''
+        Construct the cached method.
+
+        You may optionally pass in the name that this method has in the class;
+        this will save a bit of processing later.
+        '''
+        misc_tools.OwnNameDiscoveringDescriptor.__init__(self, name=name)
+        self.method_function = method_function
+        self.max_size = max_size
+        self.time_to_keep = process_time_to_keep(time_to_keep)
+        self.thread_safe = thread_safe
+        self.__doc__ = getattr(method_function, '__doc__', None)
+
+        self._side_table = SideTable()
+        '''Caches of objects without a `__dict__`.'''
+        self._cache_name = None
+        '''The name of the attribute holding the cache on each object.'''
+
+        build_key = get_method_key_builder(method_function)
+        get_cache_dict = self._get_cache_dict
+
+        def cached(method_function, thing, *args, **kwargs):
+            cache_dict = get_cache_dict(thing)
+            call_key = build_key(cache_dict, thing, args, kwargs)
+            try:
+                return cache_dict[call_key]
+            except KeyError:
+                cache_dict[call_key] = value = \
+                                      method_function(thing, *args, **kwargs)
+                return value
+
+        self._cached_function = decorator_tools.decorator(cached,
+                                                          method_function)
+
+
+    def _create_cache_dict(self):
+        '''Create an empty cache for one object.'''
+        if self.max_size == infinity and self.time_to_keep is None:
+            # A plain `dict` is fast, and its operations are atomic so it's
+            # good for `thread_safe` too.
+            return {}
+        cache_dict_type = \
+                       SynchronizedCacheDict if self.thread_safe else CacheDict
+        return cache_dict_type(
+            max_size=self.max_size,
+            time_to_keep=self.time_to_keep,
+            # Looking up `_get_now` on every call so it could be patched:
+            get_now=lambda: decorators._get_now(),
+        )
+
+
+    def _get_cache_dict(self, thing):
+        '''Get the cache of `thing`, creating it if it doesn't exist yet.'''
+        instance_dict = getattr(thing, '__dict__', None)
+        if instance_dict is not None:
+            cache_name = self._cache_name
+            if cache_name is None:
+                cache_name = self._cache_name = \
+                                     '_%s_cache' % self.get_our_name(thing)
+            object_cache = instance_dict.get(cache_name)
+            if object_cache is None:
+                # `setdefault` is atomic, so concurrent first calls will agree
+                # on one cache:
+                object_cache = instance_dict.setdefault(
+                    cache_name,
+                    _ObjectCache(thing, self._create_cache_dict())
+                )
+            elif not object_cache.belongs_to(thing):
+                # We got the cache of the object that `thing` was copied from,
+                # or an empty one from unpickling.
+                object_cache = instance_dict[cache_name] = \
+                                 _ObjectCache(thing, self._create_cache_dict())
+            return object_cache.cache_dict
+
+        try:
+            return self._side_table[thing]
+        except KeyError:
+            return self._side_table.setdefault(thing,
+                                               self._create_cache_dict())
+
+
+    def __get__(self, thing, our_type=None):
+
+        if thing is None:
+            # We're being accessed from the class itself, not from an object
+            return self
+
+        return types.MethodType(self._cached_function, thing)
+
+
+    def __call__(self, thing, *args, **kwargs):
+        '''Call the method on `thing`, like calling a method on the class.'''
+        return self._cached_function(thing, *args, **kwargs)
+
+
+    def cache_clear(self, thing):
+        '''Clear the cache of `thing`.'''
+        self._get_cache_dict(thing).clear()
+
+
+    def __repr__(self):
+        return '<%s: %s>' % (type(self).__name__,
+                             self.our_name or self.method_function)
@@ -7,9 +7,85 @@ Defines the `CachedProperty` class.
 See its documentation for more details.
 '''
 
+import threading
+
 from python_toolbox import decorator_tools
 from python_toolbox import misc_tools
 
+from .side_table import SideTable
+from .single_flight import SingleFlight
+
+
+_dependency_installing_lock = threading.Lock()
+
+
+class _MISSING(misc_tools.NonInstantiable):
+    '''Sentinel for an attribute that isn't defined on the class.'''
+
+
+class _DependencyAttribute:
+    '''
+    An attribute that clears the cached properties derived from it when set.
+
+    `CachedProperty` puts this on a class in place of each attribute that its
+    cached properties depend on. Getting, setting and deleting are passed on
+    to `wrapped`, the attribute that was on the class before, if it's a data
+    descriptor, like a slot or a `property`. Otherwise the value is kept in
+    the object's `__dict__`, falling back to `wrapped` when getting.
+    '''
+    def __init__(self, name, wrapped=_MISSING):
+        self.name = name
+        self.wrapped = wrapped
+        self.dependents = []
+        '''The `CachedProperty` objects to clear when we're set or deleted.'''
+        self._is_wrapping_data_descriptor = \
+                                         hasattr(type(wrapped), '__set__')
+
+
+    def __get__(self, thing, our_type=None):
+        wrapped = self.wrapped
+        if thing is None:
+            if wrapped is _MISSING:
+                return self
+        elif self._is_wrapping_data_descriptor:
+            return type(wrapped).__get__(wrapped, thing, our_type)
+        else:
+            try:
+                return thing.__dict__[self.name]
+            except (KeyError, AttributeError):
+                if wrapped is _MISSING:
+                    raise AttributeError(
+                        '%r object has no attribute %r' %
+                        (type(thing).__name__, self.name)
+                    )
+        if hasattr(type(wrapped), '__get__'):
+            return type(wrapped).__get__(wrapped, thing, our_type)
+        return wrapped
+
+
+    def __set__(self, thing, value):
+        if self._is_wrapping_data_descriptor:
+            type(self.wrapped).__set__(self.wrapped, thing, value)
+        else:
+            thing.__dict__[self.name] = value
+        self._clear_dependents(thing)
+
+
+    def __delete__(self, thing):
+        if self._is_wrapping_data_descriptor:
+            type(self.wrapped).__delete__(self.wrapped, thing)
+        else:
+            try:
+                del thing.__dict__[self.name]
+            except (KeyError, AttributeError):
+                raise AttributeError(self.name)
+        self._clear_dependents(thing)
+
+
+    def _clear_dependents(self, thing):
+        for dependent in self.dependents:
+            dependent.cache_clear(thing)
+
 
 class CachedProperty(misc_tools.OwnNameDiscoveringDescriptor):
     '''
@@ -32,9 +108,34 @@ class CachedProperty(misc_tools.OwnNameDiscoveringDescriptor):
     returned instead of using a getter. (It can be a totally static value like
     `0`). If this value happens to be a callable but you'd still like it to be
     used as a static value, use `force_value_not_getter=True`.
+
+    The value is saved as an attribute on the object, so later accesses don't
+    even go through the property. On classes with `__slots__` and no
+    `__dict__`, it's saved in a side table instead, so the objects must have a
+    `__weakref__` slot.
+
+    If the property may be accessed from several threads at once, pass
+    `thread_safe=True` to make sure the getter is called only once per object.
+
+    If the value is derived from other attributes of the object, name them in
+    `depends_on`, and whenever one of them is set or deleted, the cached value
+    is thrown away, to be calculated again on the next access:
+
+        class Rectangle:
+            __slots__ = ('width', 'height', '__weakref__')
+
+            area = CachedProperty(lambda self: self.width * self.height,
+                                  depends_on=('width', 'height'))
+
+    The attributes may be regular attributes, slots, properties or other
+    `CachedProperty` objects. To make this work, on the first access to the
+    property, we replace each of them on the class with a thin wrapper, which
+    makes getting them a bit slower. You may also throw away the value
+    yourself with `Rectangle.area.cache_clear(rectangle)`.
     '''
     def __init__(self, getter_or_value, doc=None, name=None,
-                 force_value_not_getter=False):
+                 force_value_not_getter=False, thread_safe=False,
+                 depends_on=()):
         '''
         Construct the cached property.
         
@@ -44,6 +145,9 @@ class CachedProperty(misc_tools.OwnNameDiscoveringDescriptor):
         
         You may optionally pass in the name that this property has in the
         class; this will save a bit of processing later.
+
+        `depends_on` is a sequence of names of attributes that the value is
+        derived from.
         '''
         misc_tools.OwnNameDiscoveringDescriptor.__init__(self, name=name)
         if callable(getter_or_value) and not force_value_not_getter:
@@ -51,6 +155,27 @@ class CachedProperty(misc_tools.OwnNameDiscoveringDescriptor):
         else:
             self.getter = lambda thing: getter_or_value
         self.__doc__ = doc or getattr(self.getter, '__doc__', None)
+        self.thread_safe = thread_safe
+        self.depends_on = (depends_on,) if isinstance(depends_on, str) \
+                                                      else tuple(depends_on)
+        
+        self._dependents = []
+        '''
+        Records of `(type, cached_property)` for properties derived from ours.
+
+        Only values on instances of `type` are thrown away along with ours.
+        '''
+        self._side_table = SideTable()
+        '''Values of objects without a `__dict__`.'''
+        self._single_flight = SingleFlight() if thread_safe else None
+        self._n_clears = 0
+        '''
+        Number of times a value was thrown away, if `thread_safe`.
+
+        A value that was being calculated while a value was thrown away is
+        not saved, since it might have been calculated from stale attributes.
+        '''
+        self._are_dependencies_installed = not self.depends_on
         
         
     def __get__(self, thing, our_type=None):
@@ -59,12 +184,109 @@ class CachedProperty(misc_tools.OwnNameDiscoveringDescriptor):
             # We're being accessed from the class itself, not from an object
             return self
         
+        name = self.get_our_name(thing, our_type=our_type)
+        if not self._are_dependencies_installed:
+            self._install_dependencies(thing)
+        
+        if self._single_flight is not None:
+            n_clears = self._n_clears
+            def store(key, value):
+                # Under the lock, so a value can't be cleared while we check:
+                with self._single_flight.lock:
+                    if self._n_clears == n_clears:
+                        self._store(thing, name, value)
+            return self._single_flight.call(
+                None, id(thing), self.getter, (thing,), store=store,
+                load=lambda key: self._load(thing, name)
+            )
+        
+        if getattr(thing, '__dict__', None) is None:
+            try:
+                return self._side_table[thing]
+            except KeyError:
+                pass
+        
         value = self.getter(thing)
         
-        setattr(thing, self.get_our_name(thing, our_type=our_type), value)
+        self._store(thing, name, value)
         
         return value
 
+
+    def _load(self, thing, name):
+        '''Get the saved value of `thing`, raising `KeyError` if none.'''
+        instance_dict = getattr(thing, '__dict__', None)
+        if instance_dict is None:
+            return self._side_table[thing]
+        return instance_dict[name]
+
+
+    def _store(self, thing, name, value):
+        '''Save the value of `thing`.'''
+        if getattr(thing, '__dict__', None) is None:
+            self._side_table[thing] = value
+        else:
+            setattr(thing, name, value)
+
+
+    def cache_clear(self, thing):
+        '''
+        Throw away the value saved for `thing`.
+        
+        The values of the cached properties derived from this one are thrown
+        away too.
+        '''
+        name = self.get_our_name(thing)
+        if self._single_flight is not None:
+            with self._single_flight.lock:
+                self._n_clears += 1
+                self._forget(thing, name)
+        else:
+            self._forget(thing, name)
+        for type_, dependent in self._dependents:
+            if isinstance(thing, type_):
+                dependent.cache_clear(thing)
+
+
+    def _forget(self, thing, name):
+        instance_dict = getattr(thing, '__dict__', None)
+        if instance_dict is None:
+            self._side_table.pop(thing, None)
+        else:
+            instance_dict.pop(name, None)
+
+
+    def _install_dependencies(self, thing):
+        '''
+        Make the attributes in `depends_on` clear our value when they're set.
+        
+        See the class documentation for more details.
+        '''
+        with _dependency_installing_lock:
+            if self._are_dependencies_installed:
+                return
+            name = self.get_our_name(thing)
+            # The class we're defined on:
+            owner = next((type_ for type_ in type(thing).__mro__
+                          if vars(type_).get(name) is self), type(thing))
+            for dependency_name in self.depends_on:
+                for type_ in owner.__mro__:
+                    if dependency_name in vars(type_):
+                        dependency = vars(type_)[dependency_name]
+                        break
+                else:
+                    dependency = _MISSING
+                if isinstance(dependency, CachedProperty):
+                    dependency._dependents.append((owner, self))
+                    continue
+                if not isinstance(dependency, _DependencyAttribute) or \
+                                      dependency_name not in vars(owner):
+                    dependency = _DependencyAttribute(dependency_name,
+                                                      dependency)
+                    setattr(owner, dependency_name, dependency)
+                dependency.dependents.append(self)
+            self._are_dependencies_installed = True
+
     
     def __call__(self, method_function):
         '''
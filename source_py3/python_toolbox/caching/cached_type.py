@@ -7,13 +7,79 @@ Defines the `CachedType` metaclass.
 See its documentation for more details.
 '''
 
+import inspect
+import weakref
+
 from python_toolbox.sleek_reffing import SleekCallArgs
 
+from .statistics import CacheStatistics, CacheInfo
+from .key_building import strongly_keyable_types
+from .cache_dict import CacheDict
+
+infinity = float('inf')
+
 
 class SelfPlaceholder:
     '''Placeholder for `self` when storing call-args.''' 
 
 
+def _get_key_builder(init):
+    '''
+    Get a function that builds cache keys for calls to a `CachedType` class.
+
+    `init` is the `__init__` method of the class. The returned key builder is
+    called like `build_key(containing_dict, args, kwargs)` with the arguments
+    given to the class. If `init` has a simple signature, (without `*args`,
+    `**kwargs` or keyword-only arguments,) the arguments are first made
+    positional with the defaults filled in, so `A(1)`, `A(1, 2)` and `A(b=2,
+    a=1)` look the same. Then if they're all of `strongly_keyable_types`, the
+    key is their tuple. In all other cases the key is a `SleekCallArgs`.
+    '''
+    try:
+        arg_spec = inspect.getfullargspec(init)
+    except TypeError:
+        arg_spec = None
+    if arg_spec is None or arg_spec.varargs or arg_spec.varkw or \
+                                    arg_spec.kwonlyargs or not arg_spec.args:
+
+        def build_key(containing_dict, args, kwargs):
+            return SleekCallArgs(containing_dict, init,
+                                 *((SelfPlaceholder,) + args), **kwargs)
+
+        return build_key
+
+    names = arg_spec.args[1:]
+    parameter_count = len(names)
+    defaults = dict(zip(reversed(names), reversed(arg_spec.defaults or ())))
+
+    def build_key(containing_dict, args, kwargs):
+        if len(args) < parameter_count:
+            missing_args = []
+            n_used_kwargs = 0
+            for name in names[len(args):]:
+                if name in kwargs:
+                    missing_args.append(kwargs[name])
+                    n_used_kwargs += 1
+                elif name in defaults:
+                    missing_args.append(defaults[name])
+                else:
+                    break
+            else:
+                if n_used_kwargs == len(kwargs):
+                    args += tuple(missing_args)
+                    kwargs = {}
+        if not kwargs and len(args) == parameter_count:
+            for arg in args:
+                if type(arg) not in strongly_keyable_types:
+                    break
+            else:
+                return args
+        return SleekCallArgs(containing_dict, init,
+                             *((SelfPlaceholder,) + args), **kwargs)
+
+    return build_key
+
+
 class CachedType(type):
     '''
     A metaclass for sharing instances.
@@ -39,24 +105,90 @@ class CachedType(type):
     you can avoid memory leaks when using weakreffable arguments, but if you
     ever want to use non-weakreffable arguments you are still able to.
     (Assuming you don't mind the memory leaks.)
+    
+    Instances whose arguments are all simple immutable values, like numbers
+    and strings, are looked up by a tuple of their arguments, which is much
+    faster than building the sleekreffed call-args.
+    
+    By default all instances are kept forever. You may define the class with a
+    `max_size`, and then only the `max_size` most recently used instances are
+    kept by the class; older ones are kept only while other objects refer to
+    them, so `Grokker(1) is Grokker(1)` holds as long as you have a reference
+    to a `Grokker(1)`. (If the class has `__slots__` without a `__weakref__`
+    slot, older instances are just thrown away.)
+    
+        class Grokker(object, metaclass=caching.CachedType, max_size=1000):
+            ...
+    
+    Classes have a `cache_info()` method, which returns a `CacheInfo` like the
+    one of functions decorated with `cache`. To have hits, misses and
+    construction time counted, define the class with `collect_stats=True`:
+    
+        class Grokker(object, metaclass=caching.CachedType,
+                      collect_stats=True):
+            ...
+            
     '''
     
-    def __new__(mcls, *args, **kwargs):
+    def __new__(mcls, *args, collect_stats=False, max_size=infinity,
+                **kwargs):
         result = super().__new__(mcls, *args, **kwargs)
-        result.__cache = {}
+        if max_size == infinity:
+            result.__cache = {}
+            result.__weak_cache = None
+        else:
+            result.__cache = CacheDict(max_size=max_size)
+            result.__weak_cache = weakref.WeakValueDictionary()
+        result.__build_key = _get_key_builder(result.__init__)
+        result.__statistics = CacheStatistics() if collect_stats else None
         return result
 
     
+    def __init__(cls, *args, collect_stats=False, max_size=infinity,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+
+    
     def __call__(cls, *args, **kwargs):
-        sleek_call_args = SleekCallArgs(
-            cls.__cache,
-            cls.__init__,
-            *((SelfPlaceholder,) + args),
-            **kwargs
-        )
+        cache = cls.__cache
+        call_key = cls.__build_key(cache, args, kwargs)
+        statistics = cls.__statistics
         try:
-            return cls.__cache[sleek_call_args]
+            value = cache[call_key]
         except KeyError:
-            cls.__cache[sleek_call_args] = value = \
-                                              super().__call__(*args, **kwargs)
-            return value
+            weak_cache = cls.__weak_cache
+            value = None if weak_cache is None else weak_cache.get(call_key)
+            if value is None:
+                if statistics is None:
+                    value = super().__call__(*args, **kwargs)
+                else:
+                    statistics.misses += 1
+                    value = statistics.timed_call(super().__call__, args,
+                                                  kwargs)
+                if weak_cache is not None:
+                    try:
+                        weak_cache[call_key] = value
+                    except TypeError: # Not weakreffable
+                        pass
+            elif statistics is not None:
+                statistics.hits += 1
+            cache[call_key] = value
+        else:
+            if statistics is not None:
+                statistics.hits += 1
+        return value
+
+    
+    def cache_info(cls):
+        '''Get a `CacheInfo` with statistics about the cached instances.'''
+        statistics = cls.__statistics
+        if statistics is None:
+            hits = misses = compute_time = None
+        else:
+            hits, misses, compute_time = (
+                statistics.hits, statistics.misses, statistics.compute_time
+            )
+        return CacheInfo(hits=hits, misses=misses,
+                         evictions=getattr(cls.__cache, 'n_evictions', 0),
+                         expirations=0, size=len(cls.__cache),
+                         compute_time=compute_time)
@@ -6,14 +6,28 @@ Defines the `cache` decorator.
 
 See its documentation for more details.
 '''
-# todo: examine thread-safety
 
+import sys
+import time
+import inspect
+import functools
+import threading
+import collections
+import concurrent.futures
 import datetime as datetime_module
+import pickle as pickle_module
 
 from python_toolbox import misc_tools
-from python_toolbox import binary_search
 from python_toolbox import decorator_tools
-from python_toolbox.sleek_reffing import SleekCallArgs
+
+from .key_building import (get_key_builder, get_argument_normalizer,
+                           get_stable_key)
+from .cache_dict import (CacheDict, SynchronizedCacheDict,
+                         process_time_to_keep)
+from .single_flight import SingleFlight
+from .statistics import CacheStatistics, CacheInfo
+from .size_estimation import get_size_estimator
+from .eviction_policies import get_policy_type, GreedyDualSizePolicy
 
 infinity = float('inf')
 
@@ -31,8 +45,73 @@ def _get_now():
     return datetime_module.datetime.now()
 
 
+def _get_storage_backed_function(function, storage):
+    '''
+    Get a version of `function` that keeps its results in `storage`.
+    
+    The returned function looks the result up in `storage` before computing
+    it, and saves computed results to it. Arguments or results that can't be
+    pickled are just not stored.
+    '''
+    namespace = '%s.%s' % (function.__module__, function.__qualname__)
+    
+    @misc_tools.set_attributes(namespace=namespace)
+    def storage_backed_function(*args, **kwargs):
+        try:
+            stable_key = get_stable_key(args, kwargs)
+        except TypeError:
+            return function(*args, **kwargs)
+        try:
+            return storage.get(namespace, stable_key)
+        except KeyError:
+            pass
+        value = function(*args, **kwargs)
+        try:
+            storage.set(namespace, stable_key, value)
+        except (pickle_module.PicklingError, TypeError, AttributeError):
+            pass
+        return value
+    
+    return storage_backed_function
+
+
+_default_refresh_executor = None
+_default_refresh_executor_lock = threading.Lock()
+
+
+def _get_default_refresh_executor():
+    '''Get the shared thread pool for refreshing stale results.'''
+    global _default_refresh_executor
+    with _default_refresh_executor_lock:
+        if _default_refresh_executor is None:
+            _default_refresh_executor = \
+                          concurrent.futures.ThreadPoolExecutor(max_workers=4)
+        return _default_refresh_executor
+
+
+def _forget_failed_task(cache_dict, key, statistics, start_time, task):
+    '''
+    Done-callback for a task that a cached coroutine function started.
+
+    If the task failed or was cancelled, it's removed from `cache_dict`, so
+    the next call will try again rather than get the same exception.
+    '''
+    if statistics is not None:
+        statistics.compute_time += time.perf_counter() - start_time
+    if task.cancelled() or task.exception() is not None:
+        try:
+            if cache_dict[key] is task:
+                del cache_dict[key]
+        except KeyError:
+            pass
+
+
 @decorator_tools.helpful_decorator_builder
-def cache(max_size=infinity, time_to_keep=None):
+def cache(max_size=infinity, time_to_keep=None, thread_safe=False,
+          collect_stats=False, stats_reporter=None, stats_report_interval=60,
+          storage=None, max_bytes=infinity, size_estimator='deep',
+          cost_aware=False, policy='lru', batch_function=None,
+          time_to_refresh=None, refresh_executor=None, hash_contents=False):
     '''
     Cache a function, saving results so they won't have to be computed again.
     
@@ -55,34 +134,96 @@ def cache(max_size=infinity, time_to_keep=None):
     ever want to use non-weakreffable arguments you are still able to.
     (Assuming you don't mind the memory leaks.)
     
+    Unhashable arguments are hashed with `cheat_hashing.cheat_hash`, which
+    hashes objects it doesn't know, like NumPy arrays, by `id`. If you pass
+    `hash_contents=True`, arguments that support the buffer protocol, even
+    inside lists and dicts, are hashed by their contents and compared by their
+    contents, so a call with an equal array gets the cached result. (See
+    `cheat_hashing.content_hash`.) Don't modify an array after passing it.
+    
     You may optionally specify a `max_size` for maximum number of cached
     results to store; old entries are thrown away according to a
-    least-recently-used alogrithm. (Often abbreivated LRU.)
+    least-recently-used alogrithm. (Often abbreivated LRU.) You may choose a
+    different algorithm with `policy`: `'lfu'` for least-frequently-used,
+    `'2q'` or `'arc'` for algorithms that resist scans flushing the cache,
+    `'tinylfu'` for W-TinyLFU, which only admits new results that are used
+    more often than the ones they'd push out, or `'gds'` for
+    GreedyDual-Size. You may also pass your own `EvictionPolicy` subclass.
     
     You may optionally specific a `time_to_keep`, which is a time period after
     which a cache entry will expire. (Pass in either a `timedelta` object or
-    keyword arguments to create one.)
-    '''
-    # todo idea: figure how how complex the function's argspec is, and then
-    # compile a function accordingly, so functions with a simple argspec won't
-    # have to go through so much shit. update: probably it will help only for
-    # completely argumentless function. so do one for those.
+    keyword arguments to create one.) `max_size` and `time_to_keep` may be
+    used together.
     
-    from python_toolbox.nifty_collections import OrderedDict
+    You may also specify a `time_to_refresh`, shorter than `time_to_keep`.
+    After that time, a cached result is stale: It's still returned right away,
+    but it's recomputed in the background, so callers of popular arguments
+    won't have to wait for the recomputation. Only after `time_to_keep` does
+    the result expire, and the next caller computes it again. Results are
+    recomputed on `refresh_executor`, a `concurrent.futures.Executor`, or a
+    shared thread pool by default. If the recomputation raises an exception,
+    the stale result is kept, and the next call tries again. `time_to_refresh`
+    can't be used together with `storage`, which would just give the stale
+    result back.
     
-    if time_to_keep is not None:
-        if max_size != infinity:
-            raise NotImplementedError
-        if not isinstance(time_to_keep, datetime_module.timedelta):
-            try:
-                time_to_keep = datetime_module.timedelta(**time_to_keep)
-            except Exception:
-                raise TypeError(
-                    '`time_limit` must be either a `timedelta` object or a '
-                    'dict of keyword arguments for constructing a '
-                    '`timedelta` object.'
-                )
-        assert isinstance(time_to_keep, datetime_module.timedelta)
+    You may optionally specify `max_bytes` for the maximum total size of the
+    cached results in memory. Sizes are estimated by `size_estimator`, which
+    may be `'deep'`, for following the objects that the result refers to,
+    `'shallow'`, for just `sys.getsizeof`, or your own function that takes a
+    result and returns its size in bytes. A result bigger than `max_bytes`
+    isn't cached.
+    
+    If you pass `cost_aware=True`, (which is the same as `policy='gds'`,)
+    results are thrown away by the GreedyDual-Size algorithm rather than LRU:
+    The results that took the least time to compute per byte are thrown away
+    first, and results that weren't used in a while slowly lose their value.
+    This is good for keeping as much compute time as possible within
+    `max_bytes`.
+    
+    If you'll call the function from several threads, pass `thread_safe=True`.
+    Then when several threads miss the cache on the same arguments at the same
+    time, only one of them computes the result while the others wait for it.
+    (If the computation raises an exception, it's raised in all of them.)
+    Threads computing results for different arguments don't wait for each
+    other. This holds for `cache_map` too: Results that other threads are
+    computing are waited for, and only the rest are computed.
+    
+    The cached function has a `cache_info()` method that returns a `CacheInfo`
+    with the numbers of hits, misses, evictions and expirations, the current
+    size of the cache, and the total time spent computing misses. Hits, misses
+    and compute time are only counted if you pass `collect_stats=True`, so
+    caches that don't need them don't pay for them. You may also pass a
+    `stats_reporter` function, which will be called with the `CacheInfo` at
+    most once every `stats_report_interval` seconds, for exporting the
+    statistics somewhere. The statistics are cumulative; they aren't reset by
+    `cache_clear()`.
+    
+    The cached function has a `cache_map(*iterables)` method, which is like
+    `map` but returns a list: `f.cache_map(xs, ys)` returns `[f(x, y) for x,
+    y in zip(xs, ys)]`. Results that are cached are taken from the cache, and
+    only the rest are computed. If you also pass a `batch_function`, all the
+    missing results are computed with one call to it: It's called like
+    `cache_map`, with one list for each argument, holding the arguments of the
+    missing calls, and it should return a list of their results in the same
+    order. (See also `batch_cache`.)
+
+    `cache` may also be used on `asyncio` coroutine functions. The cache then
+    keeps a task for each call, and awaiting the cached function gets the
+    task's result, so concurrent awaiters of the same arguments share one
+    computation. If the computation fails or is cancelled, it's thrown out of
+    the cache. (Cancelling one awaiter doesn't cancel the computation for the
+    others.) `storage`, `max_bytes`, `cost_aware` and `time_to_refresh` aren't
+    supported for coroutine functions.
+    '''
+    time_to_keep = process_time_to_keep(time_to_keep)
+    time_to_refresh = process_time_to_keep(time_to_refresh)
+    if time_to_refresh is not None and time_to_keep is not None and \
+                                              time_to_refresh >= time_to_keep:
+        raise ValueError('`time_to_refresh` must be shorter than '
+                         '`time_to_keep`.')
+    get_size = get_size_estimator(size_estimator)
+    policy_type = GreedyDualSizePolicy if cost_aware else \
+                                                      get_policy_type(policy)
         
 
     def decorator(function):
@@ -90,72 +231,204 @@ def cache(max_size=infinity, time_to_keep=None):
         # In case we're being given a function that is already cached:
         if getattr(function, 'is_cached', False): return function
         
-        if max_size == infinity:
-            
-            if time_to_keep:
+        build_key = get_key_builder(function, hash_contents=hash_contents)
 
-                sorting_key_function = lambda sleek_call_args: \
-                                              cached._cache[sleek_call_args][1]
+        # Legacy generator-based coroutines, made with `asyncio.coroutine`,
+        # are only recognized by `asyncio`. If it wasn't imported, `function`
+        # can't be one of them, and we don't want to import it for nothing.
+        is_coroutine_function = inspect.iscoroutinefunction(function) or (
+            'asyncio' in sys.modules and
+            sys.modules['asyncio'].iscoroutinefunction(function)
+        )
 
+        if storage is None:
+            compute = function
+        elif is_coroutine_function:
+            raise NotImplementedError(
+                "`storage` isn't supported for coroutine functions."
+            )
+        elif batch_function is not None:
+            raise NotImplementedError(
+                "`storage` and `batch_function` can't be used together."
+            )
+        elif time_to_refresh is not None:
+            # Refreshing would just read the stale result back from the
+            # storage.
+            raise NotImplementedError(
+                "`storage` and `time_to_refresh` can't be used together."
+            )
+        else:
+            compute = _get_storage_backed_function(function, storage)
+            
+        if is_coroutine_function and (max_bytes != infinity or
+                                      policy_type.uses_cost or
+                                      time_to_refresh is not None):
+            raise NotImplementedError(
+                "`max_bytes`, `cost_aware` and `time_to_refresh` aren't "
+                "supported for coroutine functions."
+            )
+        
+        if max_size == infinity and time_to_keep is None and \
+                           max_bytes == infinity and time_to_refresh is None:
+            # A plain `dict` is fast, and its operations are atomic so it's
+            # good for `thread_safe` too.
+            cache_dict = {}
+        else:
+            # When refreshing, the dict is also changed by background threads.
+            is_synchronized = thread_safe or time_to_refresh is not None
+            cache_dict_type = \
+                       SynchronizedCacheDict if is_synchronized else CacheDict
+            cache_dict = cache_dict_type(
+                max_size=max_size,
+                time_to_keep=time_to_keep,
+                # Looking up `_get_now` on every call so it could be patched:
+                get_now=lambda: _get_now(),
+                max_bytes=max_bytes,
+                get_size=get_size,
+                policy=policy_type,
+                time_to_refresh=time_to_refresh,
+            )
+        
+        if collect_stats or stats_reporter is not None:
+            statistics = CacheStatistics(reporter=stats_reporter,
+                                         report_interval=stats_report_interval)
+        else:
+            statistics = None
+        
+        is_cost_aware = getattr(cache_dict, 'policy', None) is not None and \
+                                                  cache_dict.policy.uses_cost
+        
+        if thread_safe:
+            single_flight = SingleFlight(
+                lock=getattr(cache_dict, 'lock', None)
+            )
+        
+        def set_value(key, value, cost):
+            if is_cost_aware:
+                cached._cache.set(key, value, cost=cost)
+            else:
+                cached._cache[key] = value
+            
+        def store(start_time, key, value):
+            # The cost of a result is the time it took to compute.
+            compute_time = time.perf_counter() - start_time
+            set_value(key, value, compute_time)
+            if statistics is not None:
+                statistics.compute_time += compute_time
                 
-                def remove_expired_entries():
-                    almost_cutting_point = \
-                                          binary_search.binary_search_by_index(
-                        list(cached._cache.keys()),
-                        _get_now(), 
-                        sorting_key_function,
-                        rounding=binary_search.LOW
-                    )
-                    if almost_cutting_point is not None:
-                        cutting_point = almost_cutting_point + 1
-                        for key in list(cached._cache.keys())[:cutting_point]:
-                            del cached._cache[key]
-                            
-                @misc_tools.set_attributes(_cache=OrderedDict())        
-                def cached(function, *args, **kwargs):
-                    remove_expired_entries()
-                    sleek_call_args = \
-                        SleekCallArgs(cached._cache, function, *args, **kwargs)
-                    try:
-                        return cached._cache[sleek_call_args][0]
-                    except KeyError:
-                        value = function(*args, **kwargs)
-                        cached._cache[sleek_call_args] = (
-                            value,
-                            _get_now() + time_to_keep
+        def refresh(key, args, kwargs):
+            start_time = time.perf_counter()
+            try:
+                value = compute(*args, **kwargs)
+            except Exception:
+                # Keep serving the stale value, and try again next time.
+                cached._cache.release_refresh(key)
+            else:
+                store(start_time, key, value)
+        
+        if is_coroutine_function:
+            
+            import asyncio
+
+            @misc_tools.set_attributes(_cache=cache_dict)
+            def cached(function, *args, **kwargs):
+                call_key = build_key(cached._cache, args, kwargs)
+                try:
+                    task = cached._cache[call_key]
+                except KeyError:
+                    task = asyncio.ensure_future(compute(*args, **kwargs))
+                    cached._cache[call_key] = task
+                    task.add_done_callback(functools.partial(
+                        _forget_failed_task, cached._cache, call_key,
+                        statistics, time.perf_counter()
+                    ))
+                    if statistics is not None:
+                        statistics.misses += 1
+                else:
+                    if statistics is not None:
+                        statistics.hits += 1
+                        if statistics.reporter is not None:
+                            statistics.report_if_due()
+                # Shielding so an awaiter that gets cancelled won't cancel the
+                # task for all other awaiters:
+                return asyncio.shield(task)
+
+        elif is_cost_aware or time_to_refresh is not None:
+            
+            @misc_tools.set_attributes(_cache=cache_dict)
+            def cached(function, *args, **kwargs):
+                call_key = build_key(cached._cache, args, kwargs)
+                try:
+                    value = cached._cache[call_key]
+                except KeyError:
+                    if statistics is not None:
+                        statistics.misses += 1
+                    start_time = time.perf_counter()
+                    if thread_safe:
+                        value = single_flight.call(
+                            cached._cache, call_key, compute, args, kwargs,
+                            store=functools.partial(store, start_time)
                         )
-                        cached._cache.sort(key=sorting_key_function)
-                        return value
+                    else:
+                        value = compute(*args, **kwargs)
+                        store(start_time, call_key, value)
+                else:
+                    if statistics is not None:
+                        statistics.hits += 1
+                    if time_to_refresh is not None and \
+                                      cached._cache.claim_refresh(call_key):
+                        (refresh_executor or
+                         _get_default_refresh_executor()).submit(
+                            refresh, call_key, args, kwargs
+                        )
+                if statistics is not None and statistics.reporter is not None:
+                    statistics.report_if_due()
+                return value
                 
-            else: # not time_to_keep
+        elif statistics is None and not thread_safe:
+
+            @misc_tools.set_attributes(_cache=cache_dict)
+            def cached(function, *args, **kwargs):
+                call_key = build_key(cached._cache, args, kwargs)
+                try:
+                    return cached._cache[call_key]
+                except KeyError:
+                    cached._cache[call_key] = value = compute(*args, **kwargs)
+                    return value
                 
-                @misc_tools.set_attributes(_cache={})        
-                def cached(function, *args, **kwargs):
-                    sleek_call_args = \
-                        SleekCallArgs(cached._cache, function, *args, **kwargs)
-                    try:
-                        return cached._cache[sleek_call_args]
-                    except KeyError:
-                        cached._cache[sleek_call_args] = value = \
-                              function(*args, **kwargs)
-                        return value
-    
-        else: # max_size < infinity
+        elif statistics is None: # and thread_safe
             
-            @misc_tools.set_attributes(_cache=OrderedDict())        
+            @misc_tools.set_attributes(_cache=cache_dict)
             def cached(function, *args, **kwargs):
-                sleek_call_args = \
-                    SleekCallArgs(cached._cache, function, *args, **kwargs)
+                call_key = build_key(cached._cache, args, kwargs)
                 try:
-                    result = cached._cache[sleek_call_args]
-                    cached._cache.move_to_end(sleek_call_args)
-                    return result
+                    return cached._cache[call_key]
                 except KeyError:
-                    cached._cache[sleek_call_args] = value = \
-                        function(*args, **kwargs)
-                    if len(cached._cache) > max_size:
-                        cached._cache.popitem(last=False)
-                    return value
+                    return single_flight.call(cached._cache, call_key,
+                                              compute, args, kwargs)
+                
+        else: # statistics is not None
+            
+            @misc_tools.set_attributes(_cache=cache_dict)
+            def cached(function, *args, **kwargs):
+                call_key = build_key(cached._cache, args, kwargs)
+                try:
+                    value = cached._cache[call_key]
+                except KeyError:
+                    statistics.misses += 1
+                    if thread_safe:
+                        value = single_flight.call(
+                            cached._cache, call_key, statistics.timed_call,
+                            (compute, args, kwargs)
+                        )
+                    else:
+                        cached._cache[call_key] = value = \
+                                   statistics.timed_call(compute, args, kwargs)
+                else:
+                    statistics.hits += 1
+                if statistics.reporter is not None:
+                    statistics.report_if_due()
+                return value
                     
         
         result = decorator_tools.decorator(cached, function)
@@ -163,6 +436,8 @@ def cache(max_size=infinity, time_to_keep=None):
         def cache_clear(key=CLEAR_ENTIRE_CACHE):
             if key is CLEAR_ENTIRE_CACHE:
                 cached._cache.clear()
+                if storage is not None:
+                    storage.clear(compute.namespace)
             else:
                 try:
                     del cached._cache[key]
@@ -171,8 +446,171 @@ def cache(max_size=infinity, time_to_keep=None):
                 
         result.cache_clear = cache_clear
         
+        def cache_info():
+            if statistics is None:
+                hits = misses = compute_time = None
+            else:
+                hits, misses, compute_time = (
+                    statistics.hits, statistics.misses, statistics.compute_time
+                )
+            return CacheInfo(
+                hits=hits,
+                misses=misses,
+                evictions=getattr(cached._cache, 'n_evictions', 0),
+                expirations=getattr(cached._cache, 'n_expirations', 0),
+                size=len(cached._cache),
+                compute_time=compute_time,
+            )
+        
+        result.cache_info = cache_info
+        if statistics is not None:
+            statistics.get_cache_info = cache_info
+            
+        normalize_arguments = get_argument_normalizer(function)
+        
+        def cache_map(*iterables):
+            if is_coroutine_function:
+                raise NotImplementedError(
+                    "`cache_map` isn't supported for coroutine functions."
+                )
+            calls = list(zip(*iterables))
+            results = [None] * len(calls)
+            missing_calls = collections.OrderedDict()
+            '''Mapping from key to `(call, normalized_args, indices)`.'''
+            for i, call in enumerate(calls):
+                args = normalize_arguments(call)
+                call_key = build_key(cached._cache, args, {})
+                try:
+                    results[i] = cached._cache[call_key]
+                except KeyError:
+                    try:
+                        missing_calls[call_key][2].append(i)
+                    except KeyError:
+                        missing_calls[call_key] = (call, args, [i])
+                else:
+                    if time_to_refresh is not None and \
+                                      cached._cache.claim_refresh(call_key):
+                        (refresh_executor or
+                         _get_default_refresh_executor()).submit(
+                            refresh, call_key, args, {}
+                        )
+                        
+            compute_times = []
+            '''The time it took to compute the missing results, if we did.'''
+            costs = []
+            '''The cost of each result we computed, its share of that time.'''
+            
+            def compute_missing(call_keys):
+                start_time = time.perf_counter()
+                if batch_function is None:
+                    values = [compute(*missing_calls[call_key][1]) for
+                              call_key in call_keys]
+                else:
+                    values = list(batch_function(*map(list, zip(
+                        *(missing_calls[call_key][0] for call_key in call_keys)
+                    ))))
+                    if len(values) != len(call_keys):
+                        raise ValueError(
+                            'The batch function returned %s results for %s '
+                            'calls.' % (len(values), len(call_keys))
+                        )
+                compute_times.append(time.perf_counter() - start_time)
+                costs.append(compute_times[0] / len(call_keys))
+                return values
+            
+            def store_missing(call_key, value):
+                set_value(call_key, value, costs[0])
+            
+            if missing_calls:
+                if thread_safe:
+                    # Results that other threads are computing are waited
+                    # for, and only the rest are computed here:
+                    values = single_flight.call_many(
+                        cached._cache, list(missing_calls), compute_missing,
+                        store=store_missing
+                    )
+                else:
+                    values = compute_missing(list(missing_calls))
+                    for call_key, value in zip(missing_calls, values):
+                        store_missing(call_key, value)
+                for (_, _, indices), value in zip(missing_calls.values(),
+                                                  values):
+                    for i in indices:
+                        results[i] = value
+                        
+            if statistics is not None:
+                statistics.misses += len(missing_calls)
+                statistics.hits += len(calls) - len(missing_calls)
+                statistics.compute_time += sum(compute_times)
+                if statistics.reporter is not None:
+                    statistics.report_if_due()
+            return results
+        
+        result.cache_map = cache_map
+        
         result.is_cached = True
         
         return result
         
     return decorator
+
+
+@decorator_tools.helpful_decorator_builder
+def batch_cache(max_size=infinity, time_to_keep=None, thread_safe=False,
+                collect_stats=False, stats_reporter=None,
+                stats_report_interval=60, max_bytes=infinity,
+                size_estimator='deep', cost_aware=False, policy='lru',
+                time_to_refresh=None, refresh_executor=None,
+                hash_contents=False):
+    '''
+    Cache a batch function, computing only the results that aren't cached.
+
+    A batch function takes lists of arguments, one list for each parameter,
+    and returns a list of the results for each call, in order. For example:
+
+        @batch_cache(max_size=1000)
+        def get_users(user_ids):
+            return database.fetch_users(user_ids)
+
+    When you call `get_users([1, 2, 3])`, the results for users that are in
+    the cache are taken from it, and the rest are fetched with a single call
+    to the original `get_users`, with just the missing user IDs. Each result
+    is cached separately, so it'll be used for any batch that includes it.
+
+    Takes the same arguments as `cache`, except `storage`. The decorated
+    function has `cache_clear` and `cache_info` methods like a function
+    decorated with `cache`, and a `single` attribute, which is the cached
+    function for a single call, as in `get_users.single(1)`.
+    '''
+    
+    def decorator(batch_function):
+        
+        def call_batch_function_once(batch_function, *args):
+            return batch_function(*([arg] for arg in args))[0]
+        
+        cache_decorator = cache(
+            max_size=max_size, time_to_keep=time_to_keep,
+            thread_safe=thread_safe, collect_stats=collect_stats,
+            stats_reporter=stats_reporter,
+            stats_report_interval=stats_report_interval, max_bytes=max_bytes,
+            size_estimator=size_estimator, cost_aware=cost_aware,
+            policy=policy, batch_function=batch_function,
+            time_to_refresh=time_to_refresh,
+            refresh_executor=refresh_executor, hash_contents=hash_contents
+        )
+        single = cache_decorator(
+            decorator_tools.decorator(call_batch_function_once,
+                                      batch_function)
+        )
+        
+        @functools.wraps(batch_function)
+        def batch_cached(*iterables):
+            return single.cache_map(*iterables)
+        
+        batch_cached.single = single
+        batch_cached.cache_clear = single.cache_clear
+        batch_cached.cache_info = single.cache_info
+        batch_cached.is_cached = True
+        return batch_cached
+    
+    return decorator
@@ -0,0 +1,594 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Defines eviction policies for `CacheDict`.
+
+See documentation of `EvictionPolicy` for more details.
+'''
+
+import abc
+import heapq
+import itertools
+import collections
+
+infinity = float('inf')
+
+
+class EvictionPolicy(metaclass=abc.ABCMeta):
+    '''
+    A policy for choosing which entry a bounded cache throws away.
+
+    A `CacheDict` tells its policy about every key that's added to it, used,
+    or removed, and asks the policy for a victim whenever it has too many
+    entries. The policy only keeps track of keys; the values are kept by the
+    `CacheDict`.
+
+    Some policies remember keys that were thrown away recently, as "ghosts".
+    They only remember their hashes, so they don't keep the keys alive, and a
+    hash collision at worst makes for a slightly worse decision.
+    '''
+
+    needs_max_size = False
+    '''Whether this policy needs a finite `max_size` to work.'''
+
+    uses_cost = False
+    '''Whether this policy cares about the `cost` given to `add`.'''
+
+    def __init__(self, max_size=infinity):
+        '''
+        Construct the policy.
+
+        `max_size` is the maximum number of entries the cache will hold.
+        '''
+        if self.needs_max_size and max_size == infinity:
+            raise ValueError('%s needs a `max_size`.' % type(self).__name__)
+        self.max_size = max_size
+
+    @abc.abstractmethod
+    def add(self, key, size=1, cost=1):
+        '''Note that `key` was added to the cache.'''
+
+    @abc.abstractmethod
+    def touch(self, key):
+        '''Note that `key` was used.'''
+
+    @abc.abstractmethod
+    def remove(self, key):
+        '''Note that `key` was removed from the cache.'''
+
+    @abc.abstractmethod
+    def pop_victim(self):
+        '''Choose a key to throw away, forget it and return it.'''
+
+    @abc.abstractmethod
+    def clear(self):
+        '''Forget all keys.'''
+
+
+
+class LruPolicy(EvictionPolicy):
+    '''Throws away the least-recently-used entry.'''
+
+    def __init__(self, max_size=infinity):
+        EvictionPolicy.__init__(self, max_size)
+        self._keys = collections.OrderedDict()
+        '''Keys, ordered from least to most recently used.'''
+
+
+    def add(self, key, size=1, cost=1):
+        self._keys[key] = None
+
+
+    def touch(self, key):
+        self._keys.move_to_end(key)
+
+
+    def remove(self, key):
+        del self._keys[key]
+
+
+    def pop_victim(self):
+        return self._keys.popitem(last=False)[0]
+
+
+    def clear(self):
+        self._keys.clear()
+
+
+
+class _FrequencyNode:
+    '''A node in `LfuPolicy`'s linked list of frequencies.'''
+
+    __slots__ = ('frequency', 'keys', 'previous', 'next')
+
+    def __init__(self, frequency, previous, next):
+        self.frequency = frequency
+        self.keys = collections.OrderedDict()
+        self.previous = previous
+        self.next = next
+        previous.next = next.previous = self
+
+
+class LfuPolicy(EvictionPolicy):
+    '''
+    Throws away the least-frequently-used entry.
+
+    Of entries used equally often, the least recently used is thrown away.
+    Keys are kept in a linked list of nodes, one for each frequency in use,
+    so every operation is O(1).
+    '''
+
+    def __init__(self, max_size=infinity):
+        EvictionPolicy.__init__(self, max_size)
+        self.clear()
+
+
+    def _unlink_if_empty(self, node):
+        if not node.keys:
+            node.previous.next = node.next
+            node.next.previous = node.previous
+
+
+    def add(self, key, size=1, cost=1):
+        node = self._head.next
+        if node.frequency != 1:
+            node = _FrequencyNode(1, self._head, node)
+        node.keys[key] = None
+        self._nodes[key] = node
+
+
+    def touch(self, key):
+        node = self._nodes[key]
+        next_node = node.next
+        if next_node.frequency != node.frequency + 1:
+            next_node = _FrequencyNode(node.frequency + 1, node, next_node)
+        del node.keys[key]
+        next_node.keys[key] = None
+        self._nodes[key] = next_node
+        self._unlink_if_empty(node)
+
+
+    def remove(self, key):
+        node = self._nodes.pop(key)
+        del node.keys[key]
+        self._unlink_if_empty(node)
+
+
+    def pop_victim(self):
+        node = self._head.next
+        key = node.keys.popitem(last=False)[0]
+        del self._nodes[key]
+        self._unlink_if_empty(node)
+        return key
+
+
+    def clear(self):
+        self._nodes = {}
+        '''Mapping from key to the node of its frequency.'''
+        self._head = _FrequencyNode.__new__(_FrequencyNode)
+        self._head.frequency = 0
+        self._head.next = self._head.previous = self._head
+        '''
+        Sentinel node of the list of frequencies.
+
+        The nodes are sorted by frequency; `self._head.next` is the node of
+        the lowest frequency.
+        '''
+
+
+
+class TwoQueuePolicy(EvictionPolicy):
+    '''
+    Throws away entries by the 2Q algorithm.
+
+    New entries go into a FIFO queue that takes a quarter of the cache. When
+    they're thrown away from it, their hashes are remembered for a while, and
+    if they're added again during that time, they go into the main LRU queue.
+    Entries that were used only once, as in a scan, don't push the entries
+    that are used often out of the cache.
+    '''
+
+    needs_max_size = True
+
+    def __init__(self, max_size=infinity):
+        EvictionPolicy.__init__(self, max_size)
+        self.in_size = max(max_size // 4, 1)
+        '''Number of entries in the FIFO queue before we take from it.'''
+        self.out_size = max(max_size // 2, 1)
+        '''Number of ghosts to remember.'''
+        self._in_keys = collections.OrderedDict()
+        self._out_hashes = collections.OrderedDict()
+        self._main_keys = collections.OrderedDict()
+
+
+    def add(self, key, size=1, cost=1):
+        hash_ = hash(key)
+        if hash_ in self._out_hashes:
+            del self._out_hashes[hash_]
+            self._main_keys[key] = None
+        else:
+            self._in_keys[key] = None
+
+
+    def touch(self, key):
+        if key in self._main_keys:
+            self._main_keys.move_to_end(key)
+
+
+    def remove(self, key):
+        try:
+            del self._in_keys[key]
+        except KeyError:
+            del self._main_keys[key]
+
+
+    def pop_victim(self):
+        if len(self._in_keys) > self.in_size or not self._main_keys:
+            key = self._in_keys.popitem(last=False)[0]
+            self._out_hashes[hash(key)] = None
+            if len(self._out_hashes) > self.out_size:
+                self._out_hashes.popitem(last=False)
+            return key
+        return self._main_keys.popitem(last=False)[0]
+
+
+    def clear(self):
+        self._in_keys.clear()
+        self._out_hashes.clear()
+        self._main_keys.clear()
+
+
+
+class ArcPolicy(EvictionPolicy):
+    '''
+    Throws away entries by the Adaptive Replacement Cache algorithm.
+
+    Entries used once are kept in one LRU list and entries used more than
+    once in another. Hashes of entries thrown away from each list are
+    remembered for a while, and a hit on one of those ghosts grows the share
+    of the list it was thrown away from. This way the cache adapts between
+    favoring recency and favoring frequency, and scans don't flush it.
+    '''
+
+    needs_max_size = True
+
+    def __init__(self, max_size=infinity):
+        EvictionPolicy.__init__(self, max_size)
+        self.clear()
+
+
+    def add(self, key, size=1, cost=1):
+        hash_ = hash(key)
+        if hash_ in self._recent_ghosts:
+            self._recent_target = min(
+                self._recent_target + max(len(self._frequent_ghosts) /
+                                          len(self._recent_ghosts), 1),
+                self.max_size
+            )
+            del self._recent_ghosts[hash_]
+            self._frequent_keys[key] = None
+        elif hash_ in self._frequent_ghosts:
+            self._recent_target = max(
+                self._recent_target - max(len(self._recent_ghosts) /
+                                          len(self._frequent_ghosts), 1),
+                0
+            )
+            del self._frequent_ghosts[hash_]
+            self._frequent_keys[key] = None
+        else:
+            self._recent_keys[key] = None
+
+
+    def touch(self, key):
+        try:
+            del self._recent_keys[key]
+        except KeyError:
+            self._frequent_keys.move_to_end(key)
+        else:
+            self._frequent_keys[key] = None
+
+
+    def remove(self, key):
+        try:
+            del self._recent_keys[key]
+        except KeyError:
+            del self._frequent_keys[key]
+
+
+    def pop_victim(self):
+        n_recent_keys = len(self._recent_keys)
+        if n_recent_keys and (not self._frequent_keys or
+                              n_recent_keys > self._recent_target):
+            key = self._recent_keys.popitem(last=False)[0]
+            self._recent_ghosts[hash(key)] = None
+        else:
+            key = self._frequent_keys.popitem(last=False)[0]
+            self._frequent_ghosts[hash(key)] = None
+        while len(self._recent_ghosts) + len(self._recent_keys) > \
+                                        self.max_size and self._recent_ghosts:
+            self._recent_ghosts.popitem(last=False)
+        while len(self._recent_ghosts) + len(self._frequent_ghosts) > \
+                                      self.max_size and self._frequent_ghosts:
+            self._frequent_ghosts.popitem(last=False)
+        return key
+
+
+    def clear(self):
+        self._recent_keys = collections.OrderedDict()
+        '''Keys used once, from least to most recently used.'''
+        self._frequent_keys = collections.OrderedDict()
+        '''Keys used more than once, from least to most recently used.'''
+        self._recent_ghosts = collections.OrderedDict()
+        self._frequent_ghosts = collections.OrderedDict()
+        self._recent_target = 0
+        '''The number of entries we'd like to keep in `_recent_keys`.'''
+
+
+
+class _FrequencySketch:
+    '''
+    Approximate counter of how often hashes were seen, for `TinyLfuPolicy`.
+
+    A count-min sketch of four rows of small counters. When the number of
+    increments reaches ten times the cache size, all counters are halved, so
+    the counts reflect recent history.
+    '''
+
+    _seeds = (0x9e3779b97f4a7c15, 0xc2b2ae3d27d4eb4f, 0x165667b19e3779f9,
+              0xd6e8feb86659fd93)
+
+    _max_count = 15
+
+    def __init__(self, max_size):
+        width = 16
+        while width < max_size:
+            width *= 2
+        self._mask = width - 1
+        self._rows = [bytearray(width) for _ in self._seeds]
+        self._sample_size = 10 * max_size
+        self._n_increments = 0
+
+
+    def _get_indices(self, hash_):
+        mask = self._mask
+        return [((hash_ * seed) >> 32) & mask for seed in self._seeds]
+
+
+    def increment(self, hash_):
+        for row, index in zip(self._rows, self._get_indices(hash_)):
+            if row[index] < self._max_count:
+                row[index] += 1
+        self._n_increments += 1
+        if self._n_increments >= self._sample_size:
+            self._halve()
+
+
+    def get_frequency(self, hash_):
+        return min(row[index] for row, index in
+                   zip(self._rows, self._get_indices(hash_)))
+
+
+    def _halve(self):
+        for row in self._rows:
+            row[:] = bytes(count >> 1 for count in row)
+        self._n_increments //= 2
+
+
+    def clear(self):
+        for row in self._rows:
+            row[:] = bytes(len(row))
+        self._n_increments = 0
+
+
+
+class TinyLfuPolicy(EvictionPolicy):
+    '''
+    Throws away entries by the W-TinyLFU algorithm.
+
+    New entries go into a small LRU window. When they leave the window they
+    become candidates for the main cache, which is a segmented LRU. A
+    candidate is admitted only if it was used more often recently than the
+    entry the main cache would throw away for it; otherwise the candidate is
+    thrown away. How often keys were used, including keys that aren't in the
+    cache, is estimated by a compact frequency sketch.
+
+    This keeps frequently-used entries in the cache through scans, while the
+    window still gives new entries a chance.
+    '''
+
+    needs_max_size = True
+
+    def __init__(self, max_size=infinity):
+        EvictionPolicy.__init__(self, max_size)
+        self.window_size = max(max_size // 100, 1)
+        '''Maximum number of entries in the window.'''
+        self.protected_size = max((max_size - self.window_size) * 4 // 5, 1)
+        '''Maximum number of entries in the protected segment.'''
+        self._sketch = _FrequencySketch(max_size)
+        self._window_keys = collections.OrderedDict()
+        self._probation_keys = collections.OrderedDict()
+        '''Keys in the main cache that were used once since they entered.'''
+        self._protected_keys = collections.OrderedDict()
+        '''Keys in the main cache that were used again.'''
+        self._candidates = collections.OrderedDict()
+        '''Keys that left the window and weren't judged for admission yet.'''
+
+
+    def add(self, key, size=1, cost=1):
+        self._sketch.increment(hash(key))
+        self._window_keys[key] = None
+        if len(self._window_keys) > self.window_size:
+            candidate = self._window_keys.popitem(last=False)[0]
+            self._probation_keys[candidate] = None
+            self._candidates[candidate] = None
+
+
+    def touch(self, key):
+        self._sketch.increment(hash(key))
+        if key in self._window_keys:
+            self._window_keys.move_to_end(key)
+        elif key in self._probation_keys:
+            del self._probation_keys[key]
+            self._candidates.pop(key, None)
+            self._protected_keys[key] = None
+            if len(self._protected_keys) > self.protected_size:
+                demoted_key = self._protected_keys.popitem(last=False)[0]
+                self._probation_keys[demoted_key] = None
+        else:
+            self._protected_keys.move_to_end(key)
+
+
+    def remove(self, key):
+        self._candidates.pop(key, None)
+        for keys in (self._window_keys, self._probation_keys,
+                     self._protected_keys):
+            try:
+                del keys[key]
+            except KeyError:
+                pass
+            else:
+                return
+        raise KeyError(key)
+
+
+    def pop_victim(self):
+        probation_keys = self._probation_keys
+        if not probation_keys:
+            keys = self._protected_keys or self._window_keys
+            return keys.popitem(last=False)[0]
+        victim = next(iter(probation_keys))
+        while self._candidates:
+            candidate = self._candidates.popitem(last=False)[0]
+            if candidate == victim:
+                continue
+            if self._sketch.get_frequency(hash(candidate)) <= \
+                                   self._sketch.get_frequency(hash(victim)):
+                # The candidate isn't admitted.
+                del probation_keys[candidate]
+                return candidate
+            break
+        del probation_keys[victim]
+        self._candidates.pop(victim, None)
+        return victim
+
+
+    def clear(self):
+        self._sketch.clear()
+        self._window_keys.clear()
+        self._probation_keys.clear()
+        self._protected_keys.clear()
+        self._candidates.clear()
+
+
+
+class GreedyDualSizePolicy(EvictionPolicy):
+    '''
+    Throws away entries by the GreedyDual-Size algorithm.
+
+    Each entry has a cost, (`cache` uses the time it took to compute it,) and
+    we throw away the entry with the least cost per byte first, while entries
+    that weren't used in a while slowly lose their value. This keeps as much
+    compute time as possible within a memory budget.
+
+    Priorities are kept in a heap, so operations are O(log n).
+    '''
+
+    uses_cost = True
+
+    def __init__(self, max_size=infinity):
+        EvictionPolicy.__init__(self, max_size)
+        self._cost_densities = {}
+        '''Mapping from key to the cost per byte of its entry.'''
+        self._priority_records = {}
+        '''Mapping from key to its current record in the priority heap.'''
+        self._priority_heap = []
+        '''Heap of `[priority, serial_number, key]` records.'''
+        self._serial_numbers = itertools.count()
+        self._inflation = 0.0
+        '''
+        The priority of the last entry thrown away.
+
+        New and used entries get their priority on top of it, so entries that
+        weren't used since are the first to be thrown away.
+        '''
+
+
+    def _prioritize(self, key):
+        '''
+        Give the entry for `key` a fresh priority in the heap.
+
+        The entry's old record is left in the heap, stale; stale records are
+        skipped when they reach the top of the heap, and the heap is rebuilt
+        when there are too many of them.
+        '''
+        record = [self._inflation + self._cost_densities[key],
+                  next(self._serial_numbers), key]
+        self._priority_records[key] = record
+        priority_heap = self._priority_heap
+        heapq.heappush(priority_heap, record)
+        if len(priority_heap) > 2 * len(self._priority_records) + 16:
+            self._priority_heap = list(self._priority_records.values())
+            heapq.heapify(self._priority_heap)
+
+
+    def add(self, key, size=1, cost=1):
+        self._cost_densities[key] = cost / max(size, 1)
+        self._prioritize(key)
+
+
+    def touch(self, key):
+        self._prioritize(key)
+
+
+    def remove(self, key):
+        del self._cost_densities[key]
+        del self._priority_records[key]
+
+
+    def pop_victim(self):
+        priority_heap = self._priority_heap
+        priority_records = self._priority_records
+        while True:
+            record = heapq.heappop(priority_heap)
+            priority, _, key = record
+            if priority_records.get(key) is record:
+                self._inflation = priority
+                self.remove(key)
+                return key
+
+
+    def clear(self):
+        self._cost_densities.clear()
+        self._priority_records.clear()
+        del self._priority_heap[:]
+
+
+
+policies = {
+    'lru': LruPolicy,
+    'lfu': LfuPolicy,
+    '2q': TwoQueuePolicy,
+    'arc': ArcPolicy,
+    'tinylfu': TinyLfuPolicy,
+    'gds': GreedyDualSizePolicy,
+}
+'''Eviction policies that may be specified by name.'''
+
+
+def get_policy_type(policy):
+    '''
+    Get an `EvictionPolicy` subclass from a `policy` argument.
+
+    `policy` may be either the name of a policy in `policies`, or an
+    `EvictionPolicy` subclass.
+    '''
+    if isinstance(policy, type) and issubclass(policy, EvictionPolicy):
+        return policy
+    try:
+        return policies[policy]
+    except (KeyError, TypeError):
+        raise TypeError(
+            '`policy` must be either an `EvictionPolicy` subclass or one of '
+            'these names: %s.' % ', '.join(map(repr, sorted(policies)))
+        )
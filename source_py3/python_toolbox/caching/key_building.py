@@ -0,0 +1,194 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Defines the `get_key_builder`, `get_method_key_builder`,
+`get_argument_normalizer` and `get_stable_key` functions.
+
+See their documentation for more details.
+'''
+
+import inspect
+import hashlib
+import pickle as pickle_module
+
+from python_toolbox.sleek_reffing import SleekCallArgs, ContentSleekCallArgs
+
+
+strongly_keyable_types = frozenset(
+    (int, float, complex, bool, str, bytes, type(None))
+)
+'''
+Types whose instances may be used as-is inside a cache key.
+
+Instances of these types are hashable, immutable and non-weakreffable, so
+`SleekCallArgs` would have kept strong references to them anyway. Using them
+directly saves us from building a `SleekCallArgs` on every call.
+'''
+
+
+def _get_simple_parameter_count(function):
+    '''
+    Get the number of parameters of `function` if its signature is simple.
+
+    A simple signature is one without `*args`, `**kwargs` or keyword-only
+    arguments. If the signature isn't simple, returns `None`.
+    '''
+    try:
+        arg_spec = inspect.getfullargspec(function)
+    except TypeError:
+        return None
+    if arg_spec.varargs or arg_spec.varkw or arg_spec.kwonlyargs:
+        return None
+    return len(arg_spec.args)
+
+
+def get_key_builder(function, hash_contents=False):
+    '''
+    Get a function that builds cache keys for calls to `function`.
+
+    The signature of `function` is inspected once, here, rather than on every
+    call. The returned key builder is called like `key_builder(containing_dict,
+    args, kwargs)`, where `containing_dict` is the dict the key will be stored
+    in, and `args` and `kwargs` are the arguments that `cache`'s wrapper passes
+    on to `function`. (The wrapper always passes named arguments positionally,
+    with defaults filled in, so different spellings of the same call arrive
+    here the same.)
+
+    For a function with no arguments, the key is always the empty tuple. For a
+    function with a simple signature whose arguments are all of
+    `strongly_keyable_types`, the key is the tuple of arguments itself. In all
+    other cases the key is a `SleekCallArgs`, or a `ContentSleekCallArgs` if
+    `hash_contents` is true. Since the choice depends only on the argument
+    values, the same call always gets the same kind of key.
+    '''
+    call_args_type = ContentSleekCallArgs if hash_contents else SleekCallArgs
+    parameter_count = _get_simple_parameter_count(function)
+
+    if parameter_count == 0:
+
+        def build_key(containing_dict, args, kwargs):
+            if args or kwargs:
+                # Let `call_args_type` complain about the bad call:
+                return call_args_type(containing_dict, function, *args,
+                                      **kwargs)
+            return ()
+
+    elif parameter_count == 1:
+
+        def build_key(containing_dict, args, kwargs):
+            if not kwargs and len(args) == 1 and \
+                                     type(args[0]) in strongly_keyable_types:
+                return args
+            return call_args_type(containing_dict, function, *args, **kwargs)
+
+    elif parameter_count is not None:
+
+        def build_key(containing_dict, args, kwargs):
+            if not kwargs and len(args) == parameter_count:
+                for arg in args:
+                    if type(arg) not in strongly_keyable_types:
+                        break
+                else:
+                    return args
+            return call_args_type(containing_dict, function, *args, **kwargs)
+
+    else: # parameter_count is None
+
+        def build_key(containing_dict, args, kwargs):
+            return call_args_type(containing_dict, function, *args, **kwargs)
+
+    return build_key
+
+
+def get_method_key_builder(method_function):
+    '''
+    Get a function that builds cache keys for calls to a method of one object.
+
+    Like `get_key_builder`, except that the keys go in a cache that belongs to
+    a single object, so the object doesn't need to be in the key. The returned
+    key builder is called like `key_builder(containing_dict, thing, args,
+    kwargs)`, where `thing` is the object and `args` are the arguments after
+    it. When the arguments after `thing` are all of `strongly_keyable_types`,
+    the key is their tuple, so `thing` is neither hashed nor sleekreffed. In
+    all other cases the key is a `SleekCallArgs` of the entire call.
+    '''
+    parameter_count = _get_simple_parameter_count(method_function)
+
+    if parameter_count == 1:
+
+        def build_key(containing_dict, thing, args, kwargs):
+            if args or kwargs:
+                # Let `SleekCallArgs` complain about the bad call:
+                return SleekCallArgs(containing_dict, method_function, thing,
+                                     *args, **kwargs)
+            return ()
+
+    elif parameter_count is not None:
+
+        def build_key(containing_dict, thing, args, kwargs):
+            if not kwargs and len(args) == parameter_count - 1:
+                for arg in args:
+                    if type(arg) not in strongly_keyable_types:
+                        break
+                else:
+                    return args
+            return SleekCallArgs(containing_dict, method_function, thing,
+                                 *args, **kwargs)
+
+    else: # parameter_count is None (or 0, for a method that's broken anyway)
+
+        def build_key(containing_dict, thing, args, kwargs):
+            return SleekCallArgs(containing_dict, method_function, thing,
+                                 *args, **kwargs)
+
+    return build_key
+
+
+def get_argument_normalizer(function):
+    '''
+    Get a function that makes positional arguments look like `cache` got them.
+
+    `cache`'s wrapper always passes named arguments positionally, with
+    defaults filled in. The returned function takes a tuple of positional
+    arguments for `function` and fills in the defaults the same way, so the
+    call gets the same key as it would when going through the wrapper. (Only
+    needed for simple signatures; for others, the key is a `SleekCallArgs`,
+    which normalizes the arguments itself.)
+    '''
+    parameter_count = _get_simple_parameter_count(function)
+    defaults = getattr(function, '__defaults__', None) or ()
+    if parameter_count is None or not defaults:
+        return lambda args: args
+
+    def normalize_arguments(args):
+        n_missing_arguments = parameter_count - len(args)
+        if 0 < n_missing_arguments <= len(defaults):
+            return args + defaults[len(defaults) - n_missing_arguments:]
+        return args
+
+    return normalize_arguments
+
+
+def get_stable_key(args, kwargs):
+    '''
+    Get a digest of call arguments that's the same across processes.
+
+    `args` and `kwargs` are the arguments that `cache`'s wrapper passes on to
+    the function. The key is a SHA-1 digest of their pickle, so it's only as
+    stable as their pickle; for example, numbers, strings, tuples and most
+    objects that pickle by value are fine, but sets of strings may pickle in a
+    different order in each process, giving a different key. (This makes for
+    a cache miss, not a wrong result.)
+
+    Raises `TypeError` if the arguments can't be pickled.
+    '''
+    try:
+        pickled_arguments = pickle_module.dumps(
+            (args, sorted(kwargs.items(), key=lambda item: item[0])),
+            protocol=2
+        )
+    except Exception as exception:
+        raise TypeError("Can't get a stable key for the arguments, because "
+                        "they can't be pickled: %s" % (exception,))
+    return hashlib.sha1(pickled_arguments).hexdigest()
@@ -0,0 +1,358 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Defines the `SharedMemoryStorage` class.
+
+See its documentation for more details.
+'''
+
+import os
+import mmap
+import time
+import struct
+import hashlib
+import tempfile
+import threading
+import weakref
+
+from python_toolbox import pickle_tools
+
+from .storage import CacheStorage
+from .cache_dict import process_time_to_keep
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+_magic = b'PTSHMC01'
+
+_file_header = struct.Struct('<8sQQQ')
+'''Magic, number of buckets, slots per bucket and slot size.'''
+
+_file_header_size = 64
+
+_slot_header = struct.Struct('<Q20s8sddI')
+'''
+Version, digest, namespace digest, expiry time, last-used time, value length.
+
+The version is odd while the slot is being written, so readers can tell they
+read a torn slot. An expiry time of zero means the entry never expires. An
+all-zero digest means the slot is empty.
+'''
+
+_version = struct.Struct('<Q')
+_last_used_time = struct.Struct('<d')
+_last_used_time_offset = 8 + 20 + 8 + 8
+
+_empty_digest = bytes(20)
+
+
+def _get_default_folder():
+    '''Get a folder for shared cache files, preferably one kept in RAM.'''
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+class SharedMemoryStorage(CacheStorage):
+    '''
+    Storage that shares cached results between processes on one machine.
+
+    Give `cache` the same `SharedMemoryStorage` in several processes, (for
+    example, workers of a `multiprocessing` pool,) and they'll share one
+    store of results instead of each computing and keeping its own. You'll
+    probably want to also pass a small `max_size` to `cache`, (even `0`,) so
+    each process won't keep its own copy of all the results in memory. The
+    `max_size` of the storage itself must be at least 1.
+
+    The store is a memory-mapped file, `/dev/shm` by default, so it's kept in
+    RAM. It's a hash table of `max_size` fixed-size slots, grouped into
+    buckets of `slots_per_bucket`. When a bucket is full, its
+    least-recently-used entry is thrown away. Values whose compickle is bigger
+    than `max_value_size` bytes are not stored.
+
+    Lookups read the memory directly, without locking and without talking to
+    any other process. They detect a slot that's being written at the same
+    time by its version number. Writes lock just the bucket they write to,
+    using `fcntl` byte-range locks, so this is only available on POSIX
+    systems.
+
+    Processes share the store by its `path`. If you don't give a path, a
+    temporary file is created and deleted when this object is garbage
+    collected in the process that created it; processes forked after it was
+    created, or ones it was pickled to, will share it.
+    '''
+
+    def __init__(self, path=None, max_size=1024, max_value_size=4000,
+                 time_to_keep=None, slots_per_bucket=4):
+        '''
+        Construct the `SharedMemoryStorage`.
+
+        If the file at `path` already holds a store, it's used as is, with
+        its own size parameters.
+        '''
+        if fcntl is None:
+            raise NotImplementedError(
+                '`SharedMemoryStorage` needs the `fcntl` module, which is '
+                'only available on POSIX systems.'
+            )
+        if max_size < 1 or slots_per_bucket < 1:
+            raise ValueError('`max_size` and `slots_per_bucket` must be at '
+                             'least 1.')
+        if path is None:
+            file_descriptor, path = tempfile.mkstemp(
+                prefix='python_toolbox_shared_cache_',
+                dir=_get_default_folder()
+            )
+            os.close(file_descriptor)
+            self._finalizer = weakref.finalize(self, _remove_file, path,
+                                               os.getpid())
+        else:
+            self._finalizer = None
+        self.path = str(path)
+        time_to_keep = process_time_to_keep(time_to_keep)
+        self.time_to_keep = (None if time_to_keep is None else
+                             time_to_keep.total_seconds())
+        '''Number of seconds entries live, or `None` for forever.'''
+        self._open(max_size=max_size, max_value_size=max_value_size,
+                   slots_per_bucket=slots_per_bucket)
+
+
+    def _open(self, max_size, max_value_size, slots_per_bucket):
+        '''Open the file, creating and initializing it if needed.'''
+        slot_size = -(-(_slot_header.size + max_value_size) // 8) * 8
+        n_buckets = -(-max_size // slots_per_bucket)
+        self._file_descriptor = file_descriptor = \
+                             os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(file_descriptor, fcntl.LOCK_EX, _file_header_size, 0)
+        try:
+            if os.fstat(file_descriptor).st_size == 0:
+                file_size = (_file_header_size +
+                             n_buckets * slots_per_bucket * slot_size)
+                os.ftruncate(file_descriptor, file_size)
+                os.pwrite(file_descriptor,
+                          _file_header.pack(_magic, n_buckets,
+                                            slots_per_bucket, slot_size), 0)
+            else:
+                magic, n_buckets, slots_per_bucket, slot_size = \
+                    _file_header.unpack(os.pread(file_descriptor,
+                                                 _file_header.size, 0))
+                if magic != _magic:
+                    raise ValueError("%r isn't a shared cache file." %
+                                     self.path)
+        finally:
+            fcntl.lockf(file_descriptor, fcntl.LOCK_UN, _file_header_size, 0)
+
+        self.n_buckets = n_buckets
+        self.slots_per_bucket = slots_per_bucket
+        self.slot_size = slot_size
+        self.max_size = n_buckets * slots_per_bucket
+        self.max_value_size = slot_size - _slot_header.size
+        self._bucket_size = slots_per_bucket * slot_size
+        self._memory = mmap.mmap(
+            file_descriptor, _file_header_size + n_buckets * self._bucket_size
+        )
+        self._thread_lock = threading.Lock()
+        '''Lock for threads in this process; `fcntl` locks are per-process.'''
+
+
+    def __getstate__(self):
+        return (self.path, self.time_to_keep)
+
+
+    def __setstate__(self, state):
+        self.path, self.time_to_keep = state
+        self._finalizer = None
+        # The size parameters are read from the existing file:
+        self._open(max_size=1, max_value_size=0, slots_per_bucket=1)
+
+
+    def _get_digests(self, namespace, key):
+        '''Get the entry digest and the namespace digest.'''
+        namespace_digest = hashlib.sha1(namespace.encode()).digest()[:8]
+        digest = hashlib.sha1(namespace_digest + key.encode()).digest()
+        return digest, namespace_digest
+
+
+    def _get_bucket_offset(self, digest):
+        bucket = int.from_bytes(digest[:8], 'little') % self.n_buckets
+        return _file_header_size + bucket * self._bucket_size
+
+
+    def _lock_bucket(self, bucket_offset):
+        self._thread_lock.acquire()
+        fcntl.lockf(self._file_descriptor, fcntl.LOCK_EX, self._bucket_size,
+                    bucket_offset)
+
+
+    def _unlock_bucket(self, bucket_offset):
+        fcntl.lockf(self._file_descriptor, fcntl.LOCK_UN, self._bucket_size,
+                    bucket_offset)
+        self._thread_lock.release()
+
+
+    def get(self, namespace, key):
+        '''Get the value stored for `key`. Raise `KeyError` if none.'''
+        digest, _ = self._get_digests(namespace, key)
+        bucket_offset = self._get_bucket_offset(digest)
+        memory = self._memory
+        now = time.time()
+        for slot_offset in range(bucket_offset,
+                                 bucket_offset + self._bucket_size,
+                                 self.slot_size):
+            (version, slot_digest, _, expiry_time, _,
+                       value_length) = _slot_header.unpack_from(memory,
+                                                                slot_offset)
+            if slot_digest != digest:
+                continue
+            if version % 2 or (expiry_time and expiry_time <= now):
+                # Being written right now, or expired.
+                raise KeyError(key)
+            value_start = slot_offset + _slot_header.size
+            compickled_value = memory[value_start:value_start + value_length]
+            if _version.unpack_from(memory, slot_offset)[0] != version:
+                # It was changed while we were reading it.
+                raise KeyError(key)
+            # Not locking for this; the worst that could happen is a slightly
+            # wrong last-used time.
+            _last_used_time.pack_into(
+                memory, slot_offset + _last_used_time_offset, now
+            )
+            return pickle_tools.decompickle(compickled_value)
+        raise KeyError(key)
+
+
+    def set(self, namespace, key, value):
+        '''Store `value` for `key`.'''
+        compickled_value = pickle_tools.compickle(value)
+        if len(compickled_value) > self.max_value_size:
+            return
+        digest, namespace_digest = self._get_digests(namespace, key)
+        bucket_offset = self._get_bucket_offset(digest)
+        memory = self._memory
+        now = time.time()
+        expiry_time = (0.0 if self.time_to_keep is None else
+                       now + self.time_to_keep)
+
+        self._lock_bucket(bucket_offset)
+        try:
+            chosen_slot_offset = None
+            chosen_slot_last_used_time = None
+            for slot_offset in range(bucket_offset,
+                                     bucket_offset + self._bucket_size,
+                                     self.slot_size):
+                (_, slot_digest, _, slot_expiry_time,
+                 slot_last_used_time, _) = _slot_header.unpack_from(memory,
+                                                                   slot_offset)
+                if slot_digest == digest:
+                    chosen_slot_offset = slot_offset
+                    break
+                if slot_digest == _empty_digest or \
+                                (slot_expiry_time and slot_expiry_time <= now):
+                    slot_last_used_time = -1.0
+                if chosen_slot_offset is None or \
+                              slot_last_used_time < chosen_slot_last_used_time:
+                    chosen_slot_offset = slot_offset
+                    chosen_slot_last_used_time = slot_last_used_time
+
+            version, = _version.unpack_from(memory, chosen_slot_offset)
+            _version.pack_into(memory, chosen_slot_offset, version + 1)
+            value_start = chosen_slot_offset + _slot_header.size
+            memory[value_start:value_start + len(compickled_value)] = \
+                                                               compickled_value
+            _slot_header.pack_into(memory, chosen_slot_offset, version + 1,
+                                   digest, namespace_digest, expiry_time, now,
+                                   len(compickled_value))
+            _version.pack_into(memory, chosen_slot_offset, version + 2)
+        finally:
+            self._unlock_bucket(bucket_offset)
+
+
+    def _empty_slot(self, slot_offset):
+        '''Mark a slot as empty. Its bucket must be locked.'''
+        version, = _version.unpack_from(self._memory, slot_offset)
+        _slot_header.pack_into(self._memory, slot_offset, version + 2,
+                               _empty_digest, bytes(8), 0.0, 0.0, 0)
+
+
+    def delete(self, namespace, key):
+        '''Delete the value stored for `key`, if there is one.'''
+        digest, _ = self._get_digests(namespace, key)
+        bucket_offset = self._get_bucket_offset(digest)
+        self._lock_bucket(bucket_offset)
+        try:
+            for slot_offset in range(bucket_offset,
+                                     bucket_offset + self._bucket_size,
+                                     self.slot_size):
+                if _slot_header.unpack_from(self._memory,
+                                            slot_offset)[1] == digest:
+                    self._empty_slot(slot_offset)
+        finally:
+            self._unlock_bucket(bucket_offset)
+
+
+    def _iterate_bucket_offsets(self):
+        return range(_file_header_size,
+                     _file_header_size + self.n_buckets * self._bucket_size,
+                     self._bucket_size)
+
+
+    def clear(self, namespace=None):
+        '''Delete all values in `namespace`, or all values if it's `None`.'''
+        if namespace is not None:
+            _, namespace_digest = self._get_digests(namespace, '')
+        for bucket_offset in self._iterate_bucket_offsets():
+            self._lock_bucket(bucket_offset)
+            try:
+                for slot_offset in range(bucket_offset,
+                                         bucket_offset + self._bucket_size,
+                                         self.slot_size):
+                    (_, slot_digest, slot_namespace_digest, _, _, _) = \
+                               _slot_header.unpack_from(self._memory,
+                                                        slot_offset)
+                    if slot_digest != _empty_digest and \
+                       (namespace is None or
+                        slot_namespace_digest == namespace_digest):
+                        self._empty_slot(slot_offset)
+            finally:
+                self._unlock_bucket(bucket_offset)
+
+
+    def __len__(self):
+        now = time.time()
+        size = 0
+        for bucket_offset in self._iterate_bucket_offsets():
+            for slot_offset in range(bucket_offset,
+                                     bucket_offset + self._bucket_size,
+                                     self.slot_size):
+                (_, slot_digest, _, expiry_time, _, _) = \
+                               _slot_header.unpack_from(self._memory,
+                                                        slot_offset)
+                if slot_digest != _empty_digest and \
+                                     not (expiry_time and expiry_time <= now):
+                    size += 1
+        return size
+
+
+    def close(self):
+        '''Unmap the store and close its file.'''
+        self._memory.close()
+        os.close(self._file_descriptor)
+        if self._finalizer is not None:
+            self._finalizer()
+
+
+    def __repr__(self):
+        return '<%s: %r>' % (type(self).__name__, self.path)
+
+
+def _remove_file(path, creator_pid):
+    '''Remove the file at `path`, if we're in the process that created it.'''
+    if os.getpid() == creator_pid:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
@@ -0,0 +1,96 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Defines the `SideTable` class.
+
+See its documentation for more details.
+'''
+
+import weakref
+import threading
+
+
+class SideTable:
+    '''
+    Values attached to objects that have no `__dict__` to keep them in.
+
+    This is for caching things per object on classes with `__slots__`. Values
+    are keyed on the ids of the objects, so the objects are never hashed, and
+    each object is weakreffed so its value is thrown away when it dies. (The
+    objects must therefore be weakreffable, i.e. have a `__weakref__` slot.)
+    '''
+
+    def __init__(self):
+        self._entries = {}
+        '''Mapping from the id of each object to `(weakref, value)`.'''
+        self._lock = threading.Lock()
+
+
+    def __getitem__(self, thing):
+        reference, value = self._entries[id(thing)]
+        if reference() is not thing:
+            # A dead object that had the same id, whose callback didn't run
+            # yet.
+            raise KeyError(thing)
+        return value
+
+
+    def _get_reference(self, thing):
+        '''Get a weakref to `thing` that removes its entry when it dies.'''
+        key = id(thing)
+        entries = self._entries
+
+        def remove(reference):
+            # Making sure we don't remove the value of a newer object that got
+            # the same id:
+            if entries.get(key, (None,))[0] is reference:
+                del entries[key]
+
+        try:
+            return weakref.ref(thing, remove)
+        except TypeError:
+            raise TypeError(
+                "Can't attach a value to %r, because it has neither a "
+                "`__dict__` nor a `__weakref__`." % (thing,)
+            )
+
+
+    def __setitem__(self, thing, value):
+        with self._lock:
+            try:
+                reference, _ = self._entries[id(thing)]
+            except KeyError:
+                reference = None
+            if reference is None or reference() is not thing:
+                reference = self._get_reference(thing)
+            self._entries[id(thing)] = (reference, value)
+
+
+    def setdefault(self, thing, default):
+        '''Get the value of `thing`, setting it to `default` if it has none.'''
+        with self._lock:
+            try:
+                return self[thing]
+            except KeyError:
+                self._entries[id(thing)] = (self._get_reference(thing),
+                                            default)
+                return default
+
+
+    def pop(self, thing, *default):
+        '''Remove the value of `thing` and return it.'''
+        with self._lock:
+            try:
+                value = self[thing]
+            except KeyError:
+                if default:
+                    (default,) = default
+                    return default
+                raise
+            del self._entries[id(thing)]
+            return value
+
+
+    def __len__(self):
+        return len(self._entries)
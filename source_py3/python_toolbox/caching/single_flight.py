@@ -0,0 +1,162 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Defines the `SingleFlight` class.
+
+See its documentation for more details.
+'''
+
+import threading
+import concurrent.futures
+
+
+class SingleFlight:
+    '''
+    Makes sure only one thread at a time computes the value for each key.
+
+    When several threads miss the cache on the same key at the same time, the
+    first one computes the value while the others wait for its result. If the
+    computation raises an exception, the exception is raised in all of the
+    waiting threads too, and nothing is cached.
+
+    Threads computing different keys don't wait for each other's
+    computations. The bookkeeping, i.e. looking keys up in the cache dict and
+    registering the computations in flight, is done under one lock for all
+    keys, usually the lock of the cache dict itself. It's only held for these
+    short dict operations. Computing values and storing them, which may
+    estimate their sizes, are done outside of it.
+    '''
+
+    def __init__(self, lock=None):
+        '''
+        Construct the `SingleFlight`.
+
+        `lock` guards the bookkeeping and the cache dicts we store values in.
+        Pass in a lock if the cache dict is guarded by one, so they'll share
+        it. Otherwise a new `threading.RLock` is made.
+        '''
+        self.lock = lock if lock is not None else threading.RLock()
+        self._flights = {}
+        '''Mapping from key to `(future, thread_id)` of computations.'''
+
+
+    def call(self, cache_dict, key, function, args=(), kwargs={},
+             store=None, load=None):
+        '''
+        Get the value for `key`, computing it with `function` if needed.
+
+        If `key` is in `cache_dict`, its value is returned. If another thread
+        is already computing it, we wait for that thread's result. Otherwise we
+        call `function(*args, **kwargs)` and store the result in `cache_dict`.
+        You may pass a `store(key, value)` function to use for storing the
+        result instead of setting it in `cache_dict`, and a `load(key)`
+        function to use for looking it up instead of `cache_dict`, which
+        raises `KeyError` if there's no value. `load` is called under the
+        lock, and `store` isn't, so `cache_dict` must be safe to set from
+        several threads.
+        '''
+        thread_id = threading.get_ident()
+        with self.lock:
+            try:
+                return cache_dict[key] if load is None else load(key)
+            except KeyError:
+                pass
+            try:
+                future, computing_thread_id = self._flights[key]
+            except KeyError:
+                future = concurrent.futures.Future()
+                self._flights[key] = (future, thread_id)
+                is_leader = True
+            else:
+                if computing_thread_id == thread_id:
+                    # The function is recursively calling itself with the same
+                    # arguments; waiting for ourselves would deadlock.
+                    is_leader = None
+                else:
+                    is_leader = False
+
+        if is_leader is None:
+            return function(*args, **kwargs)
+        elif not is_leader:
+            return future.result()
+
+        try:
+            value = function(*args, **kwargs)
+        except BaseException as exception:
+            with self.lock:
+                del self._flights[key]
+            future.set_exception(exception)
+            raise
+        # Storing before ending the flight, so other threads will find the
+        # value either in the cache or in the flight:
+        if store is None:
+            cache_dict[key] = value
+        else:
+            store(key, value)
+        with self.lock:
+            del self._flights[key]
+        future.set_result(value)
+        return value
+
+
+    def call_many(self, cache_dict, keys, function, store=None):
+        '''
+        Get the values for `keys`, computing the missing ones in one call.
+
+        This is like `call` for many different keys at once. `function` is
+        called with a list of the keys that are neither in `cache_dict` nor
+        being computed by another thread, and must return a list of their
+        values. Then we wait for the values that other threads are computing.
+        Returns a list of the values of `keys`.
+        '''
+        thread_id = threading.get_ident()
+        values = {}
+        own_futures = {}
+        other_futures = {}
+        keys_to_compute = []
+        with self.lock:
+            for key in keys:
+                try:
+                    values[key] = cache_dict[key]
+                    continue
+                except KeyError:
+                    pass
+                try:
+                    future, computing_thread_id = self._flights[key]
+                except KeyError:
+                    own_futures[key] = future = concurrent.futures.Future()
+                    self._flights[key] = (future, thread_id)
+                    keys_to_compute.append(key)
+                else:
+                    if computing_thread_id == thread_id:
+                        # Called recursively; as in `call`, we compute the
+                        # value without storing it.
+                        keys_to_compute.append(key)
+                    else:
+                        other_futures[key] = future
+
+        if keys_to_compute:
+            try:
+                values.update(zip(keys_to_compute, function(keys_to_compute)))
+            except BaseException as exception:
+                with self.lock:
+                    for key in own_futures:
+                        del self._flights[key]
+                for future in own_futures.values():
+                    future.set_exception(exception)
+                raise
+            for key in own_futures:
+                if store is None:
+                    cache_dict[key] = values[key]
+                else:
+                    store(key, values[key])
+            with self.lock:
+                for key in own_futures:
+                    del self._flights[key]
+            for key, future in own_futures.items():
+                future.set_result(values[key])
+
+        for key, future in other_futures.items():
+            values[key] = future.result()
+        return [values[key] for key in keys]
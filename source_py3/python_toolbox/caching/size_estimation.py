@@ -0,0 +1,93 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Defines functions for estimating how much memory cached values take.
+
+See documentation of `get_size_estimator` for more details.
+'''
+
+import sys
+import collections.abc
+
+
+def get_shallow_size(value):
+    '''
+    Get the size of `value` in bytes, not including objects it refers to.
+
+    This is just `sys.getsizeof`. It's fast, but it says little about
+    containers; a list of big strings is counted as the size of the list
+    alone.
+    '''
+    return sys.getsizeof(value)
+
+
+def get_deep_size(value):
+    '''
+    Get the size of `value` in bytes, including objects it refers to.
+
+    Follows the items of built-in containers, and the `__dict__` and
+    `__slots__` of other objects. Each object is counted once, even if it's
+    referred to several times. Types, modules and functions aren't followed,
+    since they're shared with the rest of the program rather than owned by
+    the value.
+
+    This is an estimate; objects that keep memory in ways Python doesn't know
+    about, (for example, arrays allocated by C extensions that don't report
+    them in `__sizeof__`,) will be undercounted.
+    '''
+    seen_ids = set()
+    size = 0
+    values_to_visit = [value]
+    while values_to_visit:
+        value = values_to_visit.pop()
+        if id(value) in seen_ids:
+            continue
+        seen_ids.add(id(value))
+        size += sys.getsizeof(value)
+        if isinstance(value, (str, bytes, bytearray, int, float, complex,
+                              type, type(sys), type(get_deep_size))):
+            continue
+        if isinstance(value, collections.abc.Mapping):
+            values_to_visit.extend(value.keys())
+            values_to_visit.extend(value.values())
+        elif isinstance(value, (list, tuple, set, frozenset,
+                                collections.deque)):
+            values_to_visit.extend(value)
+        if hasattr(value, '__dict__'):
+            values_to_visit.append(value.__dict__)
+        for type_ in type(value).__mro__:
+            slots = type_.__dict__.get('__slots__', ())
+            if isinstance(slots, str):
+                slots = (slots,)
+            for slot in slots:
+                if slot not in ('__dict__', '__weakref__') and \
+                                                       hasattr(value, slot):
+                    values_to_visit.append(getattr(value, slot))
+    return size
+
+
+size_estimators = {
+    'shallow': get_shallow_size,
+    'deep': get_deep_size,
+}
+'''Size estimators that may be specified by name.'''
+
+
+def get_size_estimator(size_estimator):
+    '''
+    Get a size estimation function from a `size_estimator` argument.
+
+    `size_estimator` may be either `'shallow'`, for `sys.getsizeof`, `'deep'`,
+    for `get_deep_size`, or any function that takes a value and returns its
+    size in bytes.
+    '''
+    if callable(size_estimator):
+        return size_estimator
+    try:
+        return size_estimators[size_estimator]
+    except (KeyError, TypeError):
+        raise TypeError(
+            "`size_estimator` must be either 'shallow', 'deep' or a function "
+            "that takes a value and returns its size in bytes."
+        )
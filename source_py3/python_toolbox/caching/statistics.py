@@ -0,0 +1,79 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Defines the `CacheStatistics` class and the `CacheInfo` tuple.
+
+See their documentation for more details.
+'''
+
+import collections
+import time
+
+
+CacheInfo = collections.namedtuple(
+    'CacheInfo',
+    ('hits', 'misses', 'evictions', 'expirations', 'size', 'compute_time')
+)
+CacheInfo.__doc__ = '''
+Statistics of a cache, as returned by `cache_info()`.
+
+`hits` and `misses` count calls that were and weren't answered from the
+cache. `evictions` counts entries thrown away to respect the size limit and
+`expirations` counts entries thrown away because their time was up. `size`
+is the current number of entries. `compute_time` is the total number of
+seconds spent computing the misses.
+
+The counts of hits, misses and compute time are `None` if the cache wasn't
+asked to collect statistics.
+'''
+
+
+class CacheStatistics:
+    '''
+    Counters of hits, misses and compute time for a cache.
+
+    A cache only has one of these if it was asked to collect statistics, so
+    caches that don't need them don't pay for the counting.
+
+    You may give a `reporter`, which is a function that will be called with
+    the cache's `CacheInfo` at most once every `report_interval` seconds. This
+    is meant for exporting the counters to your monitoring system. Reports are
+    made from calls to the cached function, not from a background thread.
+
+    When the cache is used from several threads, the counts may be slightly
+    off, since incrementing them isn't atomic.
+    '''
+
+    def __init__(self, reporter=None, report_interval=60):
+        self.hits = 0
+        self.misses = 0
+        self.compute_time = 0.0
+        '''Total number of seconds spent computing misses.'''
+
+        self.reporter = reporter
+        self.report_interval = report_interval
+        self._next_report_time = time.monotonic() + report_interval
+        self.get_cache_info = None
+        '''
+        Function returning our cache's `CacheInfo`, for the reporter.
+
+        This is set by the cache that owns us.
+        '''
+
+
+    def timed_call(self, function, args, kwargs):
+        '''Call `function(*args, **kwargs)`, adding its time to our total.'''
+        start_time = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.compute_time += time.perf_counter() - start_time
+
+
+    def report_if_due(self):
+        '''Call the reporter if `report_interval` passed since last report.'''
+        now = time.monotonic()
+        if now >= self._next_report_time:
+            self._next_report_time = now + self.report_interval
+            self.reporter(self.get_cache_info())
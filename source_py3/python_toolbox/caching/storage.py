@@ -0,0 +1,252 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''
+Defines storage backends for persisting the results of `cache`.
+
+See documentation of `CacheStorage` and `SqliteStorage` for more details.
+'''
+
+import abc
+import time
+import threading
+import datetime as datetime_module
+
+from python_toolbox import pickle_tools
+
+from .cache_dict import process_time_to_keep
+
+infinity = float('inf')
+
+_one_minute = datetime_module.timedelta(minutes=1)
+
+
+class CacheStorage(metaclass=abc.ABCMeta):
+    '''
+    A place to store cached results outside of the process's memory.
+
+    Pass a storage to `cache` as `storage=my_storage`, and results will be
+    looked up in the storage when they're missing from the in-memory cache,
+    and saved to it when they're computed. When the storage outlives the
+    process, (for example, a file on disk,) a new process starts with a warm
+    cache.
+
+    Entries are stored by `namespace`, which identifies the cached function,
+    and `key`, which is a stable digest of the call's arguments. (See
+    `key_building.get_stable_key`.) Both are strings. One storage may be
+    shared by many cached functions.
+    '''
+
+    @abc.abstractmethod
+    def get(self, namespace, key):
+        '''Get the value stored for `key`. Raise `KeyError` if none.'''
+
+    @abc.abstractmethod
+    def set(self, namespace, key, value):
+        '''Store `value` for `key`.'''
+
+    @abc.abstractmethod
+    def delete(self, namespace, key):
+        '''Delete the value stored for `key`, if there is one.'''
+
+    @abc.abstractmethod
+    def clear(self, namespace=None):
+        '''Delete all values in `namespace`, or all values if it's `None`.'''
+
+    @abc.abstractmethod
+    def __len__(self):
+        '''Get the number of stored values.'''
+
+
+
+class SqliteStorage(CacheStorage):
+    '''
+    Storage that keeps cached results in an SQLite database file.
+
+    Values are serialized with `pickle_tools.compickle`. Several processes may
+    use the same database file at the same time. Needs SQLite 3.7.0 or newer.
+
+    You may optionally specify a `max_size` for the maximum number of entries
+    in the database; the least-recently-used entries are thrown away when
+    there are more. You may also specify a `time_to_keep`, (either a
+    `timedelta` object or keyword arguments for one,) after which entries
+    expire. Times are measured with the wall clock, so they make sense across
+    processes.
+
+    With a `max_size`, the least-recently-used order is approximate: Writing
+    the time of every hit would make each read a write transaction, which
+    would serialize all the processes using the file. So a hit updates the
+    entry's last-used time only if it's older than
+    `last_used_time_resolution`, (a `timedelta` object or keyword arguments
+    for one, by default a minute.)
+    '''
+
+    def __init__(self, path, max_size=infinity, time_to_keep=None,
+                 last_used_time_resolution=_one_minute):
+        '''
+        Construct the `SqliteStorage`.
+
+        `path` is the path of the database file. It's created if it doesn't
+        exist. You may pass `':memory:'` for a database that isn't persisted.
+        '''
+        import sqlite3
+        self.path = str(path)
+        self.max_size = max_size
+        time_to_keep = process_time_to_keep(time_to_keep)
+        self.time_to_keep = (None if time_to_keep is None else
+                             time_to_keep.total_seconds())
+        '''Number of seconds entries live, or `None` for forever.'''
+        self.last_used_time_resolution = process_time_to_keep(
+            last_used_time_resolution
+        ).total_seconds()
+        '''Number of seconds a hit may leave an entry's last-used time.'''
+        self.lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, timeout=60,
+                                           check_same_thread=False,
+                                           isolation_level=None)
+        with self.lock:
+            if self.path != ':memory:':
+                self._connection.execute('PRAGMA journal_mode=WAL')
+            # So rows deleted by `INSERT OR REPLACE` fire the delete trigger:
+            self._connection.execute('PRAGMA recursive_triggers=ON')
+            with self._transaction():
+                self._create_tables()
+
+
+    def _create_tables(self):
+        '''Create the tables, indices and triggers, if they don't exist.'''
+        execute = self._connection.execute
+        execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB, '
+            'expiry_time REAL, last_used_time REAL NOT NULL, '
+            'PRIMARY KEY (namespace, key))'
+        )
+        execute('CREATE INDEX IF NOT EXISTS entries_expiry_time '
+                'ON entries (expiry_time)')
+        execute('CREATE INDEX IF NOT EXISTS entries_last_used_time '
+                'ON entries (last_used_time)')
+        # Counting the entries takes linear time, so we keep their number in a
+        # table of its own, updated by triggers. This keeps it right for all
+        # the processes using the file.
+        execute('CREATE TABLE IF NOT EXISTS entries_size '
+                '(n_entries INTEGER NOT NULL)')
+        execute('INSERT INTO entries_size SELECT (SELECT COUNT(*) FROM '
+                'entries) WHERE NOT EXISTS (SELECT * FROM entries_size)')
+        execute('CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON '
+                'entries BEGIN UPDATE entries_size '
+                'SET n_entries = n_entries + 1; END')
+        execute('CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON '
+                'entries BEGIN UPDATE entries_size '
+                'SET n_entries = n_entries - 1; END')
+
+
+    def get(self, namespace, key):
+        '''Get the value stored for `key`. Raise `KeyError` if none.'''
+        now = time.time()
+        with self.lock:
+            row = self._connection.execute(
+                'SELECT value, last_used_time FROM entries '
+                'WHERE namespace = ? AND key = ? '
+                'AND (expiry_time IS NULL OR expiry_time > ?)',
+                (namespace, key, now)
+            ).fetchone()
+            if row is None:
+                raise KeyError(key)
+            compickled_value, last_used_time = row
+            if self.max_size != infinity and \
+                     now - last_used_time >= self.last_used_time_resolution:
+                self._connection.execute(
+                    'UPDATE entries SET last_used_time = ? '
+                    'WHERE namespace = ? AND key = ?', (now, namespace, key)
+                )
+        return pickle_tools.decompickle(compickled_value)
+
+
+    def set(self, namespace, key, value):
+        '''Store `value` for `key`.'''
+        now = time.time()
+        compickled_value = pickle_tools.compickle(value)
+        expiry_time = (None if self.time_to_keep is None else
+                       now + self.time_to_keep)
+        with self.lock:
+            with self._transaction():
+                if self.time_to_keep is not None:
+                    self._connection.execute(
+                        'DELETE FROM entries WHERE expiry_time <= ?', (now,)
+                    )
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                    (namespace, key, compickled_value, expiry_time, now)
+                )
+                if self.max_size != infinity:
+                    (size,), = self._connection.execute(
+                        'SELECT n_entries FROM entries_size'
+                    )
+                    if size > self.max_size:
+                        self._connection.execute(
+                            'DELETE FROM entries WHERE rowid IN (SELECT rowid '
+                            'FROM entries ORDER BY last_used_time LIMIT ?)',
+                            (size - self.max_size,)
+                        )
+
+
+    def delete(self, namespace, key):
+        '''Delete the value stored for `key`, if there is one.'''
+        with self.lock:
+            self._connection.execute(
+                'DELETE FROM entries WHERE namespace = ? AND key = ?',
+                (namespace, key)
+            )
+
+
+    def clear(self, namespace=None):
+        '''Delete all values in `namespace`, or all values if it's `None`.'''
+        with self.lock:
+            if namespace is None:
+                self._connection.execute('DELETE FROM entries')
+            else:
+                self._connection.execute(
+                    'DELETE FROM entries WHERE namespace = ?', (namespace,)
+                )
+
+
+    def __len__(self):
+        with self.lock:
+            (size,), = self._connection.execute(
+                'SELECT COUNT(*) FROM entries WHERE expiry_time IS NULL OR '
+                'expiry_time > ?', (time.time(),)
+            )
+        return size
+
+
+    def close(self):
+        '''Close the connection to the database.'''
+        with self.lock:
+            self._connection.close()
+
+
+    def _transaction(self):
+        '''Context manager for a write transaction on our connection.'''
+        return _Transaction(self._connection)
+
+
+    def __repr__(self):
+        return '<%s: %r>' % (type(self).__name__, self.path)
+
+
+
+class _Transaction:
+    '''Context manager for an immediate transaction on an SQLite connection.'''
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if exc_type is None:
+            self.connection.execute('COMMIT')
+        else:
+            self.connection.execute('ROLLBACK')
@@ -7,19 +7,130 @@ Defines the `cheat_hash` function for cheat-hashing mutable objects.
 See its documentation for more details.
 '''
 
+import array
+import weakref
+
 from .cheat_hash_functions import (cheat_hash_dict, cheat_hash_object, 
-                                   cheat_hash_sequence, cheat_hash_set)
+                                   cheat_hash_sequence, cheat_hash_set,
+                                   cheat_hash_buffer, content_hash_buffer,
+                                   content_hash_object, steps_functions)
 
-infinity = float('inf')
 
 dispatch_map = {
     object: cheat_hash_object,
     tuple: cheat_hash_sequence,
     list: cheat_hash_sequence,
     dict: cheat_hash_dict,
-    set: cheat_hash_set
+    set: cheat_hash_set,
+    bytes: cheat_hash_buffer,
+    bytearray: cheat_hash_buffer,
+    memoryview: cheat_hash_buffer,
+    array.array: cheat_hash_buffer,
+}
+'''
+`dict` mapping from a type to a function that cheat-hashes it.
+
+If you change it after calling `cheat_hash`, call `dispatch_cache.clear()`.
+'''
+
+dispatch_cache = weakref.WeakKeyDictionary()
+'''
+Weak `dict` mapping from a type to its cheat-hash function and generator
+version.
+
+The generator version is `None` for functions that aren't in
+`steps_functions`. Filled in lazily from `dispatch_map`. The types are held
+weakly, so classes that are created on the fly aren't kept alive by it.
+'''
+
+content_dispatch_map = {
+    object: content_hash_object,
+    tuple: cheat_hash_sequence,
+    list: cheat_hash_sequence,
+    dict: cheat_hash_dict,
+    set: cheat_hash_set,
+    bytes: cheat_hash_buffer,
+    bytearray: content_hash_buffer,
+    memoryview: content_hash_buffer,
+    array.array: content_hash_buffer,
 }
-'''`dict` mapping from a type to a function that cheat-hashes it.'''
+'''
+`dict` mapping from a type to a function that content-hashes it.
+
+Used by `content_hash`. If you change it after calling `content_hash`, call
+`content_dispatch_cache.clear()`.
+'''
+
+content_dispatch_cache = weakref.WeakKeyDictionary()
+'''Like `dispatch_cache`, filled in lazily from `content_dispatch_map`.'''
+
+
+def _get_dispatch(thing_type, dispatch_map=dispatch_map,
+                  dispatch_cache=dispatch_cache):
+    '''Get the cheat-hash function and generator version for `thing_type`.'''
+    try:
+        return dispatch_cache[thing_type]
+    except KeyError:
+        # The type closest to `thing_type` in its MRO wins. `object` is in
+        # every MRO, so we always find one.
+        for type_ in thing_type.__mro__:
+            if type_ in dispatch_map:
+                function = dispatch_map[type_]
+                break
+        else:
+            function = dispatch_map[object]
+        dispatch = dispatch_cache[thing_type] = \
+                                   (function, steps_functions.get(function))
+        return dispatch
+    
+    
+def _get_content_dispatch(thing_type):
+    '''Get the content-hash function and generator version for `thing_type`.'''
+    try:
+        return content_dispatch_cache[thing_type]
+    except KeyError:
+        return _get_dispatch(thing_type, content_dispatch_map,
+                             content_dispatch_cache)
+    
+    
+def _cheat_hash_iteratively(thing, get_steps, get_dispatch=_get_dispatch):
+    '''
+    Cheat-hash a container using its generator version `get_steps`.
+    
+    Each generator on the stack yields the items it needs cheat-hashed and
+    gets sent their cheat-hashes. Nested containers get their own generator
+    pushed on the stack instead of a recursive call, so deep nesting doesn't
+    hit the recursion limit. A container that's reached again while it's
+    still on the stack, (i.e. a cycle,) is cheat-hashed by its distance up
+    the stack. Items are dispatched with `get_dispatch`.
+    '''
+    stack = [get_steps(thing)]
+    stack_ids = [id(thing)]
+    depths = {id(thing): 0}
+    result = None
+    while True:
+        try:
+            item = stack[-1].send(result)
+        except StopIteration as stop_iteration:
+            stack.pop()
+            del depths[stack_ids.pop()]
+            result = stop_iteration.value
+            if not stack:
+                return result
+            continue
+        function, get_item_steps = get_dispatch(type(item))
+        if get_item_steps is None:
+            result = function(item)
+        elif id(item) in depths:
+            result = hash((_cycle_marker, len(stack) - depths[id(item)]))
+        else:
+            depths[id(item)] = len(stack)
+            stack_ids.append(id(item))
+            stack.append(get_item_steps(item))
+            result = None
+            
+            
+_cycle_marker = '<cheat_hash cycle>'
 
 
 def cheat_hash(thing):
@@ -33,20 +144,105 @@ def cheat_hash(thing):
     This is intended for situtations where you have mutable objects that you
     never modify, and you want to be able to hash them despite Python not
     letting you.
+    
+    Nested containers are traversed without recursion, and cycles in them are
+    allowed.
     '''
-    thing_type = type(thing)
-    matching_types = \
-        [type_ for type_ in dispatch_map if issubclass(thing_type, type_)]
+    function, get_steps = _get_dispatch(type(thing))
+    if get_steps is None:
+        return function(thing)
+    else:
+        return _cheat_hash_iteratively(thing, get_steps)
     
-    mro = thing_type.mro()
     
-    matching_type = min(
-        matching_types,
-        key=lambda type_: (mro.index(type_) if type_ in mro else infinity)
-    )
+def content_hash(thing):
+    '''
+    Cheat-hash an object, hashing buffers by their contents.
+    
+    This is like `cheat_hash`, except that unhashable objects that support the
+    buffer protocol, like `bytearray`, `array.array` or NumPy arrays, are
+    hashed by a CRC-32 of their bytes rather than by `id`, wherever they are
+    in the object. Equal arrays thus get equal hashes. (See `contents_equal`
+    for comparing them.)
+    '''
+    function, get_steps = _get_content_dispatch(type(thing))
+    if get_steps is None:
+        return function(thing)
+    else:
+        return _cheat_hash_iteratively(thing, get_steps,
+                                       _get_content_dispatch)
     
-    return dispatch_map[matching_type](thing)
     
-        
-        
-            
\ No newline at end of file
+def _are_equal(thing, other_thing):
+    '''Get `bool(thing == other_thing)`, or `False` if that fails.'''
+    try:
+        return bool(thing == other_thing)
+    except (ValueError, TypeError):
+        return False
+
+
+def _get_byte_view(memory_view):
+    '''Get the bytes of a buffer, without copying them if it's C-contiguous.'''
+    if memory_view.c_contiguous:
+        return memory_view.cast('B')
+    else:
+        return memory_view.tobytes()
+    
+    
+def _get_buffer_view(thing):
+    '''Get a `memoryview` of `thing`, or `None` if it isn't a buffer.'''
+    if isinstance(thing, (bytes, str)):
+        return None
+    try:
+        return memoryview(thing)
+    except TypeError:
+        return None
+    
+    
+def contents_equal(thing, other_thing):
+    '''
+    Compare two objects, comparing buffers by their contents.
+    
+    This is `==` for objects for which `content_hash` is like `hash`: Lists,
+    tuples and dicts are compared item by item, and objects that support the
+    buffer protocol are equal when they're of the same type, item format and
+    shape and have the same bytes. For these, `==` might return an array, (as
+    for NumPy,) which isn't usable as a `bool`. Like `content_hash`, this
+    doesn't recurse, and allows cycles.
+    '''
+    pairs = [(thing, other_thing)]
+    seen_id_pairs = set()
+    while pairs:
+        thing, other_thing = pairs.pop()
+        if thing is other_thing:
+            continue
+        thing_type = type(thing)
+        if thing_type is not type(other_thing):
+            if not _are_equal(thing, other_thing):
+                return False
+        elif thing_type in (list, tuple, dict):
+            id_pair = (id(thing), id(other_thing))
+            if id_pair in seen_id_pairs:
+                continue
+            seen_id_pairs.add(id_pair)
+            if len(thing) != len(other_thing):
+                return False
+            if thing_type is dict:
+                if thing.keys() != other_thing.keys():
+                    return False
+                pairs.extend((value, other_thing[key]) for key, value in
+                             thing.items())
+            else:
+                pairs.extend(zip(thing, other_thing))
+        else:
+            view = _get_buffer_view(thing)
+            if view is None:
+                if not _are_equal(thing, other_thing):
+                    return False
+            else:
+                with view, memoryview(other_thing) as other_view:
+                    if view.format != other_view.format or \
+                       view.shape != other_view.shape or \
+                       _get_byte_view(view) != _get_byte_view(other_view):
+                        return False
+    return True
@@ -3,6 +3,8 @@
 
 '''Defines functions for cheat-hashing various types.'''
 
+import zlib
+
 # todo: there are some recommended hash implementations in `_abcoll`, maybe
 # they'll help
 
@@ -13,65 +15,163 @@ def cheat_hash_object(thing):
         return hash(thing)
     except Exception:
         return id(thing)
-
     
-def cheat_hash_set(my_set):
-    '''Cheat-hash a `set`.'''
-    hashables = set()
-    unhashables = set()
-    for thing in my_set:
-        try:
-            hash(thing)
-        except Exception:
-            unhashables.add(thing)
+    
+def cheat_hash_buffer(buffer):
+    '''
+    Cheat-hash a `bytes`, `bytearray`, `memoryview` or `array.array`.
+    
+    The buffer is hashed by its contents and its item format, so equal buffers
+    of a byte format hash like the equal `bytes` object.
+    '''
+    if isinstance(buffer, bytes):
+        return hash(buffer)
+    elif isinstance(buffer, bytearray):
+        return hash(bytes(buffer))
+    with memoryview(buffer) as memory_view:
+        if memory_view.format in ('B', 'b', 'c'):
+            return hash(memory_view.tobytes())
         else:
-            hashables.add(thing)
-            
-    return hash(
-        (
-            frozenset(hashables),
-            tuple(sorted(cheat_hash(thing) for thing in unhashables))
-        )
-    )    
+            return hash((memory_view.format, memory_view.tobytes()))
 
+    
+def _get_buffer_data(memory_view):
+    '''
+    Get the bytes of a buffer in a form that `zlib.crc32` takes.
+    
+    This is the buffer itself if it's C-contiguous, so it isn't copied, or a
+    `bytes` copy of it otherwise.
+    '''
+    if memory_view.c_contiguous:
+        return memory_view
+    else:
+        return memory_view.tobytes()
+    
 
-def cheat_hash_sequence(my_sequence):
-    '''Cheat-hash a sequence.'''
+def content_hash_buffer(buffer):
+    '''
+    Content-hash an object that supports the buffer protocol.
+    
+    This digests the buffer's bytes with CRC-32, without copying them if the
+    buffer is C-contiguous, and mixes in its item format and shape. Used for
+    `bytearray`, `memoryview`, `array.array`, NumPy arrays and the like.
+    '''
+    with memoryview(buffer) as memory_view:
+        return hash((memory_view.format, memory_view.shape,
+                     zlib.crc32(_get_buffer_data(memory_view))))
+    
+    
+def content_hash_object(thing):
+    '''
+    Content-hash an `object`.
+    
+    Like `cheat_hash_object`, except that unhashable objects that support the
+    buffer protocol are hashed by their contents rather than by `id`.
+    '''
+    try:
+        return hash(thing)
+    except Exception:
+        try:
+            return content_hash_buffer(thing)
+        except Exception:
+            return id(thing)
+        
+    
+def _split_hashables(things):
+    '''Split `things` into a list of hashable ones and unhashable ones.'''
     hashables = []
     unhashables = []
-    for thing in my_sequence:
+    for thing in things:
         try:
             hash(thing)
         except Exception:
             unhashables.append(thing)
         else:
             hashables.append(thing)
-            
-    return hash(
-        (
-            tuple(hashables),
-            tuple(cheat_hash(thing) for thing in unhashables)
-        )
-    )    
+    return hashables, unhashables
+
+    
+def _cheat_hash_set_steps(my_set):
+    '''
+    Generator that cheat-hashes a `set`.
+    
+    It yields each unhashable item, gets sent its cheat-hash, and returns the
+    cheat-hash of the whole set. See `_cheat_hash_iteratively`.
+    '''
+    try:
+        return hash((frozenset(my_set), ()))
+    except Exception:
+        pass
+    hashables, unhashables = _split_hashables(my_set)
+    unhashable_hashes = []
+    for thing in unhashables:
+        unhashable_hashes.append((yield thing))
+    return hash((frozenset(hashables), tuple(sorted(unhashable_hashes))))
+
+
+def _cheat_hash_sequence_steps(my_sequence):
+    '''
+    Generator that cheat-hashes a sequence.
+    
+    It yields each unhashable item, gets sent its cheat-hash, and returns the
+    cheat-hash of the whole sequence. See `_cheat_hash_iteratively`.
+    '''
+    try:
+        return hash((tuple(my_sequence), ()))
+    except Exception:
+        pass
+    hashables, unhashables = _split_hashables(my_sequence)
+    unhashable_hashes = []
+    for thing in unhashables:
+        unhashable_hashes.append((yield thing))
+    return hash((tuple(hashables), tuple(unhashable_hashes)))
+
+
+def _cheat_hash_dict_steps(my_dict):
+    '''
+    Generator that cheat-hashes a `dict`.
+    
+    It yields each unhashable `(key, value)` item, gets sent its cheat-hash,
+    and returns the cheat-hash of the whole dict. See
+    `_cheat_hash_iteratively`.
+    '''
+    try:
+        return hash((tuple(sorted(my_dict.items())), ()))
+    except Exception:
+        pass
+    hashable_items, unhashable_items = _split_hashables(my_dict.items())
+    unhashable_hashes = []
+    for item in sorted(unhashable_items):
+        unhashable_hashes.append((yield item))
+    return hash((tuple(sorted(hashable_items)), tuple(unhashable_hashes)))
+
+    
+def cheat_hash_set(my_set):
+    '''Cheat-hash a `set`.'''
+    return _cheat_hash_iteratively(my_set, _cheat_hash_set_steps)
+
+
+def cheat_hash_sequence(my_sequence):
+    '''Cheat-hash a sequence.'''
+    return _cheat_hash_iteratively(my_sequence, _cheat_hash_sequence_steps)
 
 
 def cheat_hash_dict(my_dict):
     '''Cheat-hash a `dict`.'''
-    hashable_items = []
-    unhashable_items = []
-    for key, value in my_dict.items():
-        try:
-            hash((key, value))
-        except Exception:
-            unhashable_items.append((key, value))
-        else:
-            hashable_items.append((key, value))
-            
-    return hash(
-        (
-            tuple(sorted(hashable_items)),
-            tuple(cheat_hash(thing) for thing in sorted(unhashable_items))
-        )
-    )
-
-from .cheat_hash import cheat_hash
\ No newline at end of file
+    return _cheat_hash_iteratively(my_dict, _cheat_hash_dict_steps)
+
+
+steps_functions = {
+    cheat_hash_set: _cheat_hash_set_steps,
+    cheat_hash_sequence: _cheat_hash_sequence_steps,
+    cheat_hash_dict: _cheat_hash_dict_steps,
+}
+'''
+`dict` mapping from a container cheat-hash function to its generator version.
+
+`cheat_hash` runs the generator versions on an explicit stack, so it doesn't
+recurse into nested containers.
+'''
+
+
+from .cheat_hash import cheat_hash, _cheat_hash_iteratively
@@ -0,0 +1,91 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+import collections
+import concurrent.futures
+import itertools
+import os
+
+from python_toolbox import sequence_tools
+from python_toolbox import future_tools
+
+
+class _ShardingMixin:
+    '''
+    Mixin for spaces to split them into shards and map on them in parallel.
+
+    The space must support slicing, and iterating on a slice should be fast.
+    '''
+
+    def shards(self, n_shards):
+        '''
+        Split this space into `n_shards` contiguous slices.
+
+        The slices have lengths that differ by at most one, and together
+        they're the entire space, in order. Each of them is a space too, which
+        you can iterate on quickly, e.g. in a different process.
+        '''
+        return sequence_tools.divide_to_slices(self, n_shards)
+
+    def parallel_map(self, function, processes=None, chunksize=None,
+                     as_completed=False):
+        '''
+        Get `map(function, self)`, calculated in a pool of processes.
+
+        The space is split into contiguous slices of `chunksize` items, (by
+        default up to 100,000 items, and at least 4 slices per process,) and
+        each process iterates on a slice and calls `function` on its items.
+        `function` must be picklable, e.g. a module-level function. `processes`
+        is the number of processes, by default the number of CPUs.
+
+        The results are yielded in the order of the space. Specify
+        `as_completed=True` to get the results of each slice as soon as it's
+        done instead, with no order between the slices.
+
+        Only a few slices are handed to the processes at a time, so this works
+        on spaces that are too big to fit in memory.
+        '''
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if chunksize is None:
+            chunksize = max(min(-(-self.length // (4 * processes)), 10 ** 5),
+                            1)
+        shards = (self[start:(start + chunksize)] for start in
+                  range(0, self.length, chunksize))
+        return _iterate_shard_results(function, shards, processes,
+                                      as_completed)
+
+
+def _map_shard(function, shard):
+    '''Get `list(map(function, shard))`. This is run in the processes.'''
+    return list(map(function, shard))
+
+
+def _iterate_shard_results(function, shards, processes, as_completed):
+    '''
+    Iterate on the results of `_map_shard` on `shards`, in a process pool.
+
+    At most two slices per process are submitted at a time.
+    '''
+    with future_tools.CuteProcessPoolExecutor(processes) as executor:
+        submit = lambda shard: executor.submit(_map_shard, function, shard)
+        futures = collections.deque(
+            map(submit, itertools.islice(shards, 2 * processes))
+        )
+        try:
+            while futures:
+                if as_completed:
+                    done_futures, not_done_futures = concurrent.futures.wait(
+                        futures,
+                        return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    futures = collections.deque(not_done_futures)
+                else:
+                    done_futures = (futures.popleft(),)
+                futures.extend(map(submit, itertools.islice(
+                                               shards, len(done_futures))))
+                for done_future in done_futures:
+                    yield from done_future.result()
+        finally:
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,358 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+import collections
+import itertools
+
+
+class _IteratingMixin:
+    '''
+    Mixin for `PermSpace` to iterate on its perms quickly.
+
+    Instead of unranking every index separately with `__getitem__`, each
+    variation gets a generator that goes from one perm to the next one. The
+    order is exactly the order of indexing.
+    '''
+
+    def __iter__(self):
+        return self._iterate_perms(0)
+
+    def _iterate_perms(self, start):
+        '''Iterate on the perms of this space, starting from index `start`.'''
+        if self.is_sliced:
+            return itertools.islice(
+                self.unsliced._iterate_perms(self.canonical_slice.start +
+                                                                        start),
+                max(self.length - start, 0)
+            )
+        elif self.is_typed:
+            return map(self.perm_type, self._iterate_perm_sequences(start),
+                       itertools.repeat(self))
+        else:
+            return self._iterate_untyped_perms(start)
+
+    def _iterate_untyped_perms(self, start):
+        '''
+        Iterate on the perms of this untyped space, from index `start`.
+
+        Only the first perm is created with `__init__`, the rest are its
+        siblings, which is much faster.
+        '''
+        perm_sequences = self._iterate_perm_sequences(start)
+        for perm_sequence in perm_sequences:
+            first_perm = self.perm_type(perm_sequence, self)
+            yield first_perm
+            get_sibling = first_perm._get_sibling
+            for perm_sequence in perm_sequences:
+                yield get_sibling(perm_sequence)
+
+    def _iterate_perm_sequences(self, start):
+        '''
+        Iterate on the perm sequences of this space, from index `start`.
+
+        The perm sequences are tuples. This space must be unsliced.
+        '''
+        assert not self.is_sliced
+        if start >= self.length:
+            return iter(())
+        elif self.is_dapplied:
+            return self.undapplied._iterate_perm_sequences(start)
+        elif self.is_degreed:
+            if self.is_rapplied:
+                sequence = self.sequence
+                return (tuple(map(sequence.__getitem__, perm_sequence)) for
+                        perm_sequence in
+                        self.unrapplied._iterate_perm_sequences(start))
+            return self._iterate_degreed_perm_sequences(start)
+        elif self.is_recurrent:
+            return self._iterate_recurrent_perm_sequences(start)
+        elif self.is_fixed:
+            return self._iterate_fixed_perm_sequences(start)
+        elif self.is_combination:
+            return self._iterate_combination_perm_sequences(start)
+        else:
+            return self._iterate_plain_perm_sequences(start)
+
+    def _get_indices_of_perm(self, i):
+        '''Get the indices in `self.sequence` of the items of perm `i`.'''
+        index_by_item = {item: index for index, item in
+                         enumerate(self.sequence)}
+        return [index_by_item[item] for item in self[i]._perm_sequence]
+
+    def _iterate_plain_perm_sequences(self, start):
+        '''Iterate on perm sequences of a non-recurrent, non-fixed space.'''
+        if start == 0:
+            yield from itertools.permutations(self.sequence, self.n_elements)
+            return
+        sequence = tuple(self.sequence) # Indexing a `CuteRange` is slow.
+        n_elements = self.n_elements
+        sequence_length = self.sequence_length
+        indices = self._get_indices_of_perm(start)
+        used_indices = set(indices)
+        indices += [index for index in range(sequence_length) if
+                    index not in used_indices]
+        # `indices` now has the perm's indices followed by the unused indices
+        # in ascending order. This is the state that the standard
+        # next-permutation step works on, with the unused indices reversed
+        # first so the unused tail gets skipped over.
+        while True:
+            yield tuple(sequence[index] for index in indices[:n_elements])
+            indices[n_elements:] = reversed(indices[n_elements:])
+            i = sequence_length - 2
+            while i >= 0 and indices[i] > indices[i + 1]:
+                i -= 1
+            if i < 0:
+                return
+            j = sequence_length - 1
+            while indices[j] < indices[i]:
+                j -= 1
+            indices[i], indices[j] = indices[j], indices[i]
+            indices[i + 1:] = reversed(indices[i + 1:])
+
+    def _iterate_combination_perm_sequences(self, start):
+        '''Iterate on perm sequences of a non-recurrent combination space.'''
+        if start == 0:
+            yield from itertools.combinations(self.sequence, self.n_elements)
+            return
+        sequence = tuple(self.sequence)
+        n_elements = self.n_elements
+        sequence_length = self.sequence_length
+        indices = self._get_indices_of_perm(start)
+        while True:
+            yield tuple(sequence[index] for index in indices)
+            i = n_elements - 1
+            while i >= 0 and indices[i] == sequence_length - n_elements + i:
+                i -= 1
+            if i < 0:
+                return
+            indices[i] += 1
+            for j in range(i + 1, n_elements):
+                indices[j] = indices[j - 1] + 1
+
+    def _iterate_fixed_perm_sequences(self, start):
+        '''Iterate on perm sequences of a non-recurrent, non-degreed space.'''
+        fixed_map = self._undapplied_fixed_map
+        template = [fixed_map.get(m) for m in range(self.n_elements)]
+        free_indices = [m for m in range(self.n_elements) if
+                        m not in fixed_map]
+        free_values_perm_sequences = \
+          self._free_values_unsliced_perm_space._iterate_perm_sequences(start)
+        for free_values_perm_sequence in free_values_perm_sequences:
+            perm_sequence = template[:]
+            for m, value in zip(free_indices, free_values_perm_sequence):
+                perm_sequence[m] = value
+            yield tuple(perm_sequence)
+
+    def _iterate_degreed_perm_sequences(self, start):
+        '''
+        Iterate on perm sequences of a purified degreed space.
+
+        This is a depth-first search over the free indices, trying the
+        available values in the same order as `__getitem__`, and skipping any
+        value after which no perm could have one of the allowed degrees.
+        '''
+        sequence_length = self.sequence_length
+        degrees = self.degrees
+        wip_perm_sequence = [None] * sequence_length
+        for key, value in self.fixed_map.items():
+            wip_perm_sequence[key] = value
+        free_indices = [j for j in self.sequence if j not in self.fixed_map]
+        n_levels = len(free_indices)
+        n_fixed = sequence_length - n_levels
+        available_values = list(self.free_values)
+        # `n_cycles[level]` is the number of cycles closed in the first
+        # `level` free indices and the fixed items.
+        n_cycles = [self._n_cycles_in_fixed_items_of_just_fixed] * \
+                                                                (n_levels + 1)
+        value_indices = [0] * (n_levels + 1)
+
+        def get_n_cycles(level, value):
+            '''
+            Get the number of cycles after putting `value` in `level`.
+
+            Returns `None` if no perm that starts like that has an allowed
+            degree. (That's when the number of such perms, a sum of Stirling
+            numbers, is zero.)
+            '''
+            j = free_indices[level]
+            current = value
+            while current is not None and current != j:
+                current = wip_perm_sequence[current]
+            candidate_n_cycles = n_cycles[level] + (current is not None)
+            n_left = sequence_length - n_fixed - level - 1
+            for degree in degrees:
+                n_cycles_left = sequence_length - degree - candidate_n_cycles
+                if (0 < n_cycles_left <= n_left) or (n_cycles_left == n_left
+                                                                       == 0):
+                    return candidate_n_cycles
+            return None
+
+        def put(level, value_index, value, candidate_n_cycles):
+            value_indices[level] = value_index
+            del available_values[value_index]
+            wip_perm_sequence[free_indices[level]] = value
+            n_cycles[level + 1] = candidate_n_cycles
+            value_indices[level + 1] = 0
+
+        def take(level):
+            j = free_indices[level]
+            available_values.insert(value_indices[level], wip_perm_sequence[j])
+            wip_perm_sequence[j] = None
+            value_indices[level] += 1
+
+        level = 0
+        if start:
+            for level, value in enumerate(self[start]._perm_sequence[j] for j
+                                          in free_indices):
+                put(level, available_values.index(value), value,
+                    get_n_cycles(level, value))
+            level = n_levels
+
+        while True:
+            if level == n_levels:
+                yield tuple(wip_perm_sequence)
+                level -= 1
+                if level < 0:
+                    return
+                take(level)
+                continue
+            for value_index in range(value_indices[level],
+                                     len(available_values)):
+                value = available_values[value_index]
+                candidate_n_cycles = get_n_cycles(level, value)
+                if candidate_n_cycles is not None:
+                    put(level, value_index, value, candidate_n_cycles)
+                    level += 1
+                    break
+            else:
+                level -= 1
+                if level < 0:
+                    return
+                take(level)
+
+    def _iterate_recurrent_perm_sequences(self, start):
+        '''
+        Iterate on perm sequences of an undapplied recurrent space.
+
+        This is a depth-first search over the indices, trying the distinct
+        available values in the same order as `__getitem__`. In combination
+        spaces a value is never used after a value that was tried before it,
+        as in `__getitem__`'s `shit_set`, and values after which there aren't
+        enough items left in the sequence are skipped.
+        '''
+        sequence = self.sequence
+        sequence_length = self.sequence_length
+        n_elements = self.n_elements
+        fixed_map = self.fixed_map
+        is_combination = self.is_combination
+        wip_perm_sequence = [None] * n_elements
+        available_values = list(sequence)
+        reserved_values = collections.Counter(fixed_map.values())
+        shit_set = set()
+        # Per level: The distinct values to try, (`None` for fixed indices,)
+        # the index of the current one in them, where in `available_values`
+        # the chosen value was, the values added to `shit_set` and, for
+        # combinations, where the rest of the sequence starts.
+        candidate_lists = [None] * n_elements
+        candidate_indices = [0] * n_elements
+        available_value_indices = [0] * n_elements
+        shit_lists = [[] for _ in range(n_elements)]
+        cuts = [0] * (n_elements + 1)
+
+        def get_candidates():
+            counter = collections.Counter(available_values)
+            return [value for value in dict.fromkeys(available_values) if
+                    counter[value] > reserved_values[value] and
+                    value not in shit_set]
+
+        def is_nonempty(level, value):
+            if not is_combination:
+                return True
+            try:
+                cut = sequence.index(value, cuts[level]) + 1
+            except ValueError:
+                return False
+            n_items_left = sum(1 for item in sequence[cut:] if
+                               item not in shit_set)
+            return n_items_left >= n_elements - level - 1
+
+        def enter(level):
+            '''Start `level`, returning whether it's a fixed one.'''
+            if level in fixed_map:
+                value = fixed_map[level]
+                reserved_values[value] -= 1
+                put(level, value)
+                return True
+            else:
+                candidate_lists[level] = get_candidates()
+                candidate_indices[level] = 0
+                return False
+
+        def put(level, value):
+            available_value_indices[level] = available_values.index(value)
+            del available_values[available_value_indices[level]]
+            wip_perm_sequence[level] = value
+            if is_combination:
+                cuts[level + 1] = sequence.index(value, cuts[level]) + 1
+
+        def skip(level, value):
+            candidate_indices[level] += 1
+            if is_combination:
+                shit_set.add(value)
+                shit_lists[level].append(value)
+
+        def backtrack(level):
+            '''
+            Go up from `level` to the last level that has values left to try.
+
+            Returns `-1` when there's no such level.
+            '''
+            level -= 1
+            while level >= 0:
+                value = wip_perm_sequence[level]
+                available_values.insert(available_value_indices[level], value)
+                if level in fixed_map:
+                    reserved_values[value] += 1
+                    level -= 1
+                else:
+                    skip(level, value)
+                    break
+            return level
+
+        if start:
+            for level, value in enumerate(self[start]._perm_sequence):
+                if not enter(level):
+                    candidates = candidate_lists[level]
+                    for skipped_value in candidates[:candidates.index(value)]:
+                        skip(level, skipped_value)
+                    put(level, value)
+            level = n_elements
+        else:
+            level = 0
+            while level < n_elements and enter(level):
+                level += 1
+
+        while True:
+            if level == n_elements:
+                yield tuple(wip_perm_sequence)
+            else:
+                candidates = candidate_lists[level]
+                while candidate_indices[level] < len(candidates):
+                    value = candidates[candidate_indices[level]]
+                    if is_nonempty(level, value):
+                        put(level, value)
+                        level += 1
+                        while level < n_elements and enter(level):
+                            level += 1
+                        break
+                    skip(level, value)
+                else:
+                    shit_set.difference_update(shit_lists[level])
+                    del shit_lists[level][:]
+                    level = backtrack(level)
+                    if level < 0:
+                        return
+                continue
+            level = backtrack(level)
+            if level < 0:
+                return
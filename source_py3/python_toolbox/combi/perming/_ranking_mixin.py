@@ -0,0 +1,255 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+import bisect
+import itertools
+
+from ._recurrent_perm_builder import _RecurrentPermBuilder
+
+
+class _RankingMixin:
+    '''Mixin for `PermSpace` to rank perms, i.e. get their index numbers.'''
+
+    def index_many(self, perms):
+        '''
+        Get the index numbers of `perms` in this space.
+
+        This is like `[self.index(perm) for perm in perms]`, except that the
+        tables that ranking needs are calculated only once. Perms of this
+        space, and for spaces that aren't degreed also plain sequences, are
+        ranked without creating a `Perm` for them, which is much faster.
+
+        Raises `ValueError` if any of `perms` isn't in this space.
+        '''
+        from .perm import Perm
+        unsliced = self.unsliced
+        nominal_perm_space = unsliced.undegreed.unfixed
+        canonical_slice = self.canonical_slice
+        perm_numbers = []
+        for perm in perms:
+            if isinstance(perm, Perm):
+                if perm.nominal_perm_space is not nominal_perm_space or (
+                       self.is_degreed and perm.degree not in self.degrees):
+                    perm_numbers.append(self.index(perm))
+                    continue
+                perm_sequence = perm._perm_sequence
+            elif self.is_degreed:
+                perm_numbers.append(self.index(perm))
+                continue
+            else:
+                perm_sequence = perm
+            perm_number = unsliced._get_perm_number(perm_sequence)
+            if perm_number not in canonical_slice:
+                raise ValueError
+            perm_numbers.append(perm_number - canonical_slice.start)
+        return perm_numbers
+
+    def _get_perm_number(self, perm_sequence):
+        '''
+        Get the index number of the perm with the items in `perm_sequence`.
+
+        This space must be unsliced. Raises `ValueError` if there's no such
+        perm in this space, except that for degreed spaces the degree isn't
+        checked.
+        '''
+        assert not self.is_sliced
+        perm_sequence = tuple(perm_sequence)
+        if len(perm_sequence) != self.n_elements:
+            raise ValueError
+        elif self.is_dapplied:
+            return self.undapplied._get_perm_number(perm_sequence)
+        elif self.is_degreed:
+            if self.is_rapplied:
+                return self.unrapplied._get_perm_number(
+                    self._get_sequence_indices(perm_sequence)
+                )
+            return self._get_degreed_perm_number(perm_sequence)
+        elif self.is_recurrent:
+            return self._get_recurrent_perm_number(perm_sequence)
+        elif self.is_fixed:
+            return self._get_fixed_perm_number(perm_sequence)
+        elif self.is_combination:
+            return self._get_combination_perm_number(perm_sequence)
+        else:
+            return self._get_plain_perm_number(perm_sequence)
+
+    def _get_sequence_indices(self, perm_sequence):
+        '''Get the indices in `self.sequence` of the items of a perm.'''
+        index_by_item = self._index_by_item
+        try:
+            return [index_by_item[item] for item in perm_sequence]
+        except KeyError:
+            raise ValueError
+
+    def _get_plain_perm_number(self, perm_sequence):
+        '''Get the index number of a perm of a plain or partial space.'''
+        sequence_length = self.sequence_length
+        indices = self._get_sequence_indices(perm_sequence)
+        # The digit of an item is the number of unused indices below its index
+        # in the sequence, and the perm number is made of the digits with
+        # radices `sequence_length`, `sequence_length - 1`, and so on.
+        digits = list(_iterate_digits(indices, sequence_length))
+        if len(digits) <= _max_n_digits_for_horner:
+            perm_number = 0
+            for j, digit in enumerate(digits):
+                perm_number = perm_number * (sequence_length - j) + digit
+            return perm_number
+        # For long perms, multiplying the huge perm number by every radix takes
+        # quadratic time, so we combine neighboring digits into pairs of a
+        # number and the product of its radices, then neighboring pairs, and
+        # so on, so most multiplications are of numbers of similar size.
+        pairs = [(digit, sequence_length - j) for j, digit in
+                 enumerate(digits)]
+        while len(pairs) >= 2:
+            pairs = [
+                (number * next_radix + next_number, radix * next_radix) for
+                (number, radix), (next_number, next_radix) in
+                zip(pairs[::2], pairs[1::2])
+            ] + pairs[len(pairs) - len(pairs) % 2:]
+        return pairs[0][0]
+
+    def _get_combination_perm_number(self, perm_sequence):
+        '''Get the index number of a perm of a non-recurrent comb space.'''
+        indices = self._get_sequence_indices(perm_sequence)
+        if any(index >= next_index for index, next_index in
+               zip(indices, indices[1:])):
+            raise ValueError
+        # This is `__getitem__`'s algorithm in reverse: The binomials of the
+        # indices counted from the end of the sequence.
+        binomial_rows = self._binomial_rows
+        last_index = self.sequence_length - 1
+        return self.length - 1 - sum(
+            binomial_rows[k][last_index - index] for k, index in
+            enumerate(reversed(indices), start=1)
+        )
+
+    def _get_fixed_perm_number(self, perm_sequence):
+        '''Get the index number of a perm of a fixed, non-recurrent space.'''
+        fixed_map = self.fixed_map
+        free_values_perm_sequence = []
+        for i, item in enumerate(perm_sequence):
+            if i in fixed_map:
+                if fixed_map[i] != item:
+                    raise ValueError
+            else:
+                free_values_perm_sequence.append(item)
+        return self._free_values_unsliced_perm_space._get_perm_number(
+            free_values_perm_sequence
+        )
+
+    def _get_recurrent_perm_number(self, perm_sequence):
+        '''Get the index number of a perm of a recurrent space.'''
+        builder = _RecurrentPermBuilder(self)
+        perm_number = 0
+        for j, value in enumerate(perm_sequence):
+            if builder.is_at_fixed_index:
+                if self.fixed_map[j] != value:
+                    raise ValueError
+            else:
+                for candidate in builder.get_candidates():
+                    if candidate == value:
+                        break
+                    perm_number += builder.get_sub_space_length(candidate)
+                    builder.skip(candidate)
+                else:
+                    raise ValueError
+            builder.add(value)
+        return perm_number
+
+    def _get_degreed_perm_number(self, perm_sequence):
+        '''Get the index number of a perm of a purified degreed space.'''
+        sequence_length = self.sequence_length
+        fixed_map = self.fixed_map
+        # As in `__getitem__`, we keep the items we've already put in the perm
+        # in chains, to know whether a value closes a cycle. Of the unused
+        # values below a value, only the head of the chain that ends in our
+        # index closes a cycle, so all the others have sub-spaces of the same
+        # length.
+        tail_by_head = {item: item for item in range(sequence_length)}
+        head_by_tail = dict(tail_by_head)
+
+        def connect(key, value):
+            tail = tail_by_head.pop(value)
+            head = head_by_tail.pop(key)
+            if tail != key:
+                tail_by_head[head] = tail
+                head_by_tail[tail] = head
+
+        for key, value in fixed_map.items():
+            connect(key, value)
+
+        degreed_lengths = self._degreed_lengths
+        n_cycles = self._n_cycles_in_fixed_items_of_just_fixed
+        n_unfixed_items = sequence_length - len(fixed_map)
+        free_indices = [j for j in range(sequence_length) if
+                        j not in fixed_map]
+        for j in fixed_map:
+            if perm_sequence[j] != fixed_map[j]:
+                raise ValueError
+        values = [perm_sequence[j] for j in free_indices]
+        # The number of unused values below each value:
+        n_lower_values_list = _iterate_digits(
+            self._get_sequence_indices(values), sequence_length,
+            used_indices=fixed_map.values()
+        )
+        perm_number = 0
+        for j, value, n_lower_values in zip(free_indices, values,
+                                            n_lower_values_list):
+            n_unfixed_items -= 1
+            lengths = degreed_lengths[n_unfixed_items]
+            perm_number += n_lower_values * lengths[n_cycles]
+            if head_by_tail[j] < value:
+                perm_number += lengths[n_cycles + 1] - lengths[n_cycles]
+            n_cycles += (tail_by_head[value] == j)
+            connect(j, value)
+        return perm_number
+
+
+_max_n_digits_for_horner = 1000
+
+_max_n_indices_for_bisect = 2000
+
+
+def _iterate_digits(indices, sequence_length, used_indices=()):
+    '''
+    Iterate on the numbers of unused sequence indices below `indices`.
+
+    Each of `indices` is used after its number is yielded, and the
+    `used_indices` are used from the start. Raises `ValueError` if an index is
+    used twice.
+    '''
+    if len(indices) + len(used_indices) <= _max_n_indices_for_bisect:
+        # We keep a sorted list of the used indices. Inserting into it takes
+        # linear time, but it's a fast `memmove`, so for short lists this is
+        # faster than the Fenwick tree.
+        used_indices = sorted(used_indices)
+        for index in indices:
+            position = bisect.bisect_left(used_indices, index)
+            if used_indices[position:position + 1] == [index]:
+                raise ValueError
+            used_indices.insert(position, index)
+            yield index - position
+    else:
+        # `tree` is a Fenwick tree of the used indices, so counting the used
+        # indices below an index takes O(log(n)) time.
+        tree = [0] * (sequence_length + 1)
+        is_used = bytearray(sequence_length)
+        indices = itertools.chain(
+            ((index, False) for index in used_indices),
+            ((index, True) for index in indices),
+        )
+        for index, is_yielded in indices:
+            if is_used[index]:
+                raise ValueError
+            is_used[index] = True
+            if is_yielded:
+                n_lower_indices = index
+                k = index
+                while k:
+                    n_lower_indices -= tree[k]
+                    k &= k - 1
+                yield n_lower_indices
+            k = index + 1
+            while k <= sequence_length:
+                tree[k] += 1
+                k += k & -k
@@ -0,0 +1,122 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+import collections
+
+from python_toolbox import nifty_collections
+
+from .calculating_length import (calculate_length_of_recurrent_perm_space,
+                                 calculate_length_of_recurrent_comb_space)
+
+
+class _RecurrentPermBuilder:
+    '''
+    Builder of a perm of a recurrent space, one item after another.
+
+    This is used for both unranking and ranking. At each free index, the
+    candidates are the values that the next item may be, in the order of the
+    space, and `get_sub_space_length` tells how many perms of the space start
+    with the items so far followed by a candidate.
+
+    Instead of creating that sub-space just to get its length, we calculate
+    the length from the counts of the items that the sub-space would have. In
+    perm spaces, candidates that have the same count leave the same
+    `FrozenBagBag`, so their sub-spaces have the same length and we calculate
+    it once. In combination spaces, a candidate that was skipped at an index
+    isn't used at any later index.
+
+    The space must be an unsliced, undapplied, undegreed recurrent space.
+    '''
+
+    def __init__(self, perm_space):
+        assert perm_space.is_recurrent and not perm_space.is_sliced and \
+                not perm_space.is_dapplied and not perm_space.is_degreed
+        self.sequence = perm_space.sequence
+        self.n_elements = perm_space.n_elements
+        self.fixed_map = perm_space.fixed_map
+        self.is_combination = perm_space.is_combination
+
+        self.wip_perm_sequence = []
+        self.available_values = list(self.sequence)
+        self.free_counts = collections.Counter(perm_space.free_values)
+        self.n_free_items = len(perm_space.free_values)
+        self.n_free_indices = self.n_elements - len(self.fixed_map)
+        self.shit_set = set()
+        self.cut = 0
+        '''Where the rest of the sequence starts, for combinations.'''
+        self._sub_space_lengths_by_count = {}
+
+    @property
+    def is_at_fixed_index(self):
+        '''Whether the next item is at a fixed index.'''
+        return len(self.wip_perm_sequence) in self.fixed_map
+
+    def get_candidates(self):
+        '''Get the values that the next item may be, in order.'''
+        free_counts = self.free_counts
+        shit_set = self.shit_set
+        return [item for item in dict.fromkeys(self.available_values) if
+                free_counts[item] and item not in shit_set]
+
+    def get_sub_space_length(self, candidate):
+        '''Get the number of perms starting with our items and `candidate`.'''
+        if self.is_combination:
+            return self._get_comb_sub_space_length(
+                self.sequence.index(candidate, self.cut) + 1
+            )
+        count = self.free_counts[candidate]
+        try:
+            return self._sub_space_lengths_by_count[count]
+        except KeyError:
+            sub_space_length = self._sub_space_lengths_by_count[count] = \
+                                         self._get_perm_sub_space_length(count)
+            return sub_space_length
+
+    def _get_perm_sub_space_length(self, count):
+        n_free_indices = self.n_free_indices - 1
+        if not n_free_indices:
+            return 1
+        elif self.n_free_items - 1 < n_free_indices:
+            return 0
+        sub_counts = list(self.free_counts.values())
+        sub_counts.remove(count)
+        sub_counts.append(count - 1)
+        return calculate_length_of_recurrent_perm_space(
+            n_free_indices, nifty_collections.FrozenBagBag(sub_counts)
+        )
+
+    def _get_comb_sub_space_length(self, sub_cut):
+        n_items_left = self.n_elements - len(self.wip_perm_sequence) - 1
+        if not n_items_left:
+            return 1
+        shit_set = self.shit_set
+        sub_counts = collections.Counter(
+            item for item in self.sequence[sub_cut:] if item not in shit_set
+        )
+        if sum(sub_counts.values()) < n_items_left:
+            return 0
+        return calculate_length_of_recurrent_comb_space(
+            n_items_left, nifty_collections.FrozenBagBag(sub_counts.values())
+        )
+
+    def skip(self, candidate):
+        '''Note that the next item isn't `candidate`.'''
+        if self.is_combination:
+            self.shit_set.add(candidate)
+
+    def add(self, value):
+        '''
+        Add `value` as the next item.
+
+        At a free index, `value` must be one of the candidates. At a fixed
+        index, it must be the fixed value.
+        '''
+        self.available_values.remove(value)
+        if not self.is_at_fixed_index:
+            self.free_counts[value] -= 1
+            self.n_free_items -= 1
+            self.n_free_indices -= 1
+            self._sub_space_lengths_by_count.clear()
+            if self.is_combination:
+                self.cut = self.sequence.index(value, self.cut) + 1
+        self.wip_perm_sequence.append(value)
@@ -0,0 +1,136 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+import array
+import bisect
+import math
+
+
+class _UnrankingMixin:
+    '''Mixin for `PermSpace` to unrank many perms at once.'''
+
+    def get_many(self, indices, compact=False):
+        '''
+        Get the perms with the index numbers in `indices`.
+
+        This is like `[self[i] for i in indices]`, except that all the perms
+        are unranked together, so the factorial and binomial tables that
+        unranking needs are calculated only once. For plain, partial and
+        combination spaces, (rapplied, dapplied or sliced or not,) this is much
+        faster than unranking each index by itself.
+
+        If `compact=True`, you get a list of `array.array` rows instead of
+        perms. Each row has the indices in `self.sequence` of the items of the
+        perm. (In recurrent spaces, the index of the first equal item.) This
+        takes much less memory than perms, and NumPy can make a 2-D array out
+        of it.
+        '''
+        length = self.length
+        offset = self.canonical_slice.start
+        unsliced_indices = []
+        for i in indices:
+            if i <= -1:
+                i += length
+            if not (0 <= i < length):
+                raise IndexError
+            unsliced_indices.append(i + offset)
+        unsliced = self.unsliced
+
+        if compact:
+            return [array.array('q', row) for row in
+                    unsliced._iterate_position_rows(unsliced_indices)]
+        elif not unsliced._is_quickly_unrankable:
+            return [unsliced[i] for i in unsliced_indices]
+
+        rows = unsliced._iterate_position_rows(unsliced_indices)
+        if unsliced.is_rapplied:
+            sequence = unsliced.sequence
+            perm_sequences = (tuple(map(sequence.__getitem__, row)) for row
+                              in rows)
+        else:
+            perm_sequences = map(tuple, rows)
+        if unsliced.is_typed:
+            return [unsliced.perm_type(perm_sequence, unsliced) for
+                    perm_sequence in perm_sequences]
+        perms = []
+        for perm_sequence in perm_sequences:
+            if perms:
+                perms.append(perms[0]._get_sibling(perm_sequence))
+            else:
+                perms.append(unsliced.perm_type(perm_sequence, unsliced))
+        return perms
+
+    @property
+    def _is_quickly_unrankable(self):
+        '''Whether `get_many` has a fast algorithm for this space.'''
+        return not (self.is_recurrent or self.is_fixed or self.is_degreed)
+
+    def _iterate_position_rows(self, indices):
+        '''
+        Iterate on rows of sequence indices of the perms numbered `indices`.
+
+        This space must be unsliced, and `indices` must be valid.
+        '''
+        assert not self.is_sliced
+        if not self._is_quickly_unrankable:
+            index_by_item = self._index_by_item
+            return ([index_by_item[item] for item in self[i]] for i in
+                    indices)
+        elif self.is_combination:
+            return self._iterate_combination_position_rows(indices)
+        else:
+            return self._iterate_plain_position_rows(indices)
+
+    def _iterate_plain_position_rows(self, indices):
+        '''Iterate on sequence index rows in a plain or partial space.'''
+        sequence_length = self.sequence_length
+        n_elements = self.n_elements
+        # The number of perms that share the first `j + 1` items is
+        # `radices[j]`, so perm number `i` has as item `j` the unused item
+        # number `i // radices[j] % (sequence_length - j)`.
+        n_unused_elements_factorial = math.factorial(self.n_unused_elements)
+        radices = [math.factorial(sequence_length - 1 - j) //
+                   n_unused_elements_factorial for j in range(n_elements)]
+        if n_elements ** 2 <= sequence_length:
+            # Few items out of a long sequence: Instead of copying a list of
+            # all the unused indices for each perm, we find the index of each
+            # item by counting the used indices that come before it.
+            for i in indices:
+                row = []
+                used_indices = []
+                for radix in radices:
+                    digit, i = divmod(i, radix)
+                    for used_index in used_indices:
+                        if used_index <= digit:
+                            digit += 1
+                        else:
+                            break
+                    bisect.insort(used_indices, digit)
+                    row.append(digit)
+                yield row
+        else:
+            all_indices = list(range(sequence_length))
+            for i in indices:
+                unused_indices = all_indices[:]
+                row = []
+                for radix in radices:
+                    digit, i = divmod(i, radix)
+                    row.append(unused_indices.pop(digit))
+                yield row
+
+    def _iterate_combination_position_rows(self, indices):
+        '''Iterate on sequence index rows in a combination space.'''
+        sequence_length = self.sequence_length
+        n_elements = self.n_elements
+        binomial_rows = self._binomial_rows
+        # This is `__getitem__`'s algorithm, with the search for the biggest
+        # binomial that fits done with `bisect`.
+        for i in indices:
+            wip_number = self.length - 1 - i
+            row = []
+            for k in range(n_elements, 0, -1):
+                binomial_row = binomial_rows[k]
+                j = bisect.bisect_right(binomial_row, wip_number) - 1
+                row.append(sequence_length - 1 - j)
+                wip_number -= binomial_row[j]
+            yield row
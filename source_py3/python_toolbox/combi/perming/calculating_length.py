@@ -1,175 +1,150 @@
 # Copyright 2009-2017 Ram Rachum.
 # This program is distributed under the MIT license.
 
-import itertools
-
 from python_toolbox import nifty_collections
+from python_toolbox.caching.cache_dict import CacheDict
+
+
+# The lengths are counted with generating functions: Each different item of
+# the sequence is a polynomial, where the coefficient of `x ** j` is the
+# number of ways to use `j` copies of the item, i.e. 1 for every `j` up to the
+# item's count. Multiplying the polynomials of all the items, the coefficient
+# of `x ** k` is the number of ways to choose `k` items out of the sequence.
+# For combinations that's the length we want. For perms, the chosen items may
+# also be ordered in different ways, so we multiply them as exponential
+# generating functions, which is where the binomials come from.
+#
+# Items with the same count have the same polynomial, so for each key of the
+# `FrozenBagBag` we raise the polynomial to the power of its value by repeated
+# squaring. All polynomials are truncated after `x ** k`.
+
+
+def _get_binomial_rows(k):
+    '''Get a list where `binomial_rows[m][j]` is `binomial(m, j)`.'''
+    binomial_rows = [[1]]
+    for m in range(1, k + 1):
+        previous_row = binomial_rows[-1]
+        binomial_rows.append(
+            [1] + [a + b for a, b in zip(previous_row, previous_row[1:])] +
+            [1]
+        )
+    return binomial_rows
+
+
+def _multiply_ordinary(a, b, k, binomial_rows=None):
+    '''Multiply the polynomials `a` and `b`, truncating after `x ** k`.'''
+    product = [0] * min(len(a) + len(b) - 1, k + 1)
+    for i, a_coefficient in enumerate(a):
+        if not a_coefficient:
+            continue
+        for j, b_coefficient in enumerate(b[:len(product) - i]):
+            product[i + j] += a_coefficient * b_coefficient
+    return product
+
 
+def _multiply_exponential(a, b, k, binomial_rows):
+    '''
+    Multiply the exponential generating functions `a` and `b`.
+
+    The coefficients are the numbers of arrangements, i.e. the coefficients of
+    `x ** m / m!`. The product is truncated after `x ** k`.
+    '''
+    product = [0] * min(len(a) + len(b) - 1, k + 1)
+    for i, a_coefficient in enumerate(a):
+        if not a_coefficient:
+            continue
+        for j, b_coefficient in enumerate(b[:len(product) - i]):
+            product[i + j] += (binomial_rows[i + j][i] * a_coefficient *
+                               b_coefficient)
+    return product
+
+
+def _count(k, fbb, multiply):
+    '''
+    Get the coefficient of `x ** k` in the product of the items' polynomials.
+
+    `multiply` is the function for multiplying two polynomials.
+    '''
+    binomial_rows = (_get_binomial_rows(k) if multiply is
+                     _multiply_exponential else None)
+    product = [1]
+    for count, n_items in fbb.items():
+        # Raising the item's polynomial to the power of `n_items`:
+        power = [1] * (min(count, k) + 1)
+        while True:
+            if n_items & 1:
+                product = multiply(product, power, k, binomial_rows)
+            n_items >>= 1
+            if not n_items:
+                break
+            power = multiply(power, power, k, binomial_rows)
+    return product[k] if k < len(product) else 0
+
+
+_length_of_recurrent_perm_space_cache = CacheDict(max_size=10 ** 4)
 
-_length_of_recurrent_perm_space_cache = {}
 
 def calculate_length_of_recurrent_perm_space(k, fbb):
     '''
     Calculate the length of a recurrent `PermSpace`.
-    
+
     `k` is the `n_elements` of the space, i.e. the length of each perm. `fbb`
     is the space's `FrozenBagBag`, meaning a bag where each key is the number
     of recurrences of an item and each count is the number of different items
     that have this number of recurrences. (See documentation of `FrozenBagBag`
     for more info.)
-    
+
     It's assumed that the space is not a `CombSpace`, it's not fixed, not
     degreed and not sliced.
+
+    The results are kept in `_length_of_recurrent_perm_space_cache`, a
+    `CacheDict` of the 10,000 most recently used ones, which you may inspect
+    or `clear`.
     '''
-    cache = _length_of_recurrent_perm_space_cache
     if not isinstance(fbb, nifty_collections.FrozenBagBag):
         fbb = nifty_collections.FrozenBagBag(fbb)
-    ### Checking for edge cases: ##############################################
-    #                                                                         #
     if k == 0:
         return 1
     elif k == 1:
-        assert fbb
-        # (Works because `FrozenBagBag` has a functioning `__bool__`, unlike
-        # Python's `Counter`.)
         return fbb.n_elements
-    #                                                                         #
-    ### Finished checking for edge cases. #####################################
-    
+    cache = _length_of_recurrent_perm_space_cache
     try:
         return cache[(k, fbb)]
     except KeyError:
-        pass
-
-    # This is a 2-phase algorithm, similar to recursion but not really
-    # recursion since we don't want to abuse the stack.
-    #
-    # In the first phase, we get all the sub-FBBs that we need to solve for to
-    # get a solution for this FBB, and then for these sub-FBBs we get the
-    # sub-sub-FBBs we need to solve in order to solve them, and we continue
-    # until we reach trivial FBBs.
-    #
-    # In the second phase, we'll go over the levels of FBBs, starting with the
-    # simplest ones and making our way up to the original FBB. The simplest
-    # FBBs will be solved trivially, and then as they get progressively more
-    # complex, each FBB will be solved using the solutions of its sub-FBB.
-    # Every solution will be stored in the global cache.
-
-    
-    ### Doing phase one, getting all sub-FBBs: ################################
-    #                                                                         #
-    levels = []
-    current_fbbs = {fbb}
-    while len(levels) < k and current_fbbs:
-        k_ = k - len(levels)
-        levels.append(
-            {fbb_: fbb_.get_sub_fbbs_for_one_key_removed()
-             for fbb_ in current_fbbs if (k_, fbb_) not in cache}
-        )
-        current_fbbs = set(itertools.chain(*levels[-1].values()))
-    #                                                                         #
-    ### Finished doing phase one, getting all sub-FBBs. #######################
-    
-    ### Doing phase two, solving FBBs from trivial to complex: ################
-    #                                                                         #
-    for k_, level in enumerate(reversed(levels), (k - len(levels) + 1)):
-        if k_ == 1:
-            for fbb_, sub_fbb_bag in level.items():
-                cache[(k_, fbb_)] = fbb_.n_elements
-        else:
-            for fbb_, sub_fbb_bag in level.items():
-                cache[(k_, fbb_)] = sum(
-                    (cache[(k_ - 1, sub_fbb)] * factor for
-                           sub_fbb, factor in sub_fbb_bag.items())
-                )
-    #                                                                         #
-    ### Finished doing phase two, solving FBBs from trivial to complex. #######
-    
-    return cache[(k, fbb)]
-        
-    
+        length = cache[(k, fbb)] = _count(k, fbb, _multiply_exponential)
+        return length
 
 
 ###############################################################################
 
-_length_of_recurrent_comb_space_cache = {}
+_length_of_recurrent_comb_space_cache = CacheDict(max_size=10 ** 4)
+
 
 def calculate_length_of_recurrent_comb_space(k, fbb):
     '''
     Calculate the length of a recurrent `CombSpace`.
-    
+
     `k` is the `n_elements` of the space, i.e. the length of each perm. `fbb`
     is the space's `FrozenBagBag`, meaning a bag where each key is the number
     of recurrences of an item and each count is the number of different items
     that have this number of recurrences. (See documentation of `FrozenBagBag`
     for more info.)
-    
+
     It's assumed that the space is not fixed, not degreed and not sliced.
+
+    The results are kept in `_length_of_recurrent_comb_space_cache`, a
+    `CacheDict` of the 10,000 most recently used ones, which you may inspect
+    or `clear`.
     '''
-    cache = _length_of_recurrent_comb_space_cache
     if not isinstance(fbb, nifty_collections.FrozenBagBag):
         fbb = nifty_collections.FrozenBagBag(fbb)
-    ### Checking for edge cases: ##############################################
-    #                                                                         #
     if k == 0:
         return 1
     elif k == 1:
-        assert fbb
-        # (Works because `FrozenBagBag` has a functioning `__bool__`,
-        # unlike Python's `Counter`.)
         return fbb.n_elements
-    #                                                                         #
-    ### Finished checking for edge cases. #####################################
-
+    cache = _length_of_recurrent_comb_space_cache
     try:
         return cache[(k, fbb)]
     except KeyError:
-        pass
-    
-    # This is a 2-phase algorithm, similar to recursion but not really
-    # recursion since we don't want to abuse the stack.
-    #
-    # In the first phase, we get all the sub-FBBs that we need to solve for to
-    # get a solution for this FBB, and then for these sub-FBBs we get the
-    # sub-sub-FBBs we need to solve in order to solve them, and we continue
-    # until we reach trivial FBBs.
-    #
-    # In the second phase, we'll go over the levels of FBBs, starting with the
-    # simplest ones and making our way up to the original FBB. The simplest
-    # FBBs will be solved trivially, and then as they get progressively more
-    # complex, each FBB will be solved using the solutions of its sub-FBB.
-    # Every solution will be stored in the global cache.
-
-    
-    ### Doing phase one, getting all sub-FBBs: ################################
-    #                                                                         #
-    levels = []
-    current_fbbs = {fbb}
-    while len(levels) < k and current_fbbs:
-        k_ = k - len(levels)
-        levels.append(
-            {fbb_: fbb_.get_sub_fbbs_for_one_key_and_previous_piles_removed()
-             for fbb_ in current_fbbs if (k_, fbb_) not in cache}
-        )
-        current_fbbs = set(itertools.chain(*levels[-1].values()))
-    #                                                                         #
-    ### Finished doing phase one, getting all sub-FBBs. #######################
-        
-    ### Doing phase two, solving FBBs from trivial to complex: ################
-    #                                                                         #
-    for k_, level in enumerate(reversed(levels), (k - len(levels) + 1)):
-        if k_ == 1:
-            for fbb_, sub_fbbs in level.items():
-                cache[(k_, fbb_)] = len(sub_fbbs)
-        else:
-            for fbb_, sub_fbbs in level.items():
-                cache[(k_, fbb_)] = sum(
-                    (cache[(k_ - 1, sub_fbb)] for sub_fbb in sub_fbbs)
-                )
-    #                                                                         #
-    ### Finished doing phase two, solving FBBs from trivial to complex. #######
-    
-    return cache[(k, fbb)]
-        
-    
-            
+        length = cache[(k, fbb)] = _count(k, fbb, _multiply_ordinary)
+        return length
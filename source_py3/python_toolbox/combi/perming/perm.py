@@ -147,8 +147,29 @@ class Perm(sequence_tools.CuteSequenceMixin, collections.Sequence,
              ensure_iterable_is_immutable_sequence(perm_sequence)
             
         assert self.is_combination == isinstance(self, Comb)
-            
-            
+
+
+    _sibling_attribute_names = ('nominal_perm_space', 'is_rapplied',
+                                'is_recurrent', 'is_partial', 'is_combination',
+                                'is_dapplied', 'is_pure')
+
+    def _get_sibling(self, perm_sequence):
+        '''
+        Get a perm with the same perm space as this one and `perm_sequence`.
+
+        `perm_sequence` must be a tuple. This skips `__init__`, so it's only
+        used for perms of untyped perm spaces, when iterating on them.
+        '''
+        sibling = object.__new__(type(self))
+        for name in self._sibling_attribute_names:
+            setattr(sibling, name, getattr(self, name))
+        if not self.is_rapplied: sibling.unrapplied = sibling
+        if not self.is_dapplied: sibling.undapplied = sibling
+        if not self.is_combination: sibling.uncombinationed = sibling
+        sibling._perm_sequence = perm_sequence
+        return sibling
+
+
     _reduced = property(lambda self: (
         type(self), self._perm_sequence, self.nominal_perm_space
     ))
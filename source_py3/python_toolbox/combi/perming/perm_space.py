@@ -14,16 +14,20 @@ from python_toolbox import math_tools
 from python_toolbox import sequence_tools
 from python_toolbox import cute_iter_tools
 from python_toolbox import nifty_collections
-from python_toolbox import dict_tools
 from python_toolbox import misc_tools
 
 from .. import misc
+from .._sharding_mixin import _ShardingMixin
 from . import variations
 from .calculating_length import * 
 from .variations import UnallowedVariationSelectionException
 from ._variation_removing_mixin import _VariationRemovingMixin
 from ._variation_adding_mixin import _VariationAddingMixin
 from ._fixed_map_managing_mixin import _FixedMapManagingMixin
+from ._iterating_mixin import _IteratingMixin
+from ._unranking_mixin import _UnrankingMixin
+from ._ranking_mixin import _RankingMixin
+from ._recurrent_perm_builder import _RecurrentPermBuilder
 
 infinity = float('inf')
 
@@ -58,8 +62,10 @@ class PermSpaceType(abc.ABCMeta):
         
         
 class PermSpace(_VariationRemovingMixin, _VariationAddingMixin,
-                _FixedMapManagingMixin, sequence_tools.CuteSequenceMixin,
-                collections.Sequence, metaclass=PermSpaceType):
+                _FixedMapManagingMixin, _IteratingMixin, _UnrankingMixin,
+                _RankingMixin, _ShardingMixin,
+                sequence_tools.CuteSequenceMixin, collections.Sequence,
+                metaclass=PermSpaceType):
     '''
     A space of permutations on a sequence.
     
@@ -394,6 +400,56 @@ class PermSpace(_VariationRemovingMixin, _VariationAddingMixin,
 
     __init__.signature = inspect.signature(__init__)
             
+    @caching.CachedProperty
+    def _degreed_lengths(self):
+        '''
+        Table of the lengths of sub-spaces of this degreed space.
+        
+        `self._degreed_lengths[n_unfixed_items][n_cycles]` is the number of
+        perms with one of our degrees when `n_unfixed_items` items aren't fixed
+        and the fixed items have `n_cycles` cycles. This is used for
+        unranking.
+        '''
+        assert self.is_degreed
+        return tuple(
+            tuple(
+                sum(math_tools.abs_stirling(
+                        n_unfixed_items,
+                        self.sequence_length - degree - n_cycles
+                    ) for degree in self.degrees)
+                for n_cycles in range(self.sequence_length + 1)
+            ) for n_unfixed_items in range(self.sequence_length + 1)
+        )
+    
+    @caching.CachedProperty
+    def _binomial_rows(self):
+        '''
+        Table of binomials for ranking and unranking combinations.
+        
+        `self._binomial_rows[k][j]` is `binomial(j, k)`, for `k` up to
+        `n_elements` and `j` up to `sequence_length`. Each row is sorted.
+        '''
+        binomial_rows = [[1] * (self.sequence_length + 1)]
+        for k in range(1, self.n_elements + 1):
+            previous_row = binomial_rows[-1]
+            row = [0] * (self.sequence_length + 1)
+            for j in range(k, self.sequence_length + 1):
+                row[j] = row[j - 1] + previous_row[j - 1]
+            binomial_rows.append(row)
+        return binomial_rows
+    
+    @caching.CachedProperty
+    def _index_by_item(self):
+        '''
+        Dict mapping each item of the sequence to its index in the sequence.
+        
+        In recurrent spaces, it's the index of the first equal item.
+        '''
+        index_by_item = {}
+        for index, item in enumerate(self.sequence):
+            index_by_item.setdefault(item, index)
+        return index_by_item
+    
     @caching.CachedProperty
     def _unsliced_length(self):
         '''
@@ -572,51 +628,51 @@ class PermSpace(_VariationRemovingMixin, _VariationAddingMixin,
             # If that wasn't an example of asserting one's dominance, I don't
             # know what is.
             
-            available_values = list(self.free_values)
-            wip_perm_sequence_dict = dict(self.fixed_map)
+            # We keep the items we've already put in the perm in chains, each
+            # from a head that isn't a value yet to a tail that isn't a key
+            # yet, so we know in O(1) whether a candidate value closes a
+            # cycle: That's when it's the head of the chain that ends in our
+            # key.
+            items = range(self.sequence_length) # Faster than `self.sequence`.
+            tail_by_head = {item: item for item in items}
+            head_by_tail = dict(tail_by_head)
+            
+            def connect(key, value):
+                tail = tail_by_head.pop(value)
+                head = head_by_tail.pop(key)
+                if tail != key:
+                    tail_by_head[head] = tail
+                    head_by_tail[tail] = head
+                    
+            for key, value in self.fixed_map.items():
+                connect(key, value)
+                
+            degreed_lengths = self._degreed_lengths
+            fixed_values = set(self.fixed_map.values())
+            available_values = [item for item in items if
+                                item not in fixed_values]
+            wip_perm_sequence = [None] * self.sequence_length
+            for key, value in self.fixed_map.items():
+                wip_perm_sequence[key] = value
             wip_n_cycles_in_fixed_items = \
                                     self._n_cycles_in_fixed_items_of_just_fixed
+            n_unfixed_items = len(available_values)
             wip_i = i
-            for j in self.sequence:
-                if j in wip_perm_sequence_dict:
+            for j in items:
+                if j in self.fixed_map:
                     continue
-                for unused_value in available_values:
-                    candidate_perm_sequence_dict = dict(wip_perm_sequence_dict)
-                    candidate_perm_sequence_dict[j] = unused_value
-                    
-                    ### Checking whether we closed a cycle: ###################
-                    #                                                         #
-                    if j == unused_value:
-                        closed_cycle = True
-                    else:
-                        current = j
-                        while True:
-                            current = candidate_perm_sequence_dict[current]
-                            if current == j:
-                                closed_cycle = True
-                                break
-                            elif current not in candidate_perm_sequence_dict:
-                                closed_cycle = False
-                                break
-                    #                                                         #
-                    ### Finished checking whether we closed a cycle. ##########
-                    
+                n_unfixed_items -= 1
+                for k, unused_value in enumerate(available_values):
                     candidate_n_cycles_in_fixed_items = \
-                                     wip_n_cycles_in_fixed_items + closed_cycle
-                    
-                    candidate_fixed_perm_space_length = sum(
-                        math_tools.abs_stirling(
-                            self.sequence_length -
-                                             len(candidate_perm_sequence_dict),
-                            self.sequence_length - degree -
-                                              candidate_n_cycles_in_fixed_items
-                        ) for degree in self.degrees
-                    )
-                    
+                                  wip_n_cycles_in_fixed_items + \
+                                  (tail_by_head[unused_value] == j)
+                    candidate_fixed_perm_space_length = degreed_lengths[
+                        n_unfixed_items][candidate_n_cycles_in_fixed_items]
                     
                     if wip_i < candidate_fixed_perm_space_length:
-                        available_values.remove(unused_value)
-                        wip_perm_sequence_dict[j] = unused_value
+                        del available_values[k]
+                        connect(j, unused_value)
+                        wip_perm_sequence[j] = unused_value
                         wip_n_cycles_in_fixed_items = \
                                               candidate_n_cycles_in_fixed_items
                         
@@ -625,55 +681,29 @@ class PermSpace(_VariationRemovingMixin, _VariationAddingMixin,
                 else:
                     raise RuntimeError
             assert wip_i == 0
-            return self.perm_type((wip_perm_sequence_dict[k] for k in
-                                   self.domain), self)
+            return self.perm_type(tuple(wip_perm_sequence), self)
         
         #######################################################################
         elif self.is_recurrent:
             assert not self.is_dapplied and not self.is_degreed and \
                                                              not self.is_sliced
-            available_values = list(self.sequence)
-            reserved_values = nifty_collections.Bag(self.fixed_map.values())
-            wip_perm_sequence_dict = dict(self.fixed_map)
+            builder = _RecurrentPermBuilder(self)
             wip_i = i
-            shit_set = set()
             for j in range(self.n_elements):
-                if j in self.fixed_map:
-                    available_values.remove(self.fixed_map[j])
-                    reserved_values[self.fixed_map[j]] -= 1
+                if builder.is_at_fixed_index:
+                    builder.add(self.fixed_map[j])
                     continue
-                unused_values = [
-                    item for item in
-                    nifty_collections.OrderedBag(available_values) -
-                    reserved_values if item not in shit_set
-                ]
-                for unused_value in unused_values:
-                    wip_perm_sequence_dict[j] = unused_value
-                    
-                    candidate_sub_perm_space = \
-                                             PermSpace._create_with_cut_prefix(
-                        self.sequence,
-                        n_elements=self.n_elements,
-                        fixed_map=wip_perm_sequence_dict,
-                        is_combination=self.is_combination,
-                        shit_set=shit_set, perm_type=self.perm_type
-                    )
-                    
-                    if wip_i < candidate_sub_perm_space.length:
-                        available_values.remove(unused_value)
+                for candidate in builder.get_candidates():
+                    sub_space_length = builder.get_sub_space_length(candidate)
+                    if wip_i < sub_space_length:
+                        builder.add(candidate)
                         break
-                    else:
-                        wip_i -= candidate_sub_perm_space.length
-                        if self.is_combination:
-                            shit_set.add(wip_perm_sequence_dict[j])
-                        del wip_perm_sequence_dict[j]
+                    wip_i -= sub_space_length
+                    builder.skip(candidate)
                 else:
                     raise RuntimeError
             assert wip_i == 0
-            return self.perm_type(
-                dict_tools.get_tuple(wip_perm_sequence_dict, self.domain),
-                self
-            )
+            return self.perm_type(tuple(builder.wip_perm_sequence), self)
         
         #######################################################################
         elif self.is_fixed:
@@ -684,7 +714,7 @@ class PermSpace(_VariationRemovingMixin, _VariationAddingMixin,
                     (self._undapplied_fixed_map[m] if
                      (m in self.fixed_indices) else
                      next(free_values_perm_iterator))
-                                       for m in range(self.sequence_length)
+                                            for m in range(self.n_elements)
                 ),
                 self
             )
@@ -734,8 +764,6 @@ class PermSpace(_VariationRemovingMixin, _VariationAddingMixin,
         '''In partial perm spaces, number of elements that aren't used.'''
     )
     
-    __iter__ = lambda self: (self[i] for i in
-                                         sequence_tools.CuteRange(self.length))
     _reduced = property(
         lambda self: (
             type(self), self.sequence, self.domain, 
@@ -788,135 +816,7 @@ class PermSpace(_VariationRemovingMixin, _VariationAddingMixin,
         
         # At this point we know the permutation contains the correct items, and
         # has the correct degree.
-        if perm.is_dapplied: return self.undapplied.index(perm.undapplied)
-        
-        #######################################################################
-        elif self.is_degreed:
-            if perm.is_rapplied: return self.unrapplied.index(perm.unrapplied)
-            wip_perm_number = 0
-            wip_perm_sequence_dict = dict(self.fixed_map)
-            unused_values = list(self.free_values)
-            for i, value in enumerate(perm._perm_sequence):
-                if i in self.fixed_indices:
-                    continue
-                unused_values.remove(value)
-                lower_values = [j for j in unused_values if j < value]
-                for lower_value in lower_values:
-                    temp_fixed_map = dict(wip_perm_sequence_dict)
-                    temp_fixed_map[i] = lower_value
-                    wip_perm_number += PermSpace(
-                        self.sequence_length, degrees=self.degrees,
-                        fixed_map=temp_fixed_map
-                    ).length
-                    
-                wip_perm_sequence_dict[self.domain[i]] = value
-                
-            perm_number = wip_perm_number
-            
-        #######################################################################
-        elif self.is_recurrent:
-            assert not self.is_degreed and not self.is_dapplied
-
-            wip_perm_number = 0
-            unused_values = list(self.sequence)
-            reserved_values = list(self.fixed_map.values())
-            perm_sequence_list = list(perm._perm_sequence)
-            shit_set = set()
-            for i, value in enumerate(perm._perm_sequence):
-                if i in self.fixed_map:
-                    if self.fixed_map[i] == value:
-                        unused_values.remove(value)
-                        reserved_values.remove(value)
-                        continue
-                    else:
-                        raise ValueError
-                lower_values = [
-                    thing for thing in
-                    nifty_collections.OrderedSet(unused_values) if
-                    (thing not in reserved_values or unused_values.count(thing)
-                     > reserved_values.count(thing)) and 
-                    unused_values.index(thing) < unused_values.index(value) and
-                                                          thing not in shit_set
-                ]
-                unused_values.remove(value)
-                for lower_value in lower_values:
-                    temp_fixed_map = dict(
-                            enumerate(perm_sequence_list[:i] + [lower_value])
-                    )
-                    temp_fixed_map.update(self.fixed_map)
-                    
-                    candidate_sub_perm_space = \
-                                             PermSpace._create_with_cut_prefix(
-                        self.sequence,
-                        n_elements=self.n_elements,
-                        fixed_map=temp_fixed_map,
-                        is_combination=self.is_combination,
-                        shit_set=shit_set, perm_type=self.perm_type
-                    )
-                    
-                    wip_perm_number += candidate_sub_perm_space.length
-                    if self.is_combination:
-                        shit_set.add(lower_value)
-                    
-                
-            perm_number = wip_perm_number
-            
-        #######################################################################
-        elif self.is_fixed:
-            assert not self.is_degreed and not self.is_recurrent
-            free_values_perm_sequence = []
-            for i, perm_item in zip(self.domain, perm._perm_sequence):
-                if i in self.fixed_map:
-                    if self.fixed_map[i] != perm_item:
-                        raise ValueError
-                else:
-                    free_values_perm_sequence.append(perm_item)
-            
-            # At this point we know all the items that should be fixed are
-            # fixed.
-            
-            perm_number = self._free_values_unsliced_perm_space.index(
-                free_values_perm_sequence
-            )
-            
-            
-        #######################################################################
-        elif self.is_combination:
-            if perm.is_rapplied:
-                return self.unrapplied.index(perm.unrapplied)
-            
-            assert not self.is_rapplied and not self.is_recurrent and \
-                   not self.is_dapplied and not self.is_fixed and \
-                                                            not self.is_degreed
-            
-            if not cute_iter_tools.is_sorted(perm._perm_sequence):
-                raise ValueError
-            
-            processed_perm_sequence = tuple(
-                self.sequence_length - 1 -
-                                     item for item in perm._perm_sequence[::-1]
-            )
-            perm_number = self.unsliced.length - 1 - sum(
-                (math_tools.binomial(item, i) for i, item in
-                                  enumerate(processed_perm_sequence, start=1)),
-                0
-            )
-              
-        #######################################################################
-        else:
-            factoradic_number = []
-            unused_values = list(self.sequence)
-            for i, value in enumerate(perm._perm_sequence):
-                index_of_current_number = unused_values.index(value)
-                factoradic_number.append(index_of_current_number)
-                unused_values.remove(value)
-            perm_number = math_tools.from_factoradic(
-                factoradic_number +
-                [0] * self.n_unused_elements
-            ) // math.factorial(self.n_unused_elements)
-            
-            
-        #######################################################################
+        perm_number = self.unsliced._get_perm_number(perm._perm_sequence)
         
         if perm_number not in self.canonical_slice:
             raise ValueError
@@ -2,12 +2,17 @@
 # This program is distributed under the MIT license.
 
 import collections
+import itertools
 
 from python_toolbox import math_tools
 from python_toolbox import sequence_tools
+from python_toolbox import caching
+
+from ._sharding_mixin import _ShardingMixin
 
         
-class ProductSpace(sequence_tools.CuteSequenceMixin, collections.Sequence):
+class ProductSpace(_ShardingMixin, sequence_tools.CuteSequenceMixin,
+                   collections.Sequence):
     '''
     A product space between sequences.
     
@@ -28,24 +33,51 @@ class ProductSpace(sequence_tools.CuteSequenceMixin, collections.Sequence):
         (('a', 0), ('a', 1), ('a', 2), ('a', 3), ('b', 0), ('b', 1), ('b', 2),
          ('b', 3), ('c', 0), ('c', 1), ('c', 2), ('c', 3))
 
+    Like `PermSpace`, a product space can be sliced, (except you can't change
+    the step,) and the slice is a product space too.
+
     '''
-    def __init__(self, sequences):
+    def __init__(self, sequences, slice_=None):
         self.sequences = sequence_tools. \
                                ensure_iterable_is_immutable_sequence(sequences)
         self.sequence_lengths = tuple(map(sequence_tools.get_length,
                                           self.sequences))
-        self.length = math_tools.product(self.sequence_lengths)
+        self._unsliced_length = math_tools.product(self.sequence_lengths)
+        
+        if slice_ is not None and slice_.step not in (1, None):
+            raise NotImplementedError
+        self.canonical_slice = sequence_tools.CanonicalSlice(
+            slice_ or slice(float('inf')),
+            self._unsliced_length
+        )
+        self.length = max(
+            self.canonical_slice.stop - self.canonical_slice.start,
+            0
+        )
+        self.is_sliced = (self.length != self._unsliced_length)
+        if not self.is_sliced:
+            self.unsliced = self
+        
+    unsliced = caching.CachedProperty(
+        lambda self: ProductSpace(self.sequences),
+        '''A version of this product space without the slice.'''
+    )
         
     def __repr__(self):
-        return '<%s: %s>' % (
+        return '<%s: %s>%s' % (
             type(self).__name__,
             ' * '.join(str(sequence_tools.get_length(sequence))
                        for sequence in self.sequences),
+            ('[%s:%s]' % (self.canonical_slice.start,
+                          self.canonical_slice.stop)) if self.is_sliced else ''
         )
         
     def __getitem__(self, i):
-        if isinstance(i, slice):
-            raise NotImplementedError
+        if isinstance(i, (slice, sequence_tools.CanonicalSlice)):
+            canonical_slice = sequence_tools.CanonicalSlice(
+                i, self.length, offset=self.canonical_slice.start
+            )
+            return ProductSpace(self.sequences, slice_=canonical_slice)
         
         if i < 0:
             i += self.length
@@ -53,17 +85,58 @@ class ProductSpace(sequence_tools.CuteSequenceMixin, collections.Sequence):
         if not (0 <= i < self.length):
             raise IndexError
         
+        return tuple(sequence[index] for sequence, index in
+                     zip(self.sequences,
+                         self._get_indices(i + self.canonical_slice.start)))
+    
+    def _get_indices(self, i):
+        '''Get the index in each sequence of item `i`, ignoring the slice.'''
         wip_i = i
         reverse_indices = []
         for sequence_length in reversed(self.sequence_lengths):
             wip_i, current_index = divmod(wip_i, sequence_length)
             reverse_indices.append(current_index)
         assert wip_i == 0
-        return tuple(sequence[index] for sequence, index in
-                     zip(self.sequences, reversed(reverse_indices)))
+        return reverse_indices[::-1]
     
+    def __iter__(self):
+        '''
+        Iterate on the items of this product space.
         
-    _reduced = property(lambda self: (type(self), self.sequences))
+        Instead of calculating each item from its index number, this advances
+        the indices like an odometer, so each step is amortized O(1).
+        '''
+        if not self.length:
+            return
+        elif not self.sequences:
+            yield ()
+            return
+        start = self.canonical_slice.start
+        n_items_left = self.length
+        indices = self._get_indices(start)
+        *prefix_sequences, last_sequence = self.sequences
+        prefix = [sequence[index] for sequence, index in
+                  zip(prefix_sequences, indices)]
+        last_items = map(last_sequence.__getitem__,
+                         range(indices[-1], self.sequence_lengths[-1]))
+        while True:
+            prefix_tuple = tuple(prefix)
+            for last_item in itertools.islice(last_items, n_items_left):
+                yield prefix_tuple + (last_item,)
+                n_items_left -= 1
+            if not n_items_left:
+                return
+            for j in reversed(range(len(prefix))):
+                indices[j] += 1
+                if indices[j] < self.sequence_lengths[j]:
+                    prefix[j] = prefix_sequences[j][indices[j]]
+                    break
+                indices[j] = 0
+                prefix[j] = prefix_sequences[j][0]
+            last_items = iter(last_sequence)
+        
+    _reduced = property(lambda self: (type(self), self.sequences,
+                                      self.canonical_slice))
     __hash__ = lambda self: hash(self._reduced)
     __eq__ = lambda self, other: (isinstance(other, ProductSpace) and
                                   self._reduced == other._reduced)
@@ -83,7 +156,10 @@ class ProductSpace(sequence_tools.CuteSequenceMixin, collections.Sequence):
             # (Propagating `ValueError`.)
             current_radix *= sequence_tools.get_length(sequence)
             
-        return wip_index
+        if wip_index not in self.canonical_slice:
+            raise ValueError
+            
+        return wip_index - self.canonical_slice.start
     
     
     __bool__ = lambda self: bool(self.length)
@@ -25,6 +25,9 @@ class WeakKeyDefaultDict(collections.MutableMapping):
     
     If a "default factory" is supplied, when a key is attempted that doesn't
     exist the default factory will be called to create its new value.
+    
+    Dead keys are only recorded in their weakref callbacks, and are removed
+    together by `purge`, which is called on the next change to the dict.
     '''
     
     def __init__(self, *args, **kwargs):
@@ -41,15 +44,27 @@ class WeakKeyDefaultDict(collections.MutableMapping):
             args = args[1:]
         
         self.data = {}
+        self._pending_removals = []
         def remove(k, selfref=ref(self)):
             self = selfref()
             if self is not None:
-                del self.data[k]
+                self._pending_removals.append(k)
         self._remove = remove
         if args:
             self.update(args[0])
 
             
+    def purge(self):
+        '''Remove the entries whose keys died.'''
+        pending_removals = self._pending_removals
+        data = self.data
+        while pending_removals:
+            try:
+                del data[pending_removals.pop()]
+            except KeyError:
+                pass
+
+            
     def __missing__(self, key):
         '''Get a value for a key which isn't currently registered.'''
         if self.default_factory is not None:
@@ -97,6 +112,8 @@ class WeakKeyDefaultDict(collections.MutableMapping):
 
     
     def __delitem__(self, key):
+        if self._pending_removals:
+            self.purge()
         del self.data[ref(key)]
 
         
@@ -112,6 +129,8 @@ class WeakKeyDefaultDict(collections.MutableMapping):
 
             
     def __setitem__(self, key, value):
+        if self._pending_removals:
+            self.purge()
         self.data[ref(key, self._remove)] = value
 
         
@@ -204,6 +223,8 @@ class WeakKeyDefaultDict(collections.MutableMapping):
     def popitem(self):
         """ D.popitem() -> (k, v), remove and return some (key, value) pair 
         as a 2-tuple; but raise KeyError if D is empty """
+        if self._pending_removals:
+            self.purge()
         while 1:
             key, value = self.data.popitem()
             o = key()
@@ -215,11 +236,15 @@ class WeakKeyDefaultDict(collections.MutableMapping):
         """ D.pop(k[,d]) -> v, remove specified key and return the 
         corresponding value. If key is not found, d is returned if given,
         otherwise KeyError is raised """
+        if self._pending_removals:
+            self.purge()
         return self.data.pop(ref(key), *args)
 
     
     def setdefault(self, key, default=None):
         """D.setdefault(k[,d]) -> D.get(k,d), also set D[k]=d if k not in D"""
+        if self._pending_removals:
+            self.purge()
         return self.data.setdefault(ref(key, self._remove),default)
 
     
@@ -227,7 +252,8 @@ class WeakKeyDefaultDict(collections.MutableMapping):
         """D.update(E, **F) -> None. Update D from E and F: for k in E: D[k] =
         E[k] (if E has keys else: for (k, v) in E: D[k] = v) then: for k in F:
         D[k] = F[k] """
-        
+        if self._pending_removals:
+            self.purge()
         d = self.data
         if dict is not None:
             if not hasattr(dict, "items"):
@@ -239,5 +265,11 @@ class WeakKeyDefaultDict(collections.MutableMapping):
             
             
     def __len__(self):
-        return len(self.data)
+        return len(self.data) - len(self._pending_removals)
+    
+    
+    def clear(self):
+        """ D.clear() -> None.  Remove all items from D. """
+        self._pending_removals.clear()
+        self.data.clear()
               
\ No newline at end of file
@@ -39,19 +39,36 @@ class WeakKeyIdentityDict(collections.MutableMapping):
     identities and not their contents, so even unhashable objects like lists
     can be used as keys. The value will be tied to the object's identity and
     not its contents.
+    
+    Dead keys are only recorded in their weakref callbacks, and are removed
+    together by `purge`, which is called on the next change to the dict.
     """
 
     def __init__(self, dict_=None):
         self.data = {}
+        self._pending_removals = []
         def remove(k, selfref=weakref.ref(self)):
             self = selfref()
             if self is not None:
-                del self.data[k]
+                self._pending_removals.append(k)
         self._remove = remove
         if dict_ is not None: self.update(dict_)
 
-        
+            
+    def purge(self):
+        '''Remove the entries whose keys died.'''
+        pending_removals = self._pending_removals
+        data = self.data
+        while pending_removals:
+            try:
+                del data[pending_removals.pop()]
+            except KeyError:
+                pass
+
+            
     def __delitem__(self, key):
+        if self._pending_removals:
+            self.purge()
         del self.data[IdentityRef(key)]
 
         
@@ -64,6 +81,8 @@ class WeakKeyIdentityDict(collections.MutableMapping):
 
     
     def __setitem__(self, key, value):
+        if self._pending_removals:
+            self.purge()
         self.data[IdentityRef(key, self._remove)] = value
 
         
@@ -166,6 +185,8 @@ class WeakKeyIdentityDict(collections.MutableMapping):
     def popitem(self):
         """ D.popitem() -> (k, v), remove and return some (key, value) pair 
         as a 2-tuple; but raise KeyError if D is empty """
+        if self._pending_removals:
+            self.purge()
         while True:
             key, value = self.data.popitem()
             o = key()
@@ -177,11 +198,15 @@ class WeakKeyIdentityDict(collections.MutableMapping):
         """ D.pop(k[,d]) -> v, remove specified key and return the
         corresponding value. If key is not found, d is returned if given,
         otherwise KeyError is raised """
+        if self._pending_removals:
+            self.purge()
         return self.data.pop(IdentityRef(key), *args)
 
     
     def setdefault(self, key, default=None):
         """D.setdefault(k[,d]) -> D.get(k,d), also set D[k]=d if k not in D"""
+        if self._pending_removals:
+            self.purge()
         return self.data.setdefault(IdentityRef(key, self._remove),default)
 
     
@@ -189,7 +214,8 @@ class WeakKeyIdentityDict(collections.MutableMapping):
         """ D.update(E, **F) -> None. Update D from E and F: for k in E: D[k] =
         E[k] (if E has keys else: for (k, v) in E: D[k] = v) then: for k in F:
         D[k] = F[k] """
-        
+        if self._pending_removals:
+            self.purge()
         d = self.data
         if dict is not None:
             if not hasattr(dict, "items"):
@@ -201,5 +227,11 @@ class WeakKeyIdentityDict(collections.MutableMapping):
 
 
     def __len__(self):
-        return len(self.data)
+        return len(self.data) - len(self._pending_removals)
+    
+    
+    def clear(self):
+        """ D.clear() -> None.  Remove all items from D. """
+        self._pending_removals.clear()
+        self.data.clear()
     
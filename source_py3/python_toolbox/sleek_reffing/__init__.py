@@ -10,8 +10,9 @@ See documentation of `SleekRef` for more details. `SleekCallArgs` and
 
 from .sleek_ref import SleekRef
 from .exceptions import SleekRefDied
-from .sleek_call_args import SleekCallArgs
+from .sleek_call_args import SleekCallArgs, ContentSleekCallArgs
 from .cute_sleek_value_dict import CuteSleekValueDict
 
 
-__all__ = ['SleekRef', 'SleekRefDied', 'SleekCallArgs', 'CuteSleekValueDict']
+__all__ = ['SleekRef', 'SleekRefDied', 'SleekCallArgs',
+           'ContentSleekCallArgs', 'CuteSleekValueDict']
@@ -30,17 +30,40 @@ class CuteSleekValueDict(collections.UserDict):
     
     See documentation of `python_toolbox.sleek_reffing.SleekRef` for more
     details about sleekreffing.
+    
+    Like in `weakref.WeakValueDictionary`, a dead value isn't removed from the
+    dict right away, but only recorded in `_pending_removals`. All pending
+    removals are done together by `purge`, which is called on the next change
+    to the dict. This way, when many values die at once, the dict isn't
+    changed in each of their weakref callbacks, and iterating on the dict is
+    safe even if the garbage collector runs meanwhile. Dead values are skipped
+    when iterating.
     """
     
     def __init__(self, callback, *args, **kwargs):
         self.callback = callback
-        def remove(sleek_ref, weak_ref_to_csvd=weakref.ref(self)):
+        self._pending_removals = []
+        def remove(weak_ref, weak_ref_to_csvd=weakref.ref(self)):
             csvd = weak_ref_to_csvd()
             if csvd is not None:
-                del csvd.data[sleek_ref.key]
-                csvd.callback()
+                sleek_ref = csvd.data.get(weak_ref.key)
+                # The key may have been given a new value since:
+                if sleek_ref is not None and sleek_ref.ref is weak_ref:
+                    csvd._pending_removals.append(weak_ref)
+                    csvd.callback()
         self._remove = remove
         collections.UserDict.__init__(self, *args, **kwargs)
+        
+        
+    def purge(self):
+        '''Remove the entries whose values died.'''
+        pending_removals = self._pending_removals
+        data = self.data
+        while pending_removals:
+            weak_ref = pending_removals.pop()
+            sleek_ref = data.get(weak_ref.key)
+            if sleek_ref is not None and sleek_ref.ref is weak_ref:
+                del data[weak_ref.key]
 
         
     def __getitem__(self, key):
@@ -87,9 +110,27 @@ class CuteSleekValueDict(collections.UserDict):
 
     
     def __setitem__(self, key, value):
+        if self._pending_removals:
+            self.purge()
         self.data[key] = KeyedSleekRef(value, self._remove, key)
 
         
+    def __delitem__(self, key):
+        if self._pending_removals:
+            self.purge()
+        del self.data[key]
+
+        
+    def __len__(self):
+        return len(self.data) - len(self._pending_removals)
+
+    
+    def clear(self):
+        """ D.clear() -> None.  Remove all items from D. """
+        self._pending_removals.clear()
+        self.data.clear()
+
+        
     def copy(self):
         '''Shallow copy the `CuteSleekValueDict`.'''
         new_csvd = type(self)(self.callback)
@@ -134,11 +175,16 @@ class CuteSleekValueDict(collections.UserDict):
                 
     def iterkeys(self):
         """ D.iterkeys() -> an iterator over the keys of D """
-        return iter(self.data.keys())
+        for key, sleek_ref in self.data.items():
+            try:
+                sleek_ref()
+            except SleekRefDied:
+                pass
+            else:
+                yield key
 
     
-    def __iter__(self):
-        return iter(self.data.keys())
+    __iter__ = iterkeys
 
     
     def itervaluerefs(self):
@@ -166,6 +212,8 @@ class CuteSleekValueDict(collections.UserDict):
     def popitem(self):
         """ D.popitem() -> (k, v), remove and return some (key, value) pair 
         as a 2-tuple; but raise KeyError if D is empty """
+        if self._pending_removals:
+            self.purge()
         while True:
             key, sleek_ref = self.data.popitem()
             try:
@@ -178,6 +226,8 @@ class CuteSleekValueDict(collections.UserDict):
         """ D.pop(k[,d]) -> v, remove specified key and return the 
         corresponding value. If key is not found, d is returned if given,
         otherwise KeyError is raised """
+        if self._pending_removals:
+            self.purge()
         try:
             return self.data.pop(key)()
         except (KeyError, SleekRefDied):
@@ -7,14 +7,72 @@ Defines the `SleekCallArgs` class.
 See its documentation for more details.
 '''
 
+import weakref
+import operator
+
 from python_toolbox import cute_inspect
 from python_toolbox import cheat_hashing
 
-from .sleek_ref import SleekRef
-from .cute_sleek_value_dict import CuteSleekValueDict
+from .exceptions import SleekRefDied
+
+
+__all__ = ['SleekCallArgs', 'ContentSleekCallArgs']
+
 
+strong_types = frozenset((int, float, complex, bool, str, bytes, tuple,
+                          frozenset, type(None)))
+'''
+Types whose instances are kept by strong references without trying weakrefs.
+
+Instances of these types can't be weakreffed anyway, so we save the failed
+attempt.
+'''
 
-__all__ = ['SleekCallArgs']
+
+class _ArgumentRef(weakref.ref):
+    '''A weakref to an argument, knowing which `SleekCallArgs` it belongs to.'''
+    __slots__ = ('sleek_call_args_ref',)
+
+
+def _destroy_sleek_call_args(argument_ref):
+    '''Callback for when an argument dies; destroys its `SleekCallArgs`.'''
+    sleek_call_args = argument_ref.sleek_call_args_ref()
+    if sleek_call_args is not None:
+        sleek_call_args.destroy()
+
+
+class _BufferSnapshot:
+    '''
+    An immutable copy of a buffer argument, kept by `ContentSleekCallArgs`.
+    
+    Snapshots are equal when their buffers had the same type, item format,
+    shape and bytes.
+    '''
+    __slots__ = ('_contents',)
+    
+    def __init__(self, buffer_type, memory_view):
+        self._contents = (buffer_type, memory_view.format, memory_view.shape,
+                          memory_view.tobytes())
+        
+    def __hash__(self):
+        return hash(self._contents)
+    
+    def __eq__(self, other):
+        if not isinstance(other, _BufferSnapshot):
+            return NotImplemented
+        return self._contents == other._contents
+    
+    
+def _get_buffer_snapshot(value):
+    '''Get a `_BufferSnapshot` of `value`, or `None` if it isn't a buffer.'''
+    if isinstance(value, (bytes, str)):
+        return None
+    try:
+        memory_view = memoryview(value)
+    except TypeError:
+        return None
+    with memory_view:
+        return _BufferSnapshot(type(value), memory_view)
 
     
 class SleekCallArgs:
@@ -31,11 +89,34 @@ class SleekCallArgs:
     
     All the argument values are sleekreffed to avoid memory leaks. (See
     documentation of `python_toolbox.sleek_reffing.SleekRef` for more details.)
+
+    Since caches may hold millions of these, they're kept compact: the names
+    of the arguments are kept in one tuple, and the values in another, each
+    being either a weakref or, for non-weakreffable values, the value itself.
+    Comparing two `SleekCallArgs` compares these directly.
     '''
     # What if we one of the args gets gc'ed before this SCA gets added to the
     # dictionary? It will render this SCA invalid, but we'll still be in the
     # dict. So make note to user: Always keep reference to args and kwargs
     # until the SCA gets added to the dict.
+    
+    __slots__ = ('containing_dict', '_layout', '_refs', '_hash',
+                 '__weakref__')
+    
+    _cheat_hash = staticmethod(cheat_hashing.cheat_hash)
+    '''Function for hashing the arguments when they're unhashable.'''
+    
+    _are_equal = staticmethod(operator.eq)
+    '''Function for comparing two argument values.'''
+    
+    _get_snapshot = None
+    '''
+    Function for getting an argument value to keep instead of a weakref.
+    
+    It's `None`, or a function that returns `None` for values that should be
+    weakreffed as usual.
+    '''
+    
     def __init__(self, containing_dict, function, *args, **kwargs):
         '''
         Construct the `SleekCallArgs`.
@@ -57,49 +138,92 @@ class SleekCallArgs:
         call_args = cute_inspect.getcallargs(function, *args, **kwargs)
         del args, kwargs
         
-        self.star_args_refs = []
-        '''Sleekrefs to star-args.'''
-        
-        if star_args_name:
-            star_args = call_args.pop(star_args_name, None)
-            if star_args:
-                self.star_args_refs = [SleekRef(star_arg, self.destroy) for
-                                       star_arg in star_args]
-        
-        self.star_kwargs_refs = {}
-        '''Sleerefs to star-kwargs.'''
-        if star_kwargs_name:            
-            star_kwargs = call_args.pop(star_kwargs_name, {})
-            if star_kwargs:
-                self.star_kwargs_refs = CuteSleekValueDict(self.destroy,
-                                                           star_kwargs)
-        
-        self.args_refs = CuteSleekValueDict(self.destroy, call_args)
-        '''Mapping from argument name to value, sleek-style.'''
-        
-        # In the future the `.args`, `.star_args` and `.star_kwargs` attributes
-        # may change, so we must record the hash now:
-        self._hash = cheat_hashing.cheat_hash(
-            (
-                self.args,
-                self.star_args,
-                self.star_kwargs
-            )
-        )
+        star_args = call_args.pop(star_args_name, ()) if star_args_name \
+                                                                     else ()
+        star_kwargs = call_args.pop(star_kwargs_name, {}) if \
+                                                   star_kwargs_name else {}
+        names = tuple(sorted(call_args))
+        star_kwargs_names = tuple(sorted(star_kwargs))
         
+        self._layout = (names, len(star_args), star_kwargs_names)
+        '''
+        The names of the arguments, the number of star-args, and the names of
+        the star-kwargs, which say how to read `_refs`.
+        '''
+        
+        values = tuple(call_args[name] for name in names) + \
+                 tuple(star_args) + \
+                 tuple(star_kwargs[name] for name in star_kwargs_names)
+        
+        get_snapshot = self._get_snapshot
+        self_ref = None
+        refs = []
+        for value in values:
+            if type(value) not in strong_types:
+                snapshot = get_snapshot and get_snapshot(value)
+                if snapshot is not None:
+                    refs.append(snapshot)
+                    continue
+                try:
+                    ref = _ArgumentRef(value, _destroy_sleek_call_args)
+                except TypeError:
+                    pass
+                else:
+                    if self_ref is None:
+                        self_ref = weakref.ref(self)
+                    ref.sleek_call_args_ref = self_ref
+                    value = ref
+            refs.append(value)
+        self._refs = tuple(refs)
+        '''
+        The argument values, with weakreffable ones replaced by weakrefs.
+        
+        The weakrefs only hold us weakly, so we don't make reference cycles
+        that would keep us alive until the garbage collector runs.
+        '''
+        
+        # The values may change in the future, (if they're mutable,) so we
+        # must record the hash now:
+        try:
+            self._hash = hash((self._layout, values))
+        except TypeError:
+            self._hash = self._cheat_hash((self._layout, values))
+        
+        
+    def _get_values(self):
+        '''Get the argument values, raising `SleekRefDied` if one died.'''
+        values = []
+        for ref in self._refs:
+            if type(ref) is _ArgumentRef:
+                value = ref()
+                if value is None:
+                    raise SleekRefDied
+                values.append(value)
+            else:
+                values.append(ref)
+        return values
         
     
-    args = property(lambda self: dict(self.args_refs))
-    '''The arguments.'''
+    @property
+    def args(self):
+        '''The arguments.'''
+        names, _, _ = self._layout
+        return dict(zip(names, self._get_values()))
     
-    star_args = property(
-        lambda self:
-            tuple((star_arg_ref() for star_arg_ref in self.star_args_refs))
-    )
-    '''Extraneous arguments. (i.e. `*args`.)'''
+    @property
+    def star_args(self):
+        '''Extraneous arguments. (i.e. `*args`.)'''
+        names, n_star_args, _ = self._layout
+        return tuple(
+            self._get_values()[len(names):len(names) + n_star_args]
+        )
     
-    star_kwargs = property(lambda self: dict(self.star_kwargs_refs))
-    '''Extraneous keyword arguments. (i.e. `*kwargs`.)'''
+    @property
+    def star_kwargs(self):
+        '''Extraneous keyword arguments. (i.e. `*kwargs`.)'''
+        names, n_star_args, star_kwargs_names = self._layout
+        return dict(zip(star_kwargs_names,
+                        self._get_values()[len(names) + n_star_args:]))
     
         
     def destroy(self, _=None):
@@ -118,13 +242,48 @@ class SleekCallArgs:
     def __eq__(self, other):
         if not isinstance(other, SleekCallArgs):
             return NotImplemented
-        return self.args == other.args and \
-               self.star_args == other.star_args and \
-               self.star_kwargs == other.star_kwargs
+        if self is other:
+            return True
+        if self._hash != other._hash or self._layout != other._layout:
+            return False
+        for ref, other_ref in zip(self._refs, other._refs):
+            if ref is other_ref:
+                continue
+            if type(ref) is _ArgumentRef:
+                ref = ref()
+                if ref is None:
+                    return False
+            if type(other_ref) is _ArgumentRef:
+                other_ref = other_ref()
+                if other_ref is None:
+                    return False
+            if ref is not other_ref and not self._are_equal(ref, other_ref):
+                return False
+        return True
 
     
     def __ne__(self, other):
         return not self == other
+
+
+class ContentSleekCallArgs(SleekCallArgs):
+    '''
+    A `SleekCallArgs` that hashes and compares buffer arguments by contents.
+    
+    Arguments like NumPy arrays or `bytearray`s, and lists and dicts holding
+    them, are hashed with `cheat_hashing.content_hash` and compared with
+    `cheat_hashing.contents_equal`, so equal arrays make equal call args.
+    
+    Buffer arguments aren't weakreffed, since then equal arrays passed as
+    temporaries would never share a cache entry. Instead we keep an immutable
+    copy of their bytes, which also protects the key from changes to the
+    arrays. `args`, `star_args` and `star_kwargs` give these copies rather
+    than the original arrays.
+    '''
+    __slots__ = ()
+    
+    _get_snapshot = staticmethod(_get_buffer_snapshot)
     
+    _cheat_hash = staticmethod(cheat_hashing.content_hash)
     
-    
\ No newline at end of file
+    _are_equal = staticmethod(cheat_hashing.contents_equal)
@@ -4,8 +4,11 @@
 '''Testing module for `python_toolbox.caching.cache`.'''
 
 
+import array
 import datetime as datetime_module
 import re
+import threading
+import time
 import weakref
 
 import nose.tools
@@ -127,6 +130,40 @@ def test_unhashable_arguments():
     assert f(meow=y) == f(1, meow=y)
     
     
+def test_hash_contents():
+    '''Test `cache` with `hash_contents=True` on buffer arguments.'''
+    
+    f = cache(hash_contents=True)(counting_func)
+    
+    x = array.array('d', [1, 2, 3])
+    y = array.array('d', [1, 2, 3])
+    z = array.array('d', [1, 2, 4])
+    
+    assert f(x) == f(y) != f(z)
+    assert f([x], meow={1: x}) == f([y], meow={1: y}) != f([z], meow={1: x})
+    
+    # Changing an array after the call doesn't change the cached key:
+    x[2] = 4
+    assert f(x) == f(z)
+    assert f(x) != f(y)
+    
+    
+def test_hash_contents_temporaries():
+    '''Test `hash_contents=True` shares results between temporary arrays.'''
+    
+    g = cache(hash_contents=True, collect_stats=True)(counting_func)
+    
+    result = g(array.array('d', [1, 2, 3]))
+    gc_tools.collect()
+    assert g(array.array('d', [1, 2, 3])) == result
+    gc_tools.collect()
+    assert g(b=array.array('d', [1, 2, 3])) != result
+    assert g.cache_info().size == 2
+    assert g.cache_info().misses == 2
+    assert g(array.array('d', [1, 2, 3, 4])) != result
+    assert g(array.array('i', [1, 2, 3])) != result
+    
+    
 def test_helpful_message_when_forgetting_parentheses():
     '''Test user gets a helpful exception when when forgetting parentheses.'''
 
@@ -232,4 +269,500 @@ def test_time_to_keep():
         fixed_time += datetime_module.timedelta(days=1000)
         assert list(map(f, 'abcdef')) == [13, 14, 15, 16, 17, 18]
         assert f(a='d', b='meow') == 19
-        
\ No newline at end of file
+        
+        
+def test_simple_signature():
+    '''Test `cache` on functions with simple signatures.'''
+    
+    @cache()
+    def f():
+        return counting_func()
+    
+    assert f() == f() == f()
+    
+    @cache()
+    def g(a, b=2):
+        return counting_func()
+    
+    assert g(1) == g(1, 2) == g(a=1, b=2) == g(b=2, a=1)
+    assert g(1) != g(1, 'meow') == g(1, b='meow')
+    assert g(1) != g(1.5) != g(None) == g(None, 2)
+    
+    # Unhashable and weakreffable arguments still go through `SleekCallArgs`:
+    assert g([1, 2]) == g([1, 2]) != g([1, 2], 3)
+    
+    class A: pass
+    
+    a = A()
+    result = g(a)
+    assert result == g(a) == g(a, 2) != g(1)
+    a_ref = weakref.ref(a)
+    del a
+    gc_tools.collect()
+    assert a_ref() is None
+    
+    
+def test_max_size_and_time_to_keep():
+    '''Test `cache` with both `max_size` and `time_to_keep`.'''
+    counting_func.i = 0
+    f = cache(max_size=3, time_to_keep={'days': 10})(counting_func)
+    
+    fixed_time = datetime_module.datetime.now()
+    def _mock_now():
+        return fixed_time
+    
+    with temp_value_setting.TempValueSetter(
+                                  (caching.decorators, '_get_now'), _mock_now):
+        assert list(map(f, 'abc')) == [0, 1, 2]
+        assert list(map(f, 'abc')) == [0, 1, 2]
+        assert f('d') == 3 # Throwing away `f('a')`
+        assert list(map(f, 'bcd')) == [1, 2, 3]
+        assert f('a') == 4 # Throwing away `f('b')`
+        fixed_time += datetime_module.timedelta(days=5)
+        assert list(map(f, 'cda')) == [2, 3, 4]
+        assert f('b') == 5 # Throwing away `f('c')`
+        fixed_time += datetime_module.timedelta(days=6)
+        # `f('d')` and `f('a')` expired, only `f('b')` is still alive:
+        assert f('b') == 5
+        assert list(map(f, 'cda')) == [6, 7, 8]
+        assert f('b') == 9 # It was thrown away by `f('a')`.
+        fixed_time += datetime_module.timedelta(days=100)
+        assert list(map(f, 'abcd')) == [10, 11, 12, 13]
+
+        
+        
+def test_thread_safe():
+    '''Test that `thread_safe=True` computes each result only once.'''
+    for cache_kwargs in ({}, {'max_size': 10}, {'time_to_keep': {'days': 1}}):
+        calls = []
+        barrier = threading.Barrier(8)
+        
+        @cache(thread_safe=True, **cache_kwargs)
+        def f(x):
+            calls.append(x)
+            if x == 'boom':
+                raise ZeroDivisionError(x)
+            return [x]
+        
+        results = []
+        exceptions = []
+        def run(x):
+            barrier.wait()
+            try:
+                results.append(f(x))
+            except ZeroDivisionError as exception:
+                exceptions.append(exception)
+        
+        for x in ('meow', 'boom'):
+            threads = [threading.Thread(target=run, args=(x,))
+                       for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            
+        assert calls.count('meow') == 1
+        assert len(results) == 8
+        assert all(result is results[0] for result in results)
+        
+        # The exception was propagated to all threads, and wasn't cached:
+        assert len(exceptions) == 8
+        assert 1 <= calls.count('boom') <= 8
+        with cute_testing.RaiseAssertor(ZeroDivisionError):
+            f('boom')
+        
+        
+def test_thread_safe_different_keys():
+    '''Test that `thread_safe=True` doesn't serialize unrelated keys.'''
+    b_started = threading.Event()
+    
+    @cache(thread_safe=True, max_size=10)
+    def f(x):
+        if x == 'a':
+            # This would time out if computing `f('b')` waited for us.
+            assert b_started.wait(timeout=10)
+        else:
+            b_started.set()
+        return x * 2
+    
+    results = {}
+    thread = threading.Thread(target=lambda: results.update(a=f('a')))
+    thread.start()
+    assert f('b') == 'bb'
+    thread.join()
+    assert results == {'a': 'aa'}
+    assert f('a') == 'aa'
+    
+    
+def test_thread_safe_size_estimation():
+    '''Test that estimating a result's size doesn't block other threads.'''
+    other_thread_done = threading.Event()
+    
+    def get_size(value):
+        if value == 'aa':
+            # This would time out if `f('b')` waited for the lock.
+            assert other_thread_done.wait(timeout=10)
+        return len(value)
+    
+    @cache(thread_safe=True, max_bytes=100, size_estimator=get_size)
+    def f(x):
+        return x * 2
+    
+    assert f('b') == 'bb'
+    results = {}
+    thread = threading.Thread(target=lambda: results.update(a=f('a')))
+    thread.start()
+    assert f('b') == 'bb'
+    assert f('c') == 'cc'
+    other_thread_done.set()
+    thread.join()
+    assert results == {'a': 'aa'}
+    assert f('a') == 'aa'
+    
+    
+def test_thread_safe_recursion():
+    '''Test a `thread_safe` function that calls itself with the same args.'''
+    
+    calls = []
+    
+    @cache(thread_safe=True)
+    def f(x):
+        calls.append(x)
+        if len(calls) == 1:
+            return f(x) + 1
+        return x
+    
+    # Would deadlock if the inner `f(3)` waited for the outer one:
+    assert f(3) == f(3) == 4
+    assert calls == [3, 3]
+
+    
+    
+def test_cache_info():
+    '''Test the `cache_info` method of cached functions.'''
+    f = cache()(counting_func)
+    f(1), f(1), f(2)
+    assert f.cache_info() == caching.CacheInfo(
+        hits=None, misses=None, evictions=0, expirations=0, size=2,
+        compute_time=None
+    )
+    
+    for thread_safe in (False, True):
+        g = cache(max_size=2, collect_stats=True,
+                  thread_safe=thread_safe)(counting_func)
+        g(1), g(1), g(2), g(3), g(3), g(3), g(1)
+        cache_info = g.cache_info()
+        assert (cache_info.hits, cache_info.misses, cache_info.evictions,
+                cache_info.size) == (3, 4, 2, 2)
+        assert cache_info.compute_time >= 0
+        
+        # Statistics are cumulative:
+        g.cache_clear()
+        assert g.cache_info()[:4] == (3, 4, 2, 0)
+        
+    
+def test_cache_info_expirations():
+    '''Test that `cache_info` counts expired entries.'''
+    f = cache(time_to_keep={'days': 1}, collect_stats=True)(counting_func)
+    fixed_time = datetime_module.datetime.now()
+    with temp_value_setting.TempValueSetter(
+                    (caching.decorators, '_get_now'), lambda: fixed_time):
+        f(1), f(2)
+        fixed_time += datetime_module.timedelta(days=2)
+        f(2)
+        assert f.cache_info()[:5] == (0, 3, 0, 2, 1)
+        
+        
+def test_stats_reporter():
+    '''Test the `stats_reporter` argument of `cache`.'''
+    reports = []
+    f = cache(stats_reporter=reports.append,
+              stats_report_interval=0)(counting_func)
+    f(1), f(1)
+    assert len(reports) == 2
+    assert reports[0].misses == 1 and reports[0].hits == 0
+    assert reports[1].misses == 1 and reports[1].hits == 1
+    
+    g = cache(stats_reporter=reports.append,
+              stats_report_interval=1000)(counting_func)
+    g(1), g(1)
+    assert len(reports) == 2
+    
+    
+def test_max_bytes():
+    '''Test the `max_bytes` and `cost_aware` arguments of `cache`.'''
+    for cost_aware in (False, True):
+        for thread_safe in (False, True):
+            calls = []
+            
+            @cache(max_bytes=10, size_estimator=len, cost_aware=cost_aware,
+                   thread_safe=thread_safe, collect_stats=True)
+            def f(n):
+                calls.append(n)
+                return 'x' * n
+            
+            f(4), f(4), f(4), f(5)
+            assert calls == [4, 5]
+            f(6)
+            assert calls == [4, 5, 6]
+            cache_info = f.cache_info()
+            # With LRU, both old results are thrown away; with cost-awareness,
+            # it depends on how long each one took to compute.
+            if not cost_aware:
+                assert cache_info.size == 1
+            assert cache_info.size + cache_info.evictions == 3
+            f(11)
+            f(11)
+            assert calls == [4, 5, 6, 11, 11]
+            assert f.cache_info()[:2] == (2, 5)
+            
+    with cute_testing.RaiseAssertor(TypeError):
+        cache(max_bytes=10, size_estimator='bogus')
+        
+
+def test_size_estimators():
+    '''Test that the deep size estimator counts objects referred to.'''
+    from python_toolbox.caching import size_estimation
+    
+    class A:
+        def __init__(self, value):
+            self.value = value
+            
+    big_string = 'x' * 10000
+    assert size_estimation.get_shallow_size([big_string]) < 10000
+    assert size_estimation.get_deep_size([big_string]) > 10000
+    assert size_estimation.get_deep_size([big_string, big_string]) < 11000
+    assert size_estimation.get_deep_size(A({1: big_string})) > 10000
+    
+    recursive_list = []
+    recursive_list.append(recursive_list)
+    assert size_estimation.get_deep_size(recursive_list) == \
+                              size_estimation.get_shallow_size(recursive_list)
+        
+        
+def test_cache_map():
+    '''Test the `cache_map` method of cached functions.'''
+    calls = []
+    
+    @cache(collect_stats=True)
+    def f(a, b=2):
+        calls.append((a, b))
+        return a * b
+    
+    assert f(1) == 2
+    assert f.cache_map([1, 2, 3, 2]) == [2, 4, 6, 4]
+    assert calls == [(1, 2), (2, 2), (3, 2)]
+    assert f.cache_map([1, 2], [5, 2]) == [5, 4]
+    assert calls == [(1, 2), (2, 2), (3, 2), (1, 5)]
+    assert f(3, 2) == f(b=2, a=3) == 6
+    assert len(calls) == 4
+    assert f.cache_map([]) == []
+    assert f.cache_info()[:2] == (5, 4)
+    
+    
+def test_batch_function():
+    '''Test computing all the misses of `cache_map` in one call.'''
+    batches = []
+    
+    def get_squares(xs):
+        batches.append(xs)
+        return [x ** 2 for x in xs]
+    
+    @cache(max_size=3, batch_function=get_squares)
+    def get_square(x):
+        return get_squares([x])[0]
+    
+    assert get_square(2) == 4
+    assert get_square.cache_map([1, 2, 3, 1]) == [1, 4, 9, 1]
+    assert batches == [[2], [1, 3]]
+    assert get_square.cache_map(range(5)) == [0, 1, 4, 9, 16]
+    assert batches[2:] == [[0, 4]]
+    assert get_square.cache_info().size == 3
+    
+    @cache(batch_function=lambda xs: [])
+    def broken(x):
+        pass
+    with cute_testing.RaiseAssertor(ValueError):
+        broken.cache_map([1])
+    
+    
+def test_thread_safe_cache_map():
+    '''Test that concurrent `cache_map` calls compute each result once.'''
+    computed = []
+    barrier = threading.Barrier(8)
+    
+    def get_squares(xs):
+        computed.extend(xs)
+        time.sleep(0.05) # Letting the other threads catch up.
+        if 'boom' in xs:
+            raise ZeroDivisionError
+        return [x ** 2 for x in xs]
+    
+    @cache(thread_safe=True, batch_function=get_squares)
+    def get_square(x):
+        return get_squares([x])[0]
+    
+    results = []
+    exceptions = []
+    def run(i):
+        barrier.wait()
+        results.append(get_square.cache_map(range(i, i + 10)))
+        try:
+            get_square.cache_map(['boom'])
+        except ZeroDivisionError as exception:
+            exceptions.append(exception)
+        
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+        
+    assert sorted(results) == [[x ** 2 for x in range(i, i + 10)] for i in
+                               range(8)]
+    assert sorted(x for x in computed if x != 'boom') == list(range(17))
+    assert len(exceptions) == 8
+    assert get_square.cache_info().size == 17
+    
+    
+def test_batch_cache():
+    '''Test the `batch_cache` decorator.'''
+    batches = []
+    
+    @caching.batch_cache(collect_stats=True)
+    def add(xs, ys):
+        '''Add numbers.'''
+        batches.append((xs, ys))
+        return [x + y for x, y in zip(xs, ys)]
+    
+    assert add.__doc__ == 'Add numbers.'
+    assert add([1, 2], [10, 20]) == [11, 22]
+    assert add([1, 3, 2], [10, 30, 20]) == [11, 33, 22]
+    assert batches == [([1, 2], [10, 20]), ([3], [30])]
+    assert add.single(3, 30) == 33
+    assert add.single(4, 40) == 44
+    assert batches[2:] == [([4], [40])]
+    assert add.cache_info()[:2] == (3, 4)
+    add.cache_clear()
+    assert add([1], [10]) == [11]
+    assert len(batches) == 4
+    
+    with cute_testing.RaiseAssertor(Exception,
+                                    'It seems that you forgot to add '
+                                    'parentheses'):
+        @caching.batch_cache
+        def f(xs):
+            pass
+    
+    
+class ManualExecutor:
+    '''Executor that runs the submitted jobs only when told to.'''
+    def __init__(self):
+        self.jobs = []
+        
+    def submit(self, function, *args):
+        self.jobs.append((function, args))
+        
+    def run_jobs(self):
+        jobs, self.jobs = self.jobs, []
+        for function, args in jobs:
+            function(*args)
+    
+    
+def test_time_to_refresh():
+    '''Test that stale results are served while being refreshed.'''
+    executor = ManualExecutor()
+    results = iter((1, 2, ZeroDivisionError, 3, 4))
+    
+    @cache(time_to_keep={'hours': 1}, time_to_refresh={'minutes': 10},
+           refresh_executor=executor)
+    def f(x):
+        result = next(results)
+        if result is ZeroDivisionError:
+            raise ZeroDivisionError
+        return result
+    
+    fixed_time = datetime_module.datetime.now()
+    
+    def advance(**kwargs):
+        nonlocal fixed_time
+        fixed_time += datetime_module.timedelta(**kwargs)
+    
+    with temp_value_setting.TempValueSetter(
+                    (caching.decorators, '_get_now'), lambda: fixed_time):
+        assert f(7) == 1
+        advance(minutes=5)
+        assert f(7) == 1
+        assert not executor.jobs
+        advance(minutes=6)
+        assert f(7) == 1 # Stale, but served right away...
+        assert f(7) == 1
+        assert len(executor.jobs) == 1 # ...while a single refresh is queued.
+        executor.run_jobs()
+        assert f(7) == 2
+        
+        # A failed refresh keeps the stale result, and is tried again:
+        advance(minutes=11)
+        assert f(7) == 2
+        executor.run_jobs()
+        assert f(7) == 2
+        assert len(executor.jobs) == 1
+        executor.run_jobs()
+        assert f(7) == 3
+        
+        # After `time_to_keep`, the result is computed inline:
+        advance(hours=2)
+        assert f(7) == 4
+        assert not executor.jobs
+        
+    with cute_testing.RaiseAssertor(ValueError):
+        cache(time_to_keep={'minutes': 1}, time_to_refresh={'minutes': 2})
+        
+        
+def test_time_to_refresh_cache_map():
+    '''Test that `cache_map` refreshes stale results like calls do.'''
+    executor = ManualExecutor()
+    calls = []
+    
+    for cache_kwargs in ({}, {'cost_aware': True, 'max_bytes': 10 ** 6}):
+        @cache(time_to_refresh={'minutes': 10}, refresh_executor=executor,
+               **cache_kwargs)
+        def f(x):
+            calls.append(x)
+            return len(calls)
+        
+        fixed_time = datetime_module.datetime.now()
+        with temp_value_setting.TempValueSetter(
+                    (caching.decorators, '_get_now'), lambda: fixed_time):
+            first = f.cache_map([1, 2])
+            fixed_time += datetime_module.timedelta(minutes=11)
+            assert f.cache_map([1, 2]) == first
+            assert len(executor.jobs) == 2
+            executor.run_jobs()
+            assert f.cache_map([1, 2]) == [first[1] + 1, first[1] + 2]
+        
+        
+def test_time_to_refresh_default_executor():
+    '''Test refreshing on the default thread pool.'''
+    calls = []
+    
+    @cache(time_to_refresh={'minutes': 10})
+    def f(x):
+        calls.append(x)
+        return len(calls)
+    
+    fixed_time = datetime_module.datetime.now()
+    with temp_value_setting.TempValueSetter(
+                    (caching.decorators, '_get_now'), lambda: fixed_time):
+        assert f(7) == 1
+        fixed_time += datetime_module.timedelta(minutes=11)
+        assert f(7) == 1
+        caching.decorators._get_default_refresh_executor().submit(
+            lambda: None
+        ).result()
+        for _ in range(100):
+            if f(7) == 2:
+                break
+            time.sleep(0.01)
+        assert f(7) == 2
+        assert calls == [7, 7]
@@ -0,0 +1,168 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''Testing module for using `python_toolbox.caching.cache` on coroutines.'''
+
+import os
+import sys
+import asyncio
+import subprocess
+import datetime as datetime_module
+
+import nose.tools
+
+import python_toolbox
+from python_toolbox import caching
+from python_toolbox.caching import cache
+from python_toolbox import temp_value_setting
+
+
+def _run(coroutine):
+    '''Run `coroutine` in a new event loop and return its result.'''
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_basic():
+    '''Test that the awaited result is cached, not the coroutine.'''
+    calls = []
+
+    @cache()
+    async def f(x):
+        calls.append(x)
+        await asyncio.sleep(0)
+        return x * 2
+
+    async def main():
+        assert await f(3) == 6
+        assert await f(3) == 6
+        assert await f(4) == 8
+        assert await f(x=3) == 6
+
+    _run(main())
+    assert calls == [3, 4]
+
+
+def test_concurrent_awaiters():
+    '''Test that concurrent awaiters of the same key share one computation.'''
+    calls = []
+
+    @cache()
+    async def f(x):
+        calls.append(x)
+        await asyncio.sleep(0.01)
+        return x * 2
+
+    async def main():
+        return await asyncio.gather(f(1), f(1), f(2), f(1))
+
+    assert _run(main()) == [2, 2, 4, 2]
+    assert calls == [1, 2]
+
+
+def test_exception():
+    '''Test that exceptions reach all awaiters and aren't cached.'''
+    calls = []
+
+    @cache()
+    async def f(x):
+        calls.append(x)
+        await asyncio.sleep(0.01)
+        if len(calls) == 1:
+            raise ZeroDivisionError
+        return x
+
+    async def main():
+        results = await asyncio.gather(f(1), f(1), return_exceptions=True)
+        assert [type(result) for result in results] == \
+                                       [ZeroDivisionError, ZeroDivisionError]
+        assert await f(1) == 1
+        assert await f(1) == 1
+
+    _run(main())
+    assert calls == [1, 1]
+
+
+def test_cancelled_awaiter():
+    '''Test that cancelling one awaiter doesn't cancel the computation.'''
+
+    @cache()
+    async def f(x):
+        await asyncio.sleep(0.01)
+        return x
+
+    async def main():
+        first = asyncio.ensure_future(f(1))
+        second = asyncio.ensure_future(f(1))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == 1
+        with nose.tools.assert_raises(asyncio.CancelledError):
+            await first
+
+    _run(main())
+
+
+def test_lru_and_time_to_keep():
+    '''Test that `max_size` and `time_to_keep` work for coroutines.'''
+    calls = []
+
+    @cache(max_size=2, time_to_keep={'days': 1}, collect_stats=True)
+    async def f(x):
+        calls.append(x)
+        return x
+
+    fixed_time = datetime_module.datetime.now()
+
+    async def main():
+        nonlocal fixed_time
+        for x in (1, 2, 1, 3, 1, 2):
+            await f(x)
+        assert calls == [1, 2, 3, 2]
+        fixed_time += datetime_module.timedelta(days=2)
+        await f(1)
+        assert calls == [1, 2, 3, 2, 1]
+
+    with temp_value_setting.TempValueSetter(
+                    (caching.decorators, '_get_now'), lambda: fixed_time):
+        _run(main())
+    cache_info = f.cache_info()
+    assert (cache_info.hits, cache_info.misses) == (2, 5)
+    assert cache_info.evictions == 2
+    assert cache_info.expirations == 2
+
+
+def test_storage():
+    '''Test that `storage` isn't accepted for coroutine functions.'''
+    async def f(x):
+        return x
+    with nose.tools.assert_raises(NotImplementedError):
+        cache(storage=caching.SqliteStorage(':memory:'))(f)
+
+
+def test_decorated_before_importing_asyncio():
+    '''Test decorating a coroutine function before `asyncio` is imported.'''
+    # This needs a fresh interpreter, since `asyncio` is imported here.
+    code = '''if True:
+        import sys
+        from python_toolbox.caching import cache
+        assert 'asyncio' not in sys.modules
+
+        @cache()
+        async def g(x):
+            return x * 2
+
+        import asyncio
+
+        async def main():
+            assert await g(1) == await g(1) == 2
+
+        asyncio.new_event_loop().run_until_complete(main())
+    '''
+    environment = dict(os.environ, PYTHONPATH=os.path.dirname(
+        os.path.dirname(os.path.abspath(python_toolbox.__file__))
+    ))
+    subprocess.check_call([sys.executable, '-c', code], env=environment)
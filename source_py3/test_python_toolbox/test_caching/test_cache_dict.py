@@ -0,0 +1,129 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''Testing module for `python_toolbox.caching.cache_dict.CacheDict`.'''
+
+import datetime as datetime_module
+
+from python_toolbox.caching.cache_dict import CacheDict
+
+
+class Clock:
+    '''Fake clock for `CacheDict`.'''
+    def __init__(self):
+        self.now = datetime_module.datetime(2000, 1, 1)
+        
+    def __call__(self):
+        return self.now
+    
+    def advance(self, **kwargs):
+        self.now += datetime_module.timedelta(**kwargs)
+    
+        
+def test_lru():
+    '''Test that `CacheDict` throws away the least recently used entry.'''
+    cache_dict = CacheDict(max_size=2)
+    cache_dict[1] = 'a'
+    cache_dict[2] = 'b'
+    assert cache_dict[1] == 'a'
+    cache_dict[3] = 'c'
+    assert set(cache_dict) == {1, 3}
+    assert 2 not in cache_dict
+    del cache_dict[1]
+    assert len(cache_dict) == 1
+    cache_dict.clear()
+    assert len(cache_dict) == 0
+    
+
+def test_time_to_keep():
+    '''Test that `CacheDict` entries expire after `time_to_keep`.'''
+    clock = Clock()
+    cache_dict = CacheDict(time_to_keep=datetime_module.timedelta(hours=1),
+                           get_now=clock)
+    cache_dict[1] = 'a'
+    clock.advance(minutes=30)
+    cache_dict[2] = 'b'
+    assert cache_dict[1] == 'a'
+    clock.advance(minutes=30)
+    assert 1 not in cache_dict
+    assert cache_dict[2] == 'b'
+    assert len(cache_dict) == 1
+    
+    # Setting an entry again restarts its time:
+    cache_dict[2] = 'c'
+    clock.advance(minutes=45)
+    assert cache_dict[2] == 'c'
+    clock.advance(minutes=15)
+    assert 2 not in cache_dict
+    assert len(cache_dict) == 0
+
+    
+def test_expiry_queue_compaction():
+    '''Test that stale expiry records don't pile up.'''
+    clock = Clock()
+    cache_dict = CacheDict(max_size=2,
+                           time_to_keep=datetime_module.timedelta(days=1),
+                           get_now=clock)
+    for i in range(1000):
+        cache_dict[i] = i
+        clock.advance(seconds=1)
+    assert set(cache_dict) == {998, 999}
+    assert len(cache_dict._expiry_queue) <= 2 * 2 + 16 + 1
+    
+    clock.advance(days=1)
+    assert len(cache_dict) == 2 # Expired entries are removed lazily...
+    assert list(cache_dict) == []
+    assert len(cache_dict) == 0 # ...on the next access.
+    assert not cache_dict._expiry_queue
+    
+    
+def test_max_bytes():
+    '''Test that `CacheDict` keeps the total size within `max_bytes`.'''
+    cache_dict = CacheDict(max_bytes=10, get_size=len)
+    cache_dict[1] = 'aaaa'
+    cache_dict[2] = 'bbbb'
+    assert cache_dict.n_bytes == 8
+    assert cache_dict[1] == 'aaaa'
+    cache_dict[3] = 'cccc'
+    assert set(cache_dict) == {1, 3}
+    assert cache_dict.n_bytes == 8
+    assert cache_dict.n_evictions == 1
+    
+    # Setting an entry again replaces its size:
+    cache_dict[3] = 'c'
+    assert cache_dict.n_bytes == 5
+    
+    # A value bigger than `max_bytes` isn't stored:
+    cache_dict[4] = 'd' * 11
+    assert 4 not in cache_dict
+    assert set(cache_dict) == {1, 3}
+    
+    del cache_dict[1]
+    assert cache_dict.n_bytes == 1
+    cache_dict.clear()
+    assert cache_dict.n_bytes == 0
+    
+    
+def test_cost_aware():
+    '''Test that cost-aware eviction throws away the cheapest entries.'''
+    cache_dict = CacheDict(max_bytes=9, get_size=len, policy='gds')
+    cache_dict.set('cheap', 'aaaa', cost=1)
+    cache_dict.set('expensive', 'bbbb', cost=100)
+    cache_dict.set('other', 'cc', cost=10)
+    # The cheapest per byte is thrown away, even though it's not the least
+    # recently used:
+    assert set(cache_dict) == {'expensive', 'other'}
+    
+    # An entry that isn't used loses its value over time, as the entries
+    # thrown away inflate the priorities of new ones:
+    for i in range(30):
+        cache_dict.set(i, 'dd', cost=10)
+        assert cache_dict['other'] == 'cc'
+    assert 'expensive' not in cache_dict
+    assert 'other' in cache_dict
+    assert len(cache_dict.policy._priority_heap) <= \
+                                                  2 * len(cache_dict) + 16 + 1
+    
+    cache_dict.clear()
+    assert len(cache_dict) == 0
+    assert not cache_dict.policy._priority_heap
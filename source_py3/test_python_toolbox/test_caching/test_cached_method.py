@@ -0,0 +1,189 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''Testing module for `python_toolbox.caching.CachedMethod`.'''
+
+import gc
+import copy
+import pickle
+import datetime as datetime_module
+import weakref
+
+from python_toolbox import cute_testing
+from python_toolbox import temp_value_setting
+from python_toolbox import caching
+from python_toolbox.caching import CachedMethod
+
+
+class A:
+    def __init__(self):
+        self.calls = []
+
+    @CachedMethod
+    def f(self, x, y=2):
+        '''Add `x` and `y`.'''
+        self.calls.append((x, y))
+        return x + y
+
+
+class Point:
+    def __init__(self, x):
+        self.x = x
+
+    @CachedMethod
+    def get_sum(self, y):
+        return self.x + y
+
+
+class NonWeakreffablePoint(dict):
+    '''A class whose objects have a `__dict__` but no `__weakref__`.'''
+    __slots__ = ('__dict__',)
+
+    def __init__(self, x):
+        self.x = x
+
+    @CachedMethod
+    def get_sum(self, y):
+        return self.x + y
+
+
+def test():
+    '''Test basic workings of `CachedMethod`.'''
+    assert isinstance(A.f, CachedMethod)
+    assert A.f.__doc__ == 'Add `x` and `y`.'
+    a1, a2 = A(), A()
+    assert a1.f(1) == a1.f(1, 2) == a1.f(x=1) == a1.f(y=2, x=1) == 3
+    assert a1.calls == [(1, 2)]
+    assert a2.f(1) == 3
+    assert a2.calls == [(1, 2)]
+    assert A.f(a1, 1) == 3
+    assert a1.calls == [(1, 2)]
+    f = a1.f
+    assert f(4) == f(4) == 6
+    assert a1.calls == [(1, 2), (4, 2)]
+
+    A.f.cache_clear(a1)
+    assert a1.f(1) == 3
+    assert a1.calls == [(1, 2), (4, 2), (1, 2)]
+    assert a2.calls == [(1, 2)]
+
+
+def test_copy():
+    '''Test that copies of an object don't share its cache.'''
+    for point_type in (Point, NonWeakreffablePoint):
+        a = point_type(1)
+        assert a.get_sum(10) == 11
+        b = copy.copy(a)
+        b.x = 5
+        assert b.get_sum(10) == 15
+        assert a.get_sum(10) == 11
+        c = copy.deepcopy(a)
+        c.x = 7
+        assert c.get_sum(10) == 17
+        assert a.get_sum(10) == b.get_sum(10) - 4 == 11
+        point_type.get_sum.cache_clear(b)
+        assert a.get_sum(10) == 11
+
+
+def test_pickle():
+    '''Test that an object's cache isn't pickled with it.'''
+    a = Point(1)
+    assert a.get_sum(10) == 11
+    b = pickle.loads(pickle.dumps(a))
+    assert not b._get_sum_cache.cache_dict
+    b.x = 5
+    assert b.get_sum(10) == 15
+    assert a.get_sum(10) == 11
+
+
+def test_unhashable_arguments():
+    '''Test `CachedMethod` on unhashable objects and arguments.'''
+    calls = []
+
+    class B:
+        __hash__ = None # Our cache doesn't need to hash us.
+
+        @CachedMethod
+        def f(self, x):
+            calls.append(x)
+            return len(x)
+
+    b = B()
+    assert b.f([1, 2]) == b.f([1, 2]) == 2
+    assert b.f('abc') == b.f('abc') == 3
+    assert calls == [[1, 2], 'abc']
+
+
+def test_freed_with_object():
+    '''Test that the cached results are freed with their object.'''
+    class Result:
+        pass
+
+    class C:
+        @CachedMethod
+        def f(self, x):
+            return Result()
+
+    c = C()
+    result_reference = weakref.ref(c.f(1))
+    assert result_reference() is c.f(1)
+    del c
+    gc.collect()
+    assert result_reference() is None
+
+
+def test_slots():
+    '''Test `CachedMethod` on classes with `__slots__`.'''
+    class D:
+        __slots__ = ('x', '__weakref__')
+
+        def __init__(self, x):
+            self.x = x
+
+        @CachedMethod
+        def f(self, y):
+            calls.append((self.x, y))
+            return self.x * y
+
+    calls = []
+    d1, d2 = D(2), D(3)
+    assert d1.f(5) == d1.f(5) == 10
+    assert d2.f(5) == d2.f(5) == 15
+    assert calls == [(2, 5), (3, 5)]
+    assert len(D.f._side_table) == 2
+    del d1
+    gc.collect()
+    assert len(D.f._side_table) == 1
+
+    class E:
+        __slots__ = ()
+
+        @CachedMethod
+        def f(self):
+            pass
+
+    with cute_testing.RaiseAssertor(TypeError):
+        E().f()
+
+
+def test_max_size_and_time_to_keep():
+    '''Test bounding each object's cache by size and time.'''
+    class F:
+        def __init__(self):
+            self.calls = []
+
+        def f(self, x):
+            self.calls.append(x)
+            return x
+
+        f = CachedMethod(f, max_size=2, time_to_keep={'minutes': 10})
+
+    fixed_time = datetime_module.datetime.now()
+    with temp_value_setting.TempValueSetter(
+                    (caching.decorators, '_get_now'), lambda: fixed_time):
+        g = F()
+        g.f(1), g.f(2), g.f(1), g.f(3), g.f(1), g.f(2)
+        assert g.calls == [1, 2, 3, 2]
+        fixed_time += datetime_module.timedelta(minutes=11)
+        g.f(1)
+        assert g.calls == [1, 2, 3, 2, 1]
@@ -3,6 +3,9 @@
 
 '''Testing module for `python_toolbox.caching.CachedProperty`.'''
 
+import gc
+import threading
+
 import nose
 
 from python_toolbox import context_management
@@ -207,4 +210,111 @@ def test_force_value_not_getter():
         
     a = A()
     assert a.personality == counting_func == a.personality == counting_func
-    
\ No newline at end of file
+    
+
+def test_slots():
+    '''Test `CachedProperty` on a class with `__slots__`.'''
+    calls = []
+
+    class A:
+        __slots__ = ('x', '__weakref__')
+
+        def __init__(self, x):
+            self.x = x
+
+        @CachedProperty
+        def double(self):
+            calls.append(self.x)
+            return self.x * 2
+
+    a1, a2 = A(1), A(2)
+    assert a1.double == a1.double == 2
+    assert a2.double == a2.double == 4
+    assert calls == [1, 2]
+    assert len(A.double._side_table) == 2
+    del a1
+    gc.collect()
+    assert len(A.double._side_table) == 1
+
+
+def test_thread_safe():
+    '''Test that with `thread_safe=True` the getter is called once.'''
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def get_personality(thing):
+        calls.append(thing)
+        started.set()
+        release.wait(5)
+        return 'Nice person'
+
+    class A:
+        personality = CachedProperty(get_personality, thread_safe=True)
+
+    a = A()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(a.personality))
+               for _ in range(5)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ['Nice person'] * 5
+    assert calls == [a]
+    assert a.personality == 'Nice person'
+
+
+def test_depends_on():
+    '''Test that `depends_on` throws the value away when needed.'''
+    calls = []
+
+    class Rectangle:
+        __slots__ = ('width', '_height', '__weakref__')
+
+        def __init__(self, width, height):
+            self.width = width
+            self.height = height
+
+        height = property(lambda self: self._height,
+                          lambda self, value: setattr(self, '_height', value))
+
+        def _get_area(self):
+            calls.append('area')
+            return self.width * self.height
+
+        area = CachedProperty(_get_area, depends_on=('width', 'height'))
+
+        price = CachedProperty(lambda self: (calls.append('price'),
+                                             self.area * self.rate)[1],
+                               depends_on=('area', 'rate'))
+        rate = 10
+
+    rectangle = Rectangle(2, 3)
+    assert rectangle.price == 60
+    assert rectangle.price == 60
+    assert calls == ['price', 'area']
+    rectangle.width = 4
+    assert rectangle.width == 4
+    assert rectangle.area == 12
+    assert rectangle.price == 120
+    assert calls == ['price', 'area', 'area', 'price']
+    rectangle.height = 1
+    assert rectangle.price == 40
+    assert calls == ['price', 'area', 'area', 'price', 'price', 'area']
+
+    class Point:
+        x = 0
+        norm = CachedProperty(lambda self: abs(self.x), depends_on='x')
+
+    point = Point()
+    assert point.norm == 0
+    point.x = -3
+    assert point.norm == 3
+    del point.x
+    assert point.x == 0
+    assert point.norm == 0
+    assert Point.x == 0
@@ -3,6 +3,9 @@
 
 '''Testing module for `python_toolbox.caching.CachedType`.'''
 
+import gc
+
+from python_toolbox import cute_testing
 from python_toolbox.caching import CachedType
 
         
@@ -14,4 +17,70 @@ def test():
         
     assert A() is A(1) is A(b=2) is A(1, 2) is A(1, b=2)
     assert A() is not A(3) is not A(b=7) is not A(1, 2, 'meow') is not A(x=9)
-    
\ No newline at end of file
+    
+    
+    
+def test_cache_info():
+    '''Test `CachedType.cache_info`.'''
+    class A(metaclass=CachedType):
+        def __init__(self, a=1):
+            pass
+    
+    class B(metaclass=CachedType, collect_stats=True):
+        def __init__(self, a=1):
+            pass
+        
+    for cls in (A, B):
+        cls(), cls(1), cls(a=1), cls(2)
+        
+    assert A.cache_info() == (None, None, 0, 0, 2, None)
+    assert B.cache_info()[:5] == (2, 2, 0, 0, 2)
+    assert B.cache_info().compute_time >= 0
+    
+    
+def test_keys():
+    '''Test that all spellings of a call get the same instance.'''
+    class A(metaclass=CachedType):
+        def __init__(self, a, b=2, c='c'):
+            pass
+    
+    assert A(1) is A(1, 2) is A(1, 2, 'c') is A(a=1) is A(1, c='c') is \
+                                              A(c='c', b=2, a=1) is A(1, b=2)
+    assert A(1) is not A(1.5) is not A(1, 3) is not A(1, c='d')
+    assert A([1]) is A([1], 2) is A(a=[1])
+    assert A([1]) is not A([2])
+    with cute_testing.RaiseAssertor(TypeError):
+        A()
+    with cute_testing.RaiseAssertor(TypeError):
+        A(1, a=1)
+    with cute_testing.RaiseAssertor(TypeError):
+        A(1, d=1)
+    
+    
+def test_max_size():
+    '''Test that only the most recently used instances are kept.'''
+    class A(metaclass=CachedType, max_size=2, collect_stats=True):
+        def __init__(self, a):
+            self.a = a
+    
+    a1 = A(1)
+    A(2), A(3), A(4)
+    assert A.cache_info()[:5] == (0, 4, 2, 0, 2)
+    # `A(1)` was thrown away from the cache, but we're still holding it:
+    assert A(1) is a1
+    del a1
+    A(5), A(6)
+    gc.collect()
+    a1 = A(1)
+    assert A.cache_info()[:5] == (1, 7, 6, 0, 2)
+    assert A(6) is A(6)
+    
+    class B(metaclass=CachedType, max_size=1):
+        __slots__ = ('b',)
+        def __init__(self, b):
+            self.b = b
+            
+    b1 = B(1)
+    assert B(1) is b1
+    B(2)
+    assert B(1) is not b1
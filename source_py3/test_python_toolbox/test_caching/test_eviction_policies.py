@@ -0,0 +1,123 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''Testing module for `python_toolbox.caching.eviction_policies`.'''
+
+import random
+
+import nose.tools
+
+from python_toolbox import cute_testing
+from python_toolbox.caching import cache, eviction_policies
+from python_toolbox.caching.cache_dict import CacheDict
+
+
+def test_random_traces():
+    '''Test that all policies keep their bookkeeping consistent.'''
+    for policy in eviction_policies.policies:
+        yield _check_random_trace, policy
+
+
+def _check_random_trace(policy):
+    random_generator = random.Random(0)
+    cache_dict = CacheDict(max_size=20, policy=policy)
+    for i in range(3000):
+        key = int(random_generator.paretovariate(1)) % 100
+        action = random_generator.random()
+        if action < 0.05:
+            if key in cache_dict:
+                del cache_dict[key]
+        elif action < 0.06:
+            cache_dict.clear()
+        else:
+            try:
+                assert cache_dict[key] == key * 2
+            except KeyError:
+                cache_dict.set(key, key * 2, cost=random_generator.random())
+        assert len(cache_dict) <= 20
+    # Throwing away all entries gives us each key exactly once:
+    keys = set(cache_dict)
+    victims = [cache_dict.policy.pop_victim() for _ in range(len(keys))]
+    assert set(victims) == keys
+    assert len(victims) == len(keys)
+
+
+def test_lfu():
+    '''Test that the `'lfu'` policy throws away the least used entry.'''
+    cache_dict = CacheDict(max_size=3, policy='lfu')
+    for key in (1, 2, 3):
+        cache_dict[key] = key
+    for key in (1, 1, 3, 2, 2):
+        cache_dict[key]
+    cache_dict[4] = 4
+    assert set(cache_dict) == {1, 2, 4}
+    cache_dict[5] = 5
+    assert set(cache_dict) == {1, 2, 5}
+    cache_dict[5], cache_dict[5]
+    cache_dict[6] = 6
+    assert set(cache_dict) == {2, 5, 6}
+
+
+def _get_trace_with_scans():
+    '''Get a trace of popular keys interrupted by scans of one-time keys.'''
+    random_generator = random.Random(0)
+    scan_key = 10 ** 6
+    for i in range(20000):
+        if i % 2000 == 1000:
+            for _ in range(300):
+                scan_key += 1
+                yield scan_key
+        yield int(random_generator.paretovariate(0.8)) % 300
+
+
+def _count_hits(policy, trace):
+    cache_dict = CacheDict(max_size=100, policy=policy)
+    n_hits = 0
+    for key in trace:
+        try:
+            cache_dict[key]
+        except KeyError:
+            cache_dict[key] = key
+        else:
+            n_hits += 1
+    return n_hits
+
+
+def test_scan_resistance():
+    '''Test that the scan-resistant policies beat LRU on a trace with scans.'''
+    n_lru_hits = _count_hits('lru', _get_trace_with_scans())
+    for policy in ('2q', 'arc', 'tinylfu'):
+        assert _count_hits(policy, _get_trace_with_scans()) > n_lru_hits
+
+
+def test_max_size_needed():
+    '''Test that policies that need `max_size` require it.'''
+    for policy in ('2q', 'arc', 'tinylfu'):
+        with cute_testing.RaiseAssertor(ValueError):
+            CacheDict(max_bytes=100, policy=policy)
+    CacheDict(max_bytes=100, policy='lfu')
+
+
+def test_cache():
+    '''Test the `policy` argument of `cache`.'''
+    calls = []
+
+    @cache(max_size=2, policy='lfu')
+    def f(x):
+        calls.append(x)
+        return x
+
+    f(1), f(1), f(2), f(3), f(1), f(2)
+    assert calls == [1, 2, 3, 2]
+
+    with nose.tools.assert_raises(TypeError):
+        cache(max_size=2, policy='bogus')
+
+    class MostRecentlyUsedPolicy(eviction_policies.LruPolicy):
+        def pop_victim(self):
+            return self._keys.popitem()[0]
+
+    calls = []
+    g = cache(max_size=2, policy=MostRecentlyUsedPolicy)(f.__wrapped__)
+    g(1), g(2), g(3), g(1), g(2)
+    assert calls == [1, 2, 3, 2]
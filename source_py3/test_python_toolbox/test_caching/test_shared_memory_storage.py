@@ -0,0 +1,143 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''Testing module for `python_toolbox.caching.SharedMemoryStorage`.'''
+
+import os
+import sys
+import time
+import pickle
+import multiprocessing
+
+import nose
+
+from python_toolbox import temp_file_tools
+from python_toolbox import cute_testing
+from python_toolbox.caching import cache, SharedMemoryStorage
+
+
+if sys.platform.startswith('win'):
+    raise nose.SkipTest('`SharedMemoryStorage` is only available on POSIX.')
+
+
+def test_basic():
+    '''Test the basic workings of `SharedMemoryStorage`.'''
+    storage = SharedMemoryStorage(max_size=64)
+    storage.set('f', 'a', [1, 2, 3])
+    storage.set('f', 'b', {'meow': 'frrr'})
+    storage.set('g', 'a', None)
+    assert storage.get('f', 'a') == [1, 2, 3]
+    assert storage.get('f', 'b') == {'meow': 'frrr'}
+    assert storage.get('g', 'a') is None
+    assert len(storage) == 3
+    storage.set('f', 'a', 'replaced')
+    assert storage.get('f', 'a') == 'replaced'
+    assert len(storage) == 3
+    
+    storage.delete('f', 'b')
+    assert len(storage) == 2
+    storage.clear('f')
+    assert len(storage) == 1
+    storage.clear()
+    assert len(storage) == 0
+    try:
+        storage.get('g', 'a')
+    except KeyError:
+        pass
+    else:
+        raise AssertionError
+    
+    path = storage.path
+    assert os.path.exists(path)
+    storage.close()
+    assert not os.path.exists(path)
+    
+    
+def test_bounded():
+    '''Test that the store doesn't grow beyond its size.'''
+    storage = SharedMemoryStorage(max_size=16, slots_per_bucket=4,
+                                  max_value_size=100)
+    for i in range(100):
+        storage.set('f', str(i), i)
+    assert len(storage) == 16
+    assert storage.get('f', '99') == 99
+    
+    # Too big to store:
+    storage.set('f', 'big', os.urandom(1000))
+    try:
+        storage.get('f', 'big')
+    except KeyError:
+        pass
+    else:
+        raise AssertionError
+    
+    
+def test_bad_sizes():
+    '''Test that sizes smaller than 1 are rejected.'''
+    for kwargs in ({'max_size': 0}, {'max_size': -4},
+                   {'slots_per_bucket': 0}):
+        with cute_testing.RaiseAssertor(ValueError):
+            SharedMemoryStorage(**kwargs)
+    storage = SharedMemoryStorage(max_size=1)
+    storage.set('n', 'k', 7)
+    assert storage.get('n', 'k') == 7
+    storage.close()
+    
+    
+def test_time_to_keep():
+    '''Test that stored entries expire after `time_to_keep`.'''
+    storage = SharedMemoryStorage(time_to_keep={'seconds': 0.05})
+    storage.set('f', 'a', 1)
+    assert storage.get('f', 'a') == 1
+    time.sleep(0.1)
+    assert len(storage) == 0
+    try:
+        storage.get('f', 'a')
+    except KeyError:
+        pass
+    else:
+        raise AssertionError
+    
+    
+def test_pickling():
+    '''Test that a pickled storage shares the store with the original.'''
+    storage = SharedMemoryStorage(max_size=8)
+    storage.set('f', 'a', 1)
+    unpickled_storage = pickle.loads(pickle.dumps(storage))
+    assert unpickled_storage.get('f', 'a') == 1
+    unpickled_storage.set('f', 'b', 2)
+    assert storage.get('f', 'b') == 2
+    assert unpickled_storage.max_size == storage.max_size == 8
+    
+
+def _square(x):
+    _square.calls += 1
+    return x ** 2
+    
+
+def _worker(path, queue):
+    f = cache(max_size=0, storage=SharedMemoryStorage(path))(_square)
+    _square.calls = 0
+    queue.put(([f(i) for i in range(10)], _square.calls))
+    
+    
+def test_across_processes():
+    '''Test that results are shared between processes.'''
+    with temp_file_tools.create_temp_folder() as temp_folder:
+        path = str(temp_folder / 'shared_cache')
+        f = cache(max_size=0, storage=SharedMemoryStorage(path))(_square)
+        _square.calls = 0
+        assert [f(i) for i in range(5)] == [i ** 2 for i in range(5)]
+        assert _square.calls == 5
+        
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_worker, args=(path, queue))
+        process.start()
+        results, calls = queue.get(timeout=30)
+        process.join()
+        assert results == [i ** 2 for i in range(10)]
+        assert calls == 5 # Only the ones we didn't compute here.
+        
+        # And now the other process's results are available here:
+        assert [f(i) for i in range(10)] == results
+        assert _square.calls == 5
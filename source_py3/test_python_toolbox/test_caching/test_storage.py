@@ -0,0 +1,169 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+'''Testing module for `python_toolbox.caching.SqliteStorage`.'''
+
+import time
+
+from python_toolbox import caching
+from python_toolbox import misc_tools
+from python_toolbox import cute_testing
+from python_toolbox import temp_file_tools
+from python_toolbox.caching import cache, SqliteStorage
+
+
+@misc_tools.set_attributes(i=0)
+def counting_func(a=1, b=2, *args, **kwargs):
+    '''Function that returns a bigger number every time.'''
+    try:
+        return counting_func.i
+    finally:
+        counting_func.i += 1
+        
+        
+def test_sqlite_storage():
+    '''Test the basic workings of `SqliteStorage`.'''
+    with temp_file_tools.create_temp_folder() as temp_folder:
+        storage = SqliteStorage(temp_folder / 'cache.sqlite')
+        storage.set('f', 'a', [1, 2, 3])
+        storage.set('f', 'b', {'meow': 'frrr'})
+        storage.set('g', 'a', None)
+        assert storage.get('f', 'a') == [1, 2, 3]
+        assert storage.get('f', 'b') == {'meow': 'frrr'}
+        assert storage.get('g', 'a') is None
+        assert len(storage) == 3
+        try:
+            storage.get('g', 'b')
+        except KeyError:
+            pass
+        else:
+            raise AssertionError
+        
+        storage.delete('f', 'b')
+        assert len(storage) == 2
+        storage.clear('f')
+        assert len(storage) == 1
+        storage.close()
+        
+        # The data outlives the connection:
+        storage = SqliteStorage(temp_folder / 'cache.sqlite')
+        assert storage.get('g', 'a') is None
+        storage.clear()
+        assert len(storage) == 0
+        storage.close()
+    
+    
+def test_max_size():
+    '''Test that the least recently used entries are thrown away.'''
+    storage = SqliteStorage(':memory:', max_size=2,
+                            last_used_time_resolution={'seconds': 0})
+    storage.set('f', 'a', 1)
+    time.sleep(0.01)
+    storage.set('f', 'b', 2)
+    time.sleep(0.01)
+    assert storage.get('f', 'a') == 1 # Now `b` is the least recently used.
+    time.sleep(0.01)
+    storage.set('f', 'c', 3)
+    assert len(storage) == 2
+    assert storage.get('f', 'a') == 1
+    assert storage.get('f', 'c') == 3
+    try:
+        storage.get('f', 'b')
+    except KeyError:
+        pass
+    else:
+        raise AssertionError
+    
+    
+def test_last_used_time_resolution():
+    '''Test that hits don't write the last-used time too often.'''
+    storage = SqliteStorage(':memory:', max_size=2)
+    storage.set('f', 'a', 1)
+    time.sleep(0.01)
+    storage.set('f', 'b', 2)
+    time.sleep(0.01)
+    total_changes = storage._connection.total_changes
+    assert storage.get('f', 'a') == 1
+    assert storage._connection.total_changes == total_changes
+    time.sleep(0.01)
+    # `a` is still the least recently used, because it was used too recently
+    # to update:
+    storage.set('f', 'c', 3)
+    assert storage.get('f', 'b') == 2
+    try:
+        storage.get('f', 'a')
+    except KeyError:
+        pass
+    else:
+        raise AssertionError
+
+
+def test_size_across_connections():
+    '''Test that the number of entries is kept right by all connections.'''
+    with temp_file_tools.create_temp_folder() as temp_folder:
+        path = temp_folder / 'cache.sqlite'
+        storage = SqliteStorage(path, max_size=3)
+        other_storage = SqliteStorage(path, max_size=3)
+        for i in range(3):
+            storage.set('f', i, i)
+            other_storage.set('f', i, i) # Replacing, not adding.
+        assert len(storage) == 3
+        other_storage.delete('f', 0)
+        storage.set('g', 0, 0)
+        assert len(storage) == len(other_storage) == 3
+        other_storage.set('g', 1, 1)
+        assert len(storage) == 3
+        storage.clear('g')
+        other_storage.set('h', 0, 0)
+        other_storage.set('h', 1, 1)
+        assert len(storage) == 3
+        storage.clear()
+        for i in range(4):
+            other_storage.set('f', i, i)
+        assert len(storage) == 3
+        storage.close()
+        other_storage.close()
+
+
+def test_time_to_keep():
+    '''Test that stored entries expire after `time_to_keep`.'''
+    storage = SqliteStorage(':memory:', time_to_keep={'seconds': 0.05})
+    storage.set('f', 'a', 1)
+    assert storage.get('f', 'a') == 1
+    time.sleep(0.1)
+    assert len(storage) == 0
+    try:
+        storage.get('f', 'a')
+    except KeyError:
+        pass
+    else:
+        raise AssertionError
+    
+    
+def test_warm_start():
+    '''Test that a new cache on the same storage starts warm.'''
+    with temp_file_tools.create_temp_folder() as temp_folder:
+        path = temp_folder / 'cache.sqlite'
+        f = cache(storage=SqliteStorage(path))(counting_func)
+        results = [f(1), f(2), f(a=3, meow='frrr'), f([1, 2])]
+        assert len(set(results)) == 4
+        
+        # Simulating a new process, with an empty in-memory cache:
+        g = cache(storage=SqliteStorage(path),
+                  collect_stats=True)(counting_func)
+        assert [g(1), g(2), g(3, meow='frrr'), g([1, 2])] == results
+        assert g.cache_info().misses == 4
+        
+        # Unpicklable arguments skip the storage:
+        h = lambda: None
+        assert f(h) == f(h) != g(h)
+        
+        g.cache_clear()
+        assert g(1) != results[0]
+        
+        
+def test_time_to_refresh_not_supported():
+    '''Test that `storage` can't be used together with `time_to_refresh`.'''
+    with cute_testing.RaiseAssertor(NotImplementedError):
+        cache(storage=SqliteStorage(':memory:'),
+              time_to_refresh={'seconds': 10})(counting_func)
@@ -3,9 +3,14 @@
 
 '''Testing module for `python_toolbox.abc_tools.AbstractStaticMethod`.'''
 
+import array
+import gc
 import copy
+import sys
+import weakref
 
-from python_toolbox.cheat_hashing import cheat_hash
+from python_toolbox.cheat_hashing import (cheat_hash, content_hash,
+                                          contents_equal)
 
 
 def test_cheat_hash():
@@ -31,4 +36,78 @@ def test_cheat_hash():
     for thing, thing_copy in zip(things, things_copy):
         assert cheat_hash(thing) == cheat_hash(thing) == \
                cheat_hash(thing_copy) == cheat_hash(thing_copy)
-        
\ No newline at end of file
+                
+        
+def test_buffers():
+    '''Test `cheat_hash` hashes buffers by their contents.'''
+    assert cheat_hash(bytearray(b'meow')) == cheat_hash(bytearray(b'meow')) \
+                                          == cheat_hash(b'meow')
+    assert cheat_hash(memoryview(bytearray(b'meow'))) == cheat_hash(b'meow')
+    assert cheat_hash(array.array('i', [1, 2])) == \
+                                           cheat_hash(array.array('i', [1, 2]))
+    assert cheat_hash([bytearray(b'meow')]) == cheat_hash([bytearray(b'meow')])
+    
+    
+def test_deep():
+    '''Test `cheat_hash` on nesting deeper than the recursion limit.'''
+    def make_deep_list():
+        deep_list = current = []
+        for i in range(sys.getrecursionlimit() * 2):
+            current.append([i])
+            current = current[-1]
+        return deep_list
+    assert cheat_hash(make_deep_list()) == cheat_hash(make_deep_list())
+    
+    
+def test_cycles():
+    '''Test `cheat_hash` on containers that contain themselves.'''
+    def make_cyclic_dict():
+        cyclic_dict = {1: 2}
+        cyclic_dict[3] = [cyclic_dict, {4}]
+        return cyclic_dict
+    assert cheat_hash(make_cyclic_dict()) == cheat_hash(make_cyclic_dict())
+    
+    cyclic_list = [1]
+    cyclic_list.append(cyclic_list)
+    other_cyclic_list = [2]
+    other_cyclic_list.append(other_cyclic_list)
+    assert cheat_hash(cyclic_list) != cheat_hash(other_cyclic_list)
+
+    
+def test_content_hash():
+    '''Test `content_hash` and `contents_equal` on buffers.'''
+    things = [
+        array.array('d', [1, 2.5]),
+        [1, array.array('i', [1, 2]), {3: bytearray(b'meow')}],
+        memoryview(bytearray(range(12))).cast('B', (3, 4))[::2],
+        (None, {None: [memoryview(b'frrr')]}),
+    ]
+    things_copy = copy.deepcopy(things[:2]) + [
+        memoryview(bytes([0, 1, 2, 3, 8, 9, 10, 11])).cast('B', (2, 4)),
+        (None, {None: [memoryview(b'frrr')]}),
+    ]
+    for thing, thing_copy in zip(things, things_copy):
+        assert content_hash(thing) == content_hash(thing_copy)
+        assert contents_equal(thing, thing_copy)
+        
+    assert content_hash(1) == cheat_hash(1)
+    assert content_hash([1, {2: 3}]) == cheat_hash([1, {2: 3}])
+    
+    assert not contents_equal(array.array('d', [1, 2.5]),
+                              array.array('d', [1, 2.6]))
+    assert not contents_equal(array.array('d', [1, 2.5]),
+                              array.array('f', [1, 2.5]))
+    assert not contents_equal([array.array('i', [1])],
+                              [array.array('i', [1, 2])])
+    
+    
+def test_dynamic_types_not_kept_alive():
+    '''Test that cheat-hashing an object doesn't keep its type alive.'''
+    class Meow:
+        pass
+    cheat_hash(Meow())
+    content_hash([Meow()])
+    type_ref = weakref.ref(Meow)
+    del Meow
+    gc.collect()
+    assert type_ref() is None
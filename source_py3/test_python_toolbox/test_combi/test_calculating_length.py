@@ -1,8 +1,12 @@
 # Copyright 2009-2017 Ram Rachum.
 # This program is distributed under the MIT license.
 
+from python_toolbox import math_tools
+from python_toolbox import nifty_collections
+from python_toolbox.combi.perming import calculating_length
 from python_toolbox.combi.perming.calculating_length import * 
 
+
 def test_recurrent_perm_space_length():
     assert calculate_length_of_recurrent_perm_space(3, (3, 1, 1)) == 13
     assert calculate_length_of_recurrent_perm_space(2, (3, 2, 2, 1)) == 15
@@ -13,4 +17,34 @@ def test_recurrent_comb_space_length():
     assert calculate_length_of_recurrent_comb_space(3, (3, 1, 1)) == 4
     assert calculate_length_of_recurrent_comb_space(2, (3, 2, 2, 1)) == 9
     assert calculate_length_of_recurrent_comb_space(3, (3, 2, 2, 1)) == 14
-    
\ No newline at end of file
+    
+
+def test_long_sequences():
+    # 12 items, with counts from 1 to 12:
+    fbb = nifty_collections.FrozenBagBag(range(1, 13))
+    n_items = sum(range(1, 13))
+    assert calculate_length_of_recurrent_comb_space(n_items, fbb) == \
+           calculate_length_of_recurrent_comb_space(0, fbb) == 1
+    assert calculate_length_of_recurrent_comb_space(1, fbb) == 12
+    assert calculate_length_of_recurrent_perm_space(2, fbb) == 12 ** 2 - 1
+    assert calculate_length_of_recurrent_perm_space(n_items, fbb) == \
+           math_tools.factorial(n_items) // math_tools.product(
+               math_tools.factorial(count) for count in range(1, 13)
+           )
+    assert calculate_length_of_recurrent_perm_space(n_items + 1, fbb) == 0
+    assert calculate_length_of_recurrent_perm_space(20, fbb) == \
+                                                     1217065746315731592384
+
+
+def test_cache():
+    cache = calculating_length._length_of_recurrent_perm_space_cache
+    cache.clear()
+    assert len(cache) == 0
+    for k in range(2, 100):
+        calculate_length_of_recurrent_perm_space(k, (k, 1))
+    assert len(cache) == 98
+    assert (7, nifty_collections.FrozenBagBag((7, 1))) in cache
+    calculate_length_of_recurrent_perm_space(7, (7, 1))
+    assert len(cache) == 98
+    cache.clear()
+    assert len(cache) == 0
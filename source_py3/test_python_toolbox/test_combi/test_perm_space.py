@@ -2,6 +2,7 @@
 # This program is distributed under the MIT license.
 
 import pickle
+import array
 import itertools
 import functools
 import math
@@ -415,6 +416,16 @@ def test_degreed_perm_space():
     
     
     
+def test_degreed_indexing():
+    for fixed_map in ({}, {0: 1}, {1: 1, 2: 0}, {0: 2, 2: 0}, {3: 4, 4: 3}):
+        for degrees in ((0,), (1,), (2, 4), (3,), (1, 2, 3)):
+            perm_space = PermSpace(6, degrees=degrees, fixed_map=fixed_map)
+            assert [perm_space[i] for i in range(perm_space.length)] == [
+                perm for perm in PermSpace(6, fixed_map=fixed_map) if
+                perm.degree in degrees
+            ]
+    
+    
 def test_partial_perm_space():
     empty_partial_perm_space = PermSpace(5, n_elements=6)
     assert empty_partial_perm_space.length == 0
@@ -602,8 +613,35 @@ def test_recurrent():
     )
     
     assert PermSpace(4).unrecurrented == PermSpace(4)
-    
-    
+
+
+def test_recurrent_indexing():
+    for sequence in ('aabbc', 'abcab', 'aaabbbc', 'abcabcd'):
+        for n_elements in range(len(sequence) + 1):
+            for fixed_map in ({}, {0: 'b'}, {1: 'a', 3: 'c'}):
+                fixed_map = {key: value for key, value in fixed_map.items()
+                             if key < n_elements}
+                perm_space = PermSpace(sequence, n_elements=n_elements,
+                                       fixed_map=fixed_map)
+                perms = [perm_space[i] for i in range(perm_space.length)]
+                assert perms == list(perm_space)
+                assert set(map(tuple, perms)) == {
+                    perm_sequence for perm_sequence in
+                    itertools.permutations(sequence, n_elements) if
+                    all(perm_sequence[key] == value for key, value in
+                        fixed_map.items())
+                }
+            comb_space = CombSpace(sequence, n_elements)
+            combs = [comb_space[i] for i in range(comb_space.length)]
+            assert combs == list(comb_space)
+            assert len(set(map(tuple, combs))) == comb_space.length
+
+    assert tuple(PermSpace('ab' * 100 + 'c', n_elements=2)[5]) == ('b', 'c')
+    assert tuple(CombSpace('ab' * 100 + 'c', n_elements=2)[3]) == ('b', 'b')
+    assert tuple(PermSpace('aabbcc', fixed_map={1: 'c'})[-1]) == \
+                                          ('c', 'c', 'b', 'b', 'a', 'a')
+
+
 def test_unrecurrented():
     recurrent_perm_space = combi.PermSpace('abcabc')
     unrecurrented_perm_space = recurrent_perm_space.unrecurrented
@@ -747,4 +785,126 @@ def test_variations_make_unequal():
     
     
     
-    
\ No newline at end of file
+        
+    
+def test_iterating():
+    
+    class BluePerm(Perm): pass
+    
+    perm_spaces = [
+        PermSpace(5), PermSpace(5, n_elements=3), PermSpace(5, n_elements=0),
+        CombSpace(6, 3), CombSpace('abcde', 5),
+        PermSpace('abcd', domain='wxyz'), PermSpace(4, perm_type=BluePerm),
+        PermSpace('meow', fixed_map={1: 'o'}),
+        PermSpace(5, n_elements=3, fixed_map={2: 0}),
+        PermSpace(5, domain='vwxyz', fixed_map={'v': 2, 'x': 0}),
+        PermSpace(5, degrees=(1, 3)), PermSpace('abcde', degrees=2),
+        PermSpace(5, degrees=3, fixed_map={0: 1}),
+        PermSpace(5, degrees=(2,), domain='vwxyz'),
+        PermSpace('abab'), PermSpace('aabbc', n_elements=3),
+        PermSpace('abab', fixed_map={1: 'b'}),
+        PermSpace('aabbc', n_elements=4, fixed_map={0: 'b', 3: 'a'}),
+        CombSpace('abab', 2), CombSpace('abcab', 3), CombSpace('aabbcc', 4),
+    ]
+    perm_spaces += [perm_space[2:-3] for perm_space in perm_spaces if
+                                                         perm_space.length > 5]
+    
+    for perm_space in perm_spaces:
+        perms = tuple(perm_space)
+        assert perms == tuple(perm_space[i] for i in range(perm_space.length))
+        assert all(type(perm) is perm_space.perm_type for perm in perms)
+        assert all(perm.nominal_perm_space == perm_space[i].nominal_perm_space
+                   for i, perm in enumerate(perms))
+        assert [perm_space.index(perm) for perm in perms] == \
+                                                list(range(perm_space.length))
+        if not perm_space.is_sliced:
+            for i in range(perm_space.length):
+                assert tuple(perm_space._iterate_perms(i)) == perms[i:]
+                
+    assert tuple(map(''.join, PermSpace('abab'))) == (
+        'abab', 'abba', 'aabb', 'baab', 'baba', 'bbaa'
+    )
+    assert tuple(map(''.join, CombSpace('abcab', 3))) == (
+        'abc', 'aba', 'abb', 'aca', 'bcb'
+    )
+    
+    
+def test_get_many():
+    
+    class BluePerm(Perm): pass
+    
+    perm_spaces = (
+        PermSpace(6), PermSpace(7, n_elements=3), PermSpace(100, n_elements=2),
+        PermSpace('meow', domain='abcd'), PermSpace(5, perm_type=BluePerm),
+        PermSpace(7)[100:4000], CombSpace(10, 4), CombSpace('abcdef', 6),
+        CombSpace(30, 3)[10:-10], PermSpace('abab'), CombSpace('aabbc', 3),
+        PermSpace(5, fixed_map={1: 3}), PermSpace(5, degrees=2),
+    )
+    for perm_space in perm_spaces:
+        indices = list(range(0, perm_space.length, 7)) + \
+                                              [-1, -perm_space.length, 0, 0]
+        perms = perm_space.get_many(indices)
+        assert perms == [perm_space[i] for i in indices]
+        assert all(type(perm) is perm_space.perm_type for perm in perms)
+        assert all(
+            perm.nominal_perm_space == perm_space[i].nominal_perm_space
+            for i, perm in zip(indices, perms)
+        )
+        rows = perm_space.get_many(indices, compact=True)
+        assert all(isinstance(row, array.array) for row in rows)
+        assert [tuple(map(perm_space.sequence.__getitem__, row)) for row in
+                              rows] == [tuple(perm) for perm in perms]
+        
+    assert PermSpace(4).get_many(()) == []
+    assert PermSpace(4).get_many((), compact=True) == []
+    assert PermSpace('abc').get_many((5, 0), compact=True) == [
+        array.array('q', (2, 1, 0)), array.array('q', (0, 1, 2))
+    ]
+    with cute_testing.RaiseAssertor(IndexError):
+        PermSpace(4).get_many((3, 24))
+    with cute_testing.RaiseAssertor(IndexError):
+        CombSpace(5, 2)[1:4].get_many((3,))
+
+
+def test_index_many():
+    perm_spaces = (
+        PermSpace(6), PermSpace(7, n_elements=3), PermSpace(100, n_elements=2),
+        PermSpace('meow', domain='abcd'), PermSpace(7)[100:4000],
+        CombSpace(10, 4), CombSpace('abcdef', 3), CombSpace(30, 3)[10:-10],
+        PermSpace('abab'), CombSpace('aabbc', 3), CombSpace('abcab', 3),
+        PermSpace('aabbc', n_elements=4, fixed_map={1: 'b'}),
+        PermSpace(5, fixed_map={1: 3}), PermSpace(5, degrees=2),
+        PermSpace('abcde', degrees=(1, 3), fixed_map={0: 'c'}),
+        PermSpace(6, degrees=(0, 2), fixed_map={2: 2, 4: 1})[3:-3],
+    )
+    for perm_space in perm_spaces:
+        perms = list(perm_space)
+        indices = list(range(perm_space.length))
+        assert [perm_space.index(perm) for perm in perms] == indices
+        assert perm_space.index_many(perms) == indices
+        assert perm_space.index_many(map(tuple, perms)) == indices
+        
+    assert PermSpace(4).index_many(()) == []
+    perm_space = PermSpace(5, fixed_map={1: 3}, degrees=(1, 2))
+    for perm_sequence in itertools.permutations(range(5)):
+        if perm_sequence in perm_space:
+            assert perm_space.index(perm_sequence) == \
+                       perm_space.index_many([perm_sequence])[0]
+        else:
+            with cute_testing.RaiseAssertor(ValueError):
+                perm_space.index(perm_sequence)
+            with cute_testing.RaiseAssertor(ValueError):
+                perm_space.index_many([perm_sequence])
+    with cute_testing.RaiseAssertor(ValueError):
+        PermSpace(5).index_many([(0, 1, 2, 3, 3)])
+    with cute_testing.RaiseAssertor(ValueError):
+        CombSpace(5, 2).index_many([(3, 1)])
+    with cute_testing.RaiseAssertor(ValueError):
+        CombSpace('aabbc', 3).index_many([('b', 'a', 'c')])
+    with cute_testing.RaiseAssertor(ValueError):
+        PermSpace(7)[100:4000].index_many([tuple(range(7))])
+        
+    for perm_space in (PermSpace(3000), PermSpace(5000, n_elements=2500),
+                       PermSpace(300, degrees=(5,), fixed_map={3: 7})):
+        indices = [0, perm_space.length // 3, perm_space.length - 1]
+        assert perm_space.index_many(perm_space.get_many(indices)) == indices
@@ -50,4 +50,32 @@ def test():
                                              ProductSpace((range(4), range(3)))
     assert ProductSpace((range(4), range(3))) != \
                                              ProductSpace((range(3), range(4)))
-    
\ No newline at end of file
+        
+    
+def test_slicing():
+    product_space = ProductSpace((range(3), 'abcd', range(5)))
+    assert tuple(product_space) == \
+               tuple(product_space[i] for i in range(product_space.length))
+    
+    sliced_product_space = product_space[7:55]
+    assert sliced_product_space.is_sliced
+    assert not product_space.is_sliced
+    assert sliced_product_space.unsliced == product_space
+    assert sliced_product_space.length == 48
+    assert repr(sliced_product_space) == '<ProductSpace: 3 * 4 * 5>[7:55]'
+    assert sliced_product_space[0] == product_space[7] == (0, 'b', 2)
+    assert sliced_product_space[-1] == product_space[54]
+    assert tuple(sliced_product_space) == tuple(product_space)[7:55]
+    assert sliced_product_space.index((0, 'b', 4)) == 2
+    assert (0, 'b', 1) in product_space
+    assert (0, 'b', 1) not in sliced_product_space
+    with cute_testing.RaiseAssertor(IndexError):
+        sliced_product_space[48]
+    
+    assert sliced_product_space[2:5] == product_space[9:12]
+    assert sliced_product_space != product_space[9:12]
+    assert tuple(product_space[9:12]) == \
+                               ((0, 'b', 4), (0, 'c', 0), (0, 'c', 1))
+    assert tuple(product_space[100:]) == ()
+    assert tuple(ProductSpace(())) == ((),)
+    assert tuple(ProductSpace(((), 'ab'))) == ()
@@ -0,0 +1,35 @@
+# Copyright 2009-2017 Ram Rachum.
+# This program is distributed under the MIT license.
+
+from python_toolbox.combi import *
+
+
+def get_sum_of_perm(perm):
+    return sum(perm)
+
+
+def test_shards():
+    for space in (PermSpace(5), CombSpace(8, 3), PermSpace('abab'),
+                  PermSpace(6)[5:500], ProductSpace((range(3), 'abcd'))):
+        items = tuple(space)
+        for n_shards in (1, 2, 7, 1000):
+            shards = space.shards(n_shards)
+            assert len(shards) == n_shards
+            assert tuple(item for shard in shards for item in shard) == items
+            shard_lengths = {shard.length for shard in shards}
+            assert max(shard_lengths) - min(shard_lengths) <= 1
+            
+            
+def test_parallel_map():
+    for space in (PermSpace(6), CombSpace(9, 4)[3:-3],
+                  ProductSpace((range(30), range(20)))):
+        sums = tuple(map(get_sum_of_perm, space))
+        assert tuple(space.parallel_map(get_sum_of_perm, processes=2,
+                                        chunksize=7)) == sums
+        assert tuple(space.parallel_map(get_sum_of_perm, processes=2)) == sums
+        assert sorted(space.parallel_map(get_sum_of_perm, processes=2,
+                                         chunksize=5, as_completed=True)) == \
+                                                                  sorted(sums)
+        
+    assert tuple(PermSpace(3)[2:2].parallel_map(get_sum_of_perm,
+                                                processes=2)) == ()
@@ -67,4 +67,27 @@ def test():
     assert wkd_dict[weakreffable_object_4] == 222
     
     wkd_dict.update({weakreffable_object_5: 444,})
-    assert wkd_dict[weakreffable_object_5] == 444
\ No newline at end of file
+    assert wkd_dict[weakreffable_object_5] == 444    
+    
+def test_pending_removals():
+    '''Test that dead keys are removed together on the next change.'''
+    wkd_dict = WeakKeyDefaultDict(default_factory=lambda: 7)
+    weakreffable_objects = [WeakreffableObject() for _ in range(10)]
+    for weakreffable_object in weakreffable_objects:
+        wkd_dict[weakreffable_object] = 1
+    
+    iterator = wkd_dict.iteritems()
+    next(iterator)
+    del weakreffable_object, weakreffable_objects[1:6]
+    gc_tools.collect()
+    assert len(wkd_dict) == 5
+    assert len(list(iterator)) == 4
+    assert len(wkd_dict.data) == 10
+    
+    wkd_dict.purge()
+    assert len(wkd_dict.data) == len(wkd_dict) == 5
+    
+    del weakreffable_objects[1:3]
+    gc_tools.collect()
+    wkd_dict[WeakreffableObject] = 2
+    assert len(wkd_dict.data) == len(wkd_dict) == 4
@@ -6,6 +6,7 @@
 import nose
 
 from python_toolbox.nifty_collections import WeakKeyIdentityDict
+from python_toolbox import gc_tools
 
 
 class WeakreffableList(list):
@@ -31,4 +32,23 @@ def test():
     del wki_dict[my_weakreffable_list]
     assert my_weakreffable_list not in wki_dict
     nose.tools.assert_raises(KeyError,
-                             lambda: wki_dict[my_weakreffable_list])
\ No newline at end of file
+                             lambda: wki_dict[my_weakreffable_list])    
+    
+def test_pending_removals():
+    '''Test that dead keys are removed together on the next change.'''
+    wki_dict = WeakKeyIdentityDict()
+    weakreffable_lists = [WeakreffableList([1, 2]) for _ in range(10)]
+    for weakreffable_list in weakreffable_lists:
+        wki_dict[weakreffable_list] = 7
+    
+    iterator = wki_dict.iteritems()
+    next(iterator)
+    del weakreffable_list, weakreffable_lists[1:6]
+    gc_tools.collect()
+    assert len(wki_dict) == 5
+    assert len(list(iterator)) == 4
+    assert len(wki_dict.data) == 10
+    
+    weakreffable_list = WeakreffableList()
+    wki_dict[weakreffable_list] = 8
+    assert len(wki_dict.data) == len(wki_dict) == 6
@@ -123,3 +123,33 @@ def test_none():
     
     
         
+    
+    
+def test_pending_removals():
+    '''Test that dead values are removed together on the next change.'''
+    values = [A() for _ in range(10)]
+    csvd = CuteSleekValueDict(counter)
+    for i, value in enumerate(values):
+        csvd[i] = value
+    replaced_value = values[0]
+    csvd[0] = values[1]
+    
+    iterator = iter(csvd)
+    next(iterator)
+    del value, values[:5]
+    gc_tools.collect()
+    assert len(csvd) == 5
+    list(iterator) # Fine, since the dict wasn't changed by the callbacks.
+    assert len(csvd.data) == 10
+    assert sorted(csvd) == [5, 6, 7, 8, 9]
+    assert 3 not in csvd
+    
+    # The value that `0` had before dying doesn't remove `0`:
+    del replaced_value
+    gc_tools.collect()
+    
+    csvd['meow'] = A
+    assert len(csvd.data) == len(csvd) == 6
+    
+    csvd.purge()
+    assert not csvd._pending_removals
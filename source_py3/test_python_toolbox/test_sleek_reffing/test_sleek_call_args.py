@@ -62,4 +62,45 @@ def test_unhashable():
     gc_tools.collect()
     # Not GCed because all objects in `kwargs` are not weakreffable:
     assert len(sca_dict) == 1
-    
\ No newline at end of file
+        
+    
+def test_equality():
+    '''Test that equal call args are equal however the call was spelled.'''
+    def g(a, b=2, *args, **kwargs): pass
+    a = A()
+    sca_dict = {}
+    sca1 = SleekCallArgs(sca_dict, g, a, 2, 3, x=[1], y=a)
+    sca2 = SleekCallArgs(sca_dict, g, a, 2, 3, y=a, x=[1])
+    assert sca1 == sca2
+    assert hash(sca1) == hash(sca2)
+    assert SleekCallArgs(sca_dict, g, a) == SleekCallArgs(sca_dict, g, b=2,
+                                                           a=a)
+    assert sca1 != SleekCallArgs(sca_dict, g, a, 2, 3, x=[2], y=a)
+    assert sca1 != SleekCallArgs(sca_dict, g, a, 2, x=[1], y=a)
+    assert sca1 != SleekCallArgs(sca_dict, g, A(), 2, 3, x=[1], y=a)
+    
+    assert sca1.args == {'a': a, 'b': 2}
+    assert sca1.star_args == (3,)
+    assert sca1.star_kwargs == {'x': [1], 'y': a}
+    
+    
+def test_compact():
+    '''Test that `SleekCallArgs` is compact and makes no reference cycles.'''
+    sca_dict = {}
+    a = A()
+    sca = SleekCallArgs(sca_dict, f, a, 1)
+    assert not hasattr(sca, '__dict__')
+    sca_dict[sca] = 'meow'
+    sca_ref = weakref.ref(sca)
+    del sca
+    sca_dict.clear()
+    # Freed right away, without waiting for the garbage collector:
+    assert sca_ref() is None
+    
+    sca = SleekCallArgs(sca_dict, f, a, 1)
+    other_sca = SleekCallArgs(sca_dict, f, a, 1)
+    sca_dict[sca] = 'meow'
+    del a
+    gc_tools.collect()
+    assert not sca_dict
+    assert sca != other_sca